@@ -38,11 +38,11 @@ else
   echo "part-labeler pod not found" >&2
 fi
 
-# Redactor: anonymized-*.ply in /segments
+# Redactor: anonymized-*.ply / anonymized-*.drc in /segments
 red_pod=$(kubectl get pod -n "$NAMESPACE" -l app=redactor -o jsonpath='{.items[0].metadata.name}' 2>/dev/null || true)
 if [[ -n "$red_pod" ]]; then
   echo "Redactor -> $red_dir"
-  copy_list "$NAMESPACE" "$red_pod" 'ls -1 /segments/anonymized-*.ply 2>/dev/null || true' "$red_dir"
+  copy_list "$NAMESPACE" "$red_pod" 'ls -1 /segments/anonymized-*.ply /segments/anonymized-*.drc 2>/dev/null || true' "$red_dir"
 else
   echo "redactor pod not found" >&2
 fi
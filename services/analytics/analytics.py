@@ -4,21 +4,30 @@
 from __future__ import annotations
 
 import argparse
+import functools
 import json
 import logging
 import os
+import threading
 import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import sys
 ROOT_DIR = Path(__file__).resolve().parents[2]; sys.path.insert(0, str(ROOT_DIR)) if str(ROOT_DIR) not in sys.path else None
 
-from services.common.redis_bus import get_client, ensure_group, readgroup_blocking, xack_safe, xadd_safe  # type: ignore
+from services.common.redis_bus import get_client, get_shared_client, xadd_safe  # type: ignore
+from services.common.stream_worker import StreamWorker, add_worker_args  # type: ignore
+from services.common import metrics, tracing  # type: ignore
+from services.analytics.timeseries import TimeSeriesStore  # type: ignore
 
 
 LOGGER = logging.getLogger("analytics")
+STAGE = "analytics"  # metrics stage label
+ANALYTICS_VERSION = 1  # bump when compute_analytics output changes; --backfill recomputes everything
 
 
 def load_json(path: Path) -> Dict:
@@ -90,6 +99,17 @@ def compute_analytics(labels_doc: Dict, prev_doc: Optional[Dict], low_cov_thresh
         and (per_part.get("hand_right", {}).get("point_count", 0) == 0),
     }
 
+    return {
+        "frame_id": frame_id,
+        "totals": totals,
+        "per_part": per_part,
+        "flags": flags,
+        "motion": compute_motion(per_part, prev_doc),
+    }
+
+
+def compute_motion(per_part: Dict[str, Dict], prev_doc: Optional[Dict]) -> Optional[Dict[str, float]]:
+    """Per-part center displacement vs the previous frame's metrics (None without overlap)."""
     motion: Dict[str, float] = {}
     if prev_doc:
         prev_parts = prev_doc.get("per_part", {})
@@ -101,19 +121,309 @@ def compute_analytics(labels_doc: Dict, prev_doc: Optional[Dict], low_cov_thresh
                 dy = float(c["y"]) - float(p["y"])  # type: ignore[index]
                 dz = float(c["z"]) - float(p["z"])  # type: ignore[index]
                 motion[name] = float((dx * dx + dy * dy + dz * dz) ** 0.5)
+    return motion if motion else None
 
-    return {
-        "frame_id": frame_id,
-        "totals": totals,
-        "per_part": per_part,
-        "flags": flags,
-        "motion": motion if motion else None,
-    }
 
+def load_prev_metrics(out_dir: Path, frame_id: str) -> Optional[Dict]:
+    """Previous frame's metrics for motion (integer frame ids only)."""
+    try:
+        fid = int(str(frame_id)); prev_path = out_dir / f"metrics-{fid-1:05d}.json"
+        return load_json(prev_path) if prev_path.exists() else None
+    except Exception:
+        return None
 
-def run_loop(args: argparse.Namespace) -> None:
+
+def _frame_index(frame_id: str) -> Optional[int]:
+    try:
+        return int(str(frame_id))
+    except ValueError:
+        return None
+
+
+class SequenceCache:
+    """Recent metrics documents per capture sequence, for motion without re-reading disk.
+
+    Keeps the last ``per_sequence`` frames of the ``max_sequences`` most recently
+    used sequences (LRU). A frame whose predecessor was unknown when it was
+    computed is held as *waiting* (at most ``reorder_window`` frames behind the
+    newest one); when the predecessor arrives later, `analyze_frame` fills in the
+    waiting frame's motion and rewrites its metrics file. Frames of one sequence
+    are analyzed under that sequence's lock so the two never race; eviction skips
+    sequences whose lock is held or awaited.
+    """
+
+    def __init__(self, max_sequences: int = 64, per_sequence: int = 32, reorder_window: int = 16) -> None:
+        self.max_sequences = max(1, max_sequences)
+        self.per_sequence = max(2, per_sequence)
+        self.reorder_window = max(0, reorder_window)
+        self._seqs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, seq: str, hold: int = 0) -> Dict:
+        with self._lock:
+            st = self._seqs.get(seq)
+            if st is None:
+                st = self._seqs[seq] = {"docs": OrderedDict(), "waiting": {}, "lock": threading.Lock(), "refs": 0, "newest": None}
+                # Sequences being analyzed stay; evicting one would hand the next frame a fresh lock
+                idle = [s for s, v in self._seqs.items() if s != seq and v["refs"] == 0]
+                for old in idle[:max(0, len(self._seqs) - self.max_sequences)]:
+                    del self._seqs[old]
+            self._seqs.move_to_end(seq)
+            st["refs"] += hold
+            return st
+
+    @contextmanager
+    def lock(self, seq: str) -> Iterator[None]:
+        """Hold ``seq``'s lock; the sequence is not evicted while held or waited for."""
+        st = self._state(seq, hold=1)
+        try:
+            with st["lock"]:
+                yield
+        finally:
+            with self._lock:
+                st["refs"] -= 1
+
+    def get(self, seq: str, idx: int) -> Optional[Dict]:
+        return self._state(seq)["docs"].get(idx)
+
+    def put(self, seq: str, idx: int, doc: Dict, waiting: bool = False) -> None:
+        st = self._state(seq)
+        docs = st["docs"]
+        docs[idx] = doc
+        docs.move_to_end(idx)
+        while len(docs) > self.per_sequence:
+            docs.popitem(last=False)
+        st["newest"] = idx if st["newest"] is None else max(st["newest"], idx)
+        if waiting and self.reorder_window:
+            st["waiting"][idx] = doc
+        horizon = st["newest"] - self.reorder_window
+        for old in [i for i in st["waiting"] if i < horizon]:
+            del st["waiting"][old]
+
+    def pop_waiting(self, seq: str, idx: int) -> Optional[Dict]:
+        return self._state(seq)["waiting"].pop(idx, None)
+
+
+def analyze_frame(cache: Optional[SequenceCache], seq: str, frame_id: str, labels_doc: Dict, out_dir: Path, low_cov_threshold: float, store: Optional[TimeSeriesStore] = None) -> Tuple[Dict, Path]:
+    """Compute and write metrics-<id>.json (and its ``store`` rows); previous frame from ``cache``, disk on a miss."""
+    metrics_path = out_dir / f"metrics-{frame_id}.json"
+    idx = _frame_index(frame_id)
+    if cache is None or idx is None:
+        doc = compute_analytics(labels_doc, load_prev_metrics(out_dir, frame_id), low_cov_threshold)
+        save_json_atomic(metrics_path, doc)
+        if store is not None: store.append(seq, idx, doc)
+        return doc, metrics_path
+    with cache.lock(seq):
+        prev_doc = cache.get(seq, idx - 1)
+        if prev_doc is not None:
+            metrics.count(metrics.CACHE_HITS, stage=STAGE, cache="sequence")
+        else:
+            prev_doc = load_prev_metrics(out_dir, frame_id)
+        doc = compute_analytics(labels_doc, prev_doc, low_cov_threshold)
+        save_json_atomic(metrics_path, doc)
+        if store is not None: store.append(seq, idx, doc)
+        cache.put(seq, idx, doc, waiting=prev_doc is None)
+        # A successor that arrived first gets its motion now
+        succ = cache.pop_waiting(seq, idx + 1)
+        if succ is not None:
+            succ["motion"] = compute_motion(succ.get("per_part", {}), doc)
+            save_json_atomic(out_dir / f"metrics-{succ.get('frame_id')}.json", succ)
+            if store is not None: store.append(seq, idx + 1, succ)
+            LOGGER.debug("analytics: filled in motion for %s after out-of-order %s", succ.get("frame_id"), frame_id)
+    return doc, metrics_path
+
+
+_CACHE: Optional[SequenceCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_sequence_cache(args: argparse.Namespace) -> Optional[SequenceCache]:
+    """Per-process cache for these options (None when ``--motion-cache-frames`` is 0)."""
+    global _CACHE
+    if args.motion_cache_frames <= 0:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = SequenceCache(args.motion_cache_sequences, args.motion_cache_frames, args.reorder_window)
+        return _CACHE
+
+
+_STORES: Dict[str, TimeSeriesStore] = {}
+
+
+def get_timeseries_store(args: argparse.Namespace) -> Optional[TimeSeriesStore]:
+    """Per-process store under --timeseries-dir (None with --no-timeseries)."""
+    if args.no_timeseries:
+        return None
+    root = args.timeseries_dir or (Path(args.out_dir) / "timeseries").as_posix()
+    with _CACHE_LOCK:
+        store = _STORES.get(root)
+        if store is None:
+            store = _STORES[root] = TimeSeriesStore(Path(root))
+        return store
+
+
+def handle_message(args: argparse.Namespace, msg_id: str, fields: Dict[str, str]) -> bool:
+    """StreamWorker handler: compute metrics for one s_parts_labeled event."""
+    frame_id = fields.get("frame_id")
+    if not frame_id:
+        return True
+    trace = tracing.inbound(fields, "analytics")
     seg_dir = Path(args.segments_dir)
     out_dir = Path(args.out_dir)
+    labels_path = seg_dir / f"labels-{frame_id}.json"
+    metrics_path = out_dir / f"metrics-{frame_id}.json"
+    if metrics_path.exists():
+        # idempotent
+        return True
+    # wait for labels to exist and be older than min-age
+    start = time.monotonic()
+    deadline = start + max(2.0, args.min_age * 4)
+    while True:
+        now = time.monotonic()
+        if labels_path.exists():
+            try:
+                ok_age = (time.time() - labels_path.stat().st_mtime) >= args.min_age
+            except FileNotFoundError:
+                ok_age = False
+            if ok_age:
+                break
+        if now >= deadline:
+            raise FileNotFoundError("labels not found or too new")
+        time.sleep(0.05)
+
+    with metrics.timed(STAGE, "load"):
+        labels_doc = load_json(labels_path)
+
+    sequence = str(fields.get("sequence_id") or "")
+    with metrics.timed(STAGE, "compute"):
+        analyze_frame(get_sequence_cache(args), sequence, frame_id, labels_doc, out_dir, args.low_coverage_threshold, get_timeseries_store(args))
+    LOGGER.info("analytics: wrote %s", metrics_path.name)
+
+    # publish done
+    if args.redis_out_stream:
+        r = get_shared_client(args.redis_url)
+        if r is not None:
+            with metrics.timed(STAGE, "publish"):
+                xadd_safe(
+                    r,
+                    args.redis_out_stream,
+                    {"frame_id": str(frame_id), "metrics_path": metrics_path.as_posix(), **({"sequence_id": sequence} if sequence else {}), **tracing.finish(trace, "analytics")},
+                )
+    return True
+
+
+def backfill_fingerprint(args: argparse.Namespace) -> str:
+    return f"v{ANALYTICS_VERSION}:low_cov={args.low_coverage_threshold}"
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _backfill_run(args: argparse.Namespace, frame_ids: List[str]) -> Tuple[int, float, List[Tuple[str, str]]]:
+    """Process-pool task: analyze consecutive frames in order; (frames written, seconds, errors).
+
+    Motion only needs the previous frame's part centers, which come from its
+    labels; so a run can start anywhere without waiting for the run before it.
+    """
+    seg_dir, out_dir = Path(args.segments_dir), Path(args.out_dir)
+    store = get_timeseries_store(args)
+    t0 = time.perf_counter()
+    written, errors = 0, []
+    prev_doc: Optional[Dict] = None
+    prev_idx = _frame_index(frame_ids[0])
+    if prev_idx is not None and (seg_dir / f"labels-{prev_idx - 1:05d}.json").exists():
+        try:
+            prev_doc = compute_analytics(load_json(seg_dir / f"labels-{prev_idx - 1:05d}.json"), None, args.low_coverage_threshold)
+        except Exception:
+            prev_doc = None
+    prev_idx = None if prev_idx is None else prev_idx - 1
+    for frame_id in frame_ids:
+        idx = _frame_index(frame_id)
+        try:
+            labels_doc = load_json(seg_dir / f"labels-{frame_id}.json")
+            doc = compute_analytics(labels_doc, prev_doc if (idx is not None and prev_idx == idx - 1) else None, args.low_coverage_threshold)
+            save_json_atomic(out_dir / f"metrics-{frame_id}.json", doc)
+            if store is not None: store.append(args.sequence_id, idx, doc)
+            written += 1
+        except Exception as e:
+            errors.append((frame_id, f"{type(e).__name__}: {e}"))
+            doc = None
+        prev_doc, prev_idx = doc, idx
+    return written, time.perf_counter() - t0, errors
+
+
+def run_backfill(args: argparse.Namespace) -> int:
+    """Recompute metrics for every labels-*.json in --segments-dir; never touches Redis.
+
+    A frame is skipped when its metrics file is newer than its own and its
+    predecessor's labels and the fingerprint (ANALYTICS_VERSION plus the
+    tunables) matches the last backfill's, unless --force. Stale frames are
+    split into runs of consecutive ids that a process pool analyzes in order.
+    Returns the number of failed frames.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    seg_dir, out_dir = Path(args.segments_dir), Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state_path = out_dir / "analytics-backfill.json"
+    fingerprint = backfill_fingerprint(args)
+    try:
+        same = load_json(state_path).get("fingerprint") == fingerprint
+    except (FileNotFoundError, ValueError):
+        same = False
+
+    ids = [p.stem.split("-", 1)[-1] for p in seg_dir.glob("labels-*.json")]
+    ids.sort(key=lambda f: (_frame_index(f) is None, _frame_index(f) or 0, f))
+    labels_mtime = {f: _mtime(seg_dir / f"labels-{f}.json") for f in ids}
+
+    def stale(frame_id: str) -> bool:
+        if args.force or not same:
+            return True
+        done = _mtime(out_dir / f"metrics-{frame_id}.json")
+        idx = _frame_index(frame_id)
+        prev = labels_mtime.get(f"{idx - 1:05d}", 0.0) if idx is not None else 0.0
+        return done < max(labels_mtime[frame_id], prev)
+
+    todo = [f for f in ids if stale(f)]
+    runs: List[List[str]] = []
+    for f in todo:
+        idx = _frame_index(f)
+        last = runs[-1][-1] if runs else None
+        if last is not None and idx is not None and _frame_index(last) == idx - 1 and len(runs[-1]) < args.backfill_chunk:
+            runs[-1].append(f)
+        else:
+            runs.append([f])
+    LOGGER.info("backfill: %d labels in %s, %d up to date, %d to do in %d runs | workers=%d (%s)", len(ids), seg_dir, len(ids) - len(todo), len(todo), len(runs), args.backfill_workers, fingerprint)
+    failed = done = 0
+    busy_s = 0.0
+    t0 = time.perf_counter()
+    if runs:
+        every = max(1, len(runs) // 20)
+        with ProcessPoolExecutor(max_workers=args.backfill_workers) as pool:
+            futures = [pool.submit(_backfill_run, args, run) for run in runs]
+            for n, fut in enumerate(as_completed(futures), 1):
+                written, took, errors = fut.result()
+                done += written
+                busy_s += took
+                failed += len(errors)
+                for frame_id, err in errors:
+                    LOGGER.error("backfill: %s failed: %s", frame_id, err)
+                if n % every == 0 or n == len(runs):
+                    elapsed = time.perf_counter() - t0
+                    LOGGER.info("backfill: %d/%d frames (%.0f%%) | %.1f frames/s", done + failed, len(todo), 100.0 * (done + failed) / len(todo), (done + failed) / elapsed)
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    if not failed:
+        save_json_atomic(state_path, {"fingerprint": fingerprint, "finished": time.time(), "frames": len(ids)})
+    LOGGER.info("backfill: wrote %d frames (%d failed) in %.1fs | %.1f frames/s, %.2f ms/frame per worker", done, failed, elapsed, done / elapsed, 1000.0 * busy_s / max(1, done + failed))
+    return failed
+
+
+def run_loop(args: argparse.Namespace) -> None:
     # no readiness sentinel; event-driven via Redis
 
     # Redis required; fail fast if missing
@@ -124,69 +434,16 @@ def run_loop(args: argparse.Namespace) -> None:
     if r is None:
         LOGGER.error("analytics: unable to connect to Redis at %s", args.redis_url)
         sys.exit(1)
-    # Explicit INFO so startup intent is clear even if groups already exist
-    LOGGER.info("analytics: ensuring Redis group %s on stream %s", args.redis_group, args.redis_in_stream)
-    ensure_group(r, args.redis_in_stream, args.redis_group)
-    LOGGER.info("analytics: Redis group %s is ready on %s", args.redis_group, args.redis_in_stream)
     LOGGER.info("analytics: Redis mode enabled (consuming %s)", args.redis_in_stream)
 
+    if args.executor == "process" and args.motion_cache_frames > 0:
+        LOGGER.warning("analytics: --executor process keeps one motion cache per worker; out-of-order repair only within a worker")
+    metrics.start_metrics_server(args.metrics_port)
+    metrics.watch_consumer_lag(r, args.redis_in_stream, args.redis_group, STAGE)
+    # failures are left unacked for retry
     poll_ms = max(200, int(args.poll_interval * 1000))
-    while True:
-        entries = readgroup_blocking(r, args.redis_in_stream, args.redis_group, args.redis_consumer, count=1, block_ms=poll_ms)
-        if not entries:
-            continue
-        _, messages = entries[0]
-        for msg_id, fields in messages:
-            frame_id = fields.get("frame_id")
-            if not frame_id:
-                xack_safe(r, args.redis_in_stream, args.redis_group, msg_id)
-                continue
-            labels_path = seg_dir / f"labels-{frame_id}.json"
-            metrics_path = out_dir / f"metrics-{frame_id}.json"
-            try:
-                if metrics_path.exists():
-                    # idempotent
-                    xack_safe(r, args.redis_in_stream, args.redis_group, msg_id)
-                    continue
-                # wait for labels to exist and be older than min-age
-                start = time.monotonic()
-                deadline = start + max(2.0, args.min_age * 4)
-                while True:
-                    now = time.monotonic()
-                    if labels_path.exists():
-                        try:
-                            ok_age = (time.time() - labels_path.stat().st_mtime) >= args.min_age
-                        except FileNotFoundError:
-                            ok_age = False
-                        if ok_age:
-                            break
-                    if now >= deadline:
-                        raise FileNotFoundError("labels not found or too new")
-                    time.sleep(0.05)
-
-                labels_doc = load_json(labels_path)
-                prev_doc = None
-                try:
-                    fid = int(str(frame_id)); prev_path = out_dir / f"metrics-{fid-1:05d}.json"
-                    prev_doc = load_json(prev_path) if prev_path.exists() else None
-                except Exception:
-                    pass
-
-                analytics = compute_analytics(labels_doc, prev_doc, args.low_coverage_threshold)
-                save_json_atomic(metrics_path, analytics)
-                LOGGER.info("analytics: wrote %s", metrics_path.name)
-
-                # publish done
-                if args.redis_out_stream:
-                    xadd_safe(
-                        r,
-                        args.redis_out_stream,
-                        {"frame_id": str(frame_id), "metrics_path": metrics_path.as_posix()},
-                    )
-                xack_safe(r, args.redis_in_stream, args.redis_group, msg_id)
-            except Exception as e:
-                LOGGER.warning("analytics: failed for frame %s: %s", frame_id, e)
-                # leave unacked for retry
+    worker = StreamWorker.from_args(r, args, functools.partial(handle_message, args), ack_on_error=False, block_ms=poll_ms, name=STAGE)
+    worker.run()
 
 
 def parse_args() -> argparse.Namespace:
@@ -197,18 +454,32 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--poll-interval", type=float, default=1.0, help="Polling interval seconds")
     p.add_argument("--min-age", type=float, default=0.5, help="Minimum file age before processing")
     p.add_argument("--low-coverage-threshold", type=float, default=0.2, help="QoS threshold for low coverage flag")
+    p.add_argument("--motion-cache-frames", type=int, default=32, help="Recent metrics kept in memory per sequence for motion (0 = always read the previous frame from disk)")
+    p.add_argument("--motion-cache-sequences", type=int, default=64, help="Sequences kept in the motion cache (least recently used dropped)")
+    p.add_argument("--reorder-window", type=int, default=16, help="Frames a successor may arrive ahead of its predecessor and still get motion")
+    p.add_argument("--timeseries-dir", default=os.environ.get("ANALYTICS_TIMESERIES_DIR", ""), help="Per-sequence SQLite time series of all results (default <out-dir>/timeseries)")
+    p.add_argument("--no-timeseries", action="store_true", help="Only write metrics-*.json")
     p.add_argument("--log-level", choices=["debug","info","warning","error"], default="info")
     p.add_argument("--redis-url", default=os.environ.get("REDIS_URL",""), help="Redis URL")
     p.add_argument("--redis-in-stream", default=os.environ.get("REDIS_STREAM_PARTS_LABELED","s_parts_labeled"), help="Stream to consume s_parts_labeled events from")
     p.add_argument("--redis-out-stream", default=os.environ.get("REDIS_STREAM_ANALYTICS_DONE","s_analytics_done"), help="Stream to publish s_analytics_done events to")
     p.add_argument("--redis-group", default=os.environ.get("REDIS_GROUP_ANALYTICS","g_analytics"), help="Consumer group")
     p.add_argument("--redis-consumer", default=os.environ.get("HOSTNAME","analytics-1"), help="Consumer name")
+    p.add_argument("--backfill", action="store_true", help="Recompute metrics for every labels-*.json in --segments-dir and exit (no Redis)")
+    p.add_argument("--backfill-workers", type=int, default=os.cpu_count() or 1, help="Processes for --backfill")
+    p.add_argument("--backfill-chunk", type=int, default=256, help="Max consecutive frames per --backfill task")
+    p.add_argument("--sequence-id", default="", help="Time series sequence for --backfill results")
+    p.add_argument("--force", action="store_true", help="--backfill: recompute frames that look up to date")
+    add_worker_args(p, batch_size=1)
+    metrics.add_metrics_args(p, default_port=9104)
     return p.parse_args()
 
 
 def main() -> None:
     args = parse_args()
     logging.basicConfig(level=getattr(logging, args.log_level.upper()), format="%(asctime)s %(levelname)s %(message)s")
+    if args.backfill:
+        sys.exit(1 if run_backfill(args) else 0)
     run_loop(args)
 
 
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Per-sequence time series of analytics results (embedded SQLite).
+
+`analytics` writes one ``metrics-<id>.json`` per frame; answering a sequence
+level question (coverage trend, motion over time) from those means opening
+every file. The store keeps the same numbers as rows in one SQLite file per
+capture sequence (``<root>/<sequence>.sqlite``, ``default`` for events without
+``sequence_id``):
+
+- ``frames`` – frame_id, frame_idx, totals and QoS flags
+- ``parts``  – one row per (frame, part): count, fraction, center, volume, density, motion
+
+Both are keyed and clustered on (frame_idx, frame_id), so a range read is one
+sequential scan. Stores created with the older ``frame_id``-keyed ``frames``
+table are migrated when first opened.
+
+Non-integer frame ids are stored with frame_idx -1.
+
+Writes are upserts, so a redelivered frame or a late motion fill-in replaces
+its rows. `read_range` returns a frame-ordered dict of NumPy columns with one
+``<part>_<field>`` column per part (NaN where a part or value is missing), so
+range queries vectorize directly::
+
+    ts = TimeSeriesStore(Path("/segments/timeseries")).read_range("cam-a", 0, 5000)
+    ts["labeled_fraction"].mean(), np.nanmax(ts["head_motion"])
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+FRAME_COLUMNS = ("total_points", "labeled_points", "labeled_fraction", "low_coverage", "head_missing", "hands_missing")
+PART_COLUMNS = ("point_count", "fraction", "cx", "cy", "cz", "volume", "density", "motion")
+
+_FRAMES = """
+CREATE TABLE IF NOT EXISTS frames (
+    frame_id TEXT NOT NULL, frame_idx INTEGER NOT NULL, updated REAL,
+    total_points INTEGER, labeled_points INTEGER, labeled_fraction REAL,
+    low_coverage INTEGER, head_missing INTEGER, hands_missing INTEGER,
+    PRIMARY KEY (frame_idx, frame_id)
+) WITHOUT ROWID;
+"""
+_SCHEMA = _FRAMES + """
+CREATE TABLE IF NOT EXISTS parts (
+    frame_idx INTEGER NOT NULL, frame_id TEXT NOT NULL, part TEXT NOT NULL,
+    point_count INTEGER, fraction REAL, cx REAL, cy REAL, cz REAL, volume REAL, density REAL, motion REAL,
+    PRIMARY KEY (frame_idx, frame_id, part)
+) WITHOUT ROWID;
+"""
+
+# frame_id-keyed frames table (rowid, secondary index on frame_idx) -> current layout
+_MIGRATE_FRAMES = "BEGIN;\nALTER TABLE frames RENAME TO frames_old;\nDROP INDEX IF EXISTS frames_idx;\n" + _FRAMES + """
+INSERT OR REPLACE INTO frames SELECT * FROM frames_old;
+DROP TABLE frames_old;
+COMMIT;
+"""
+
+
+def _sequence_file(sequence: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", sequence) or "default"
+
+
+class TimeSeriesStore:
+    """Append/upsert analytics documents and read them back as columns."""
+
+    def __init__(self, root: Path, timeout: float = 30.0) -> None:
+        self.root = root
+        self.timeout = timeout
+        self._ready: set = set()
+
+    def path(self, sequence: str) -> Path:
+        return self.root / f"{_sequence_file(sequence)}.sqlite"
+
+    def _connect(self, sequence: str) -> sqlite3.Connection:
+        path = self.path(sequence)
+        if path not in self._ready:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path.as_posix(), timeout=self.timeout)
+        if path not in self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")  # readers never block the writer
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'frames'").fetchone()
+            if row and "frame_id TEXT PRIMARY KEY" in row[0]:
+                conn.executescript(_MIGRATE_FRAMES)
+            conn.executescript(_SCHEMA)
+            self._ready.add(path)
+        return conn
+
+    def append(self, sequence: str, frame_idx: Optional[int], doc: Dict) -> None:
+        """Upsert one metrics document (as produced by `compute_analytics`)."""
+        totals, flags = doc.get("totals") or {}, doc.get("flags") or {}
+        motion = doc.get("motion") or {}
+        frame_id = str(doc.get("frame_id"))
+        frame_idx = -1 if frame_idx is None else int(frame_idx)
+        part_rows = []
+        for name, p in (doc.get("per_part") or {}).items():
+            c = p.get("center") or {}
+            part_rows.append((frame_idx, frame_id, name, p.get("point_count"), p.get("fraction"), c.get("x"), c.get("y"), c.get("z"),
+                              p.get("volume"), p.get("density"), motion.get(name)))
+        with closing(self._connect(sequence)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (frame_id, frame_idx, time.time(), totals.get("total_points"), totals.get("labeled_points"), totals.get("labeled_fraction"),
+                 int(bool(flags.get("low_coverage"))), int(bool(flags.get("head_missing"))), int(bool(flags.get("hands_missing")))),
+            )
+            conn.execute("DELETE FROM parts WHERE frame_idx = ? AND frame_id = ?", (frame_idx, frame_id))
+            conn.executemany("INSERT INTO parts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", part_rows)
+
+    def sequences(self) -> List[str]:
+        return sorted(p.stem for p in self.root.glob("*.sqlite"))
+
+    def read_range(self, sequence: str, start: Optional[int] = None, end: Optional[int] = None, parts: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Frames with ``start <= frame_idx <= end`` (either bound optional), ordered by frame_idx."""
+        if not self.path(sequence).exists():
+            return {"frame_id": np.empty(0, dtype=object), "frame_idx": np.empty(0, dtype=np.int64)}
+        where, params = [], []
+        if start is not None:
+            where.append("frame_idx >= ?"); params.append(int(start))
+        if end is not None:
+            where.append("frame_idx <= ?"); params.append(int(end))
+        cond = (" WHERE " + " AND ".join(where)) if where else ""
+        with closing(self._connect(sequence)) as conn:
+            frames = conn.execute(f"SELECT frame_id, frame_idx, {', '.join(FRAME_COLUMNS)} FROM frames{cond} ORDER BY frame_idx, frame_id", params).fetchall()
+            part_rows = conn.execute(f"SELECT frame_id, part, {', '.join(PART_COLUMNS)} FROM parts{cond}", params).fetchall()
+        n = len(frames)
+        out: Dict[str, np.ndarray] = {
+            "frame_id": np.array([f[0] for f in frames], dtype=object),
+            "frame_idx": np.array([f[1] for f in frames], dtype=np.int64),
+        }
+        table = np.array([f[2:] for f in frames], dtype=np.float64).reshape(n, len(FRAME_COLUMNS))
+        for i, col in enumerate(FRAME_COLUMNS):
+            out[col] = table[:, i].astype(bool) if col.endswith(("_missing", "_coverage")) else table[:, i]
+        if not part_rows:
+            return out
+        row_of = {fid: i for i, fid in enumerate(out["frame_id"])}
+        rows = np.array([row_of[r[0]] for r in part_rows], dtype=np.int64)
+        names = np.array([r[1] for r in part_rows], dtype=object)
+        values = np.array([r[2:] for r in part_rows], dtype=np.float64)  # None -> nan
+        for part in sorted(set(names.tolist()) if parts is None else set(parts) & set(names.tolist())):
+            sel = names == part
+            for j, col in enumerate(PART_COLUMNS):
+                column = np.full(n, np.nan)
+                column[rows[sel]] = values[sel, j]
+                out[f"{part}_{col}"] = column
+        return out
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Minimal Prometheus-style metrics shared by the pipeline workers.
+
+No client library required: counters, gauges and histograms live in an
+in-process registry and are rendered in the Prometheus text exposition
+format by a tiny ``/metrics`` HTTP server running on a daemon thread.
+
+Exported series (``stage`` is the worker name, e.g. ``part-labeler``):
+- ``semseg_stage_seconds{stage,step}`` histogram – load / inference / compute / write / publish / handle
+- ``semseg_frames_processed_total{stage}`` / ``semseg_frames_failed_total{stage}`` counters
+- ``semseg_inference_skipped_total{stage}`` / ``semseg_inference_saved_seconds_total{stage}`` counters – inference reused for near-static frames
+- ``semseg_cache_hits_total{stage,cache}`` counter – work answered from a cache
+- ``semseg_consumer_lag{stage,stream,group}`` / ``semseg_consumer_pending{...}`` gauges from XINFO GROUPS
+
+Process-pool workers cannot update the parent's registry directly; the
+StreamWorker wraps such handlers with `capture()` and `replay()` so their
+observations still reach the exporter.
+
+Environment variable defaults:
+- METRICS_PORT (overrides each service's default port; 0 disables the exporter)
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LOGGER = logging.getLogger("metrics")
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        k = _key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_key(labels)] = float(value)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        k = _key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(k) or ([0] * len(self.buckets), 0.0, 0)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+            self._values[k] = (counts, total + value, n + 1)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._values.items())
+        out = super().render()
+        for k, (counts, total, n) in items:
+            for b, c in zip(self.buckets, counts):
+                out.append(f"{self.name}_bucket{_fmt_labels(k, [('le', _fmt_value(b))])} {c}")
+            out.append(f"{self.name}_bucket{_fmt_labels(k, [('le', '+Inf')])} {n}")
+            out.append(f"{self.name}_sum{_fmt_labels(k)} {_fmt_value(total)}")
+            out.append(f"{self.name}_count{_fmt_labels(k)} {n}")
+        return out
+
+
+STAGE_SECONDS = Histogram("semseg_stage_seconds", "Time spent per pipeline step in seconds")
+FRAMES_PROCESSED = Counter("semseg_frames_processed_total", "Frames successfully handled by a stage")
+FRAMES_FAILED = Counter("semseg_frames_failed_total", "Frames that raised in a stage")
+FRAMES_DEAD_LETTERED = Counter("semseg_frames_dead_lettered_total", "Messages moved to a dead-letter stream after too many deliveries")
+CONSUMER_LAG = Gauge("semseg_consumer_lag", "Entries not yet delivered to the consumer group (XINFO GROUPS lag)")
+CONSUMER_PENDING = Gauge("semseg_consumer_pending", "Entries delivered but not acked (XINFO GROUPS pending)")
+INFERENCE_SKIPPED = Counter("semseg_inference_skipped_total", "Frames that reused the previous frame's inference")
+INFERENCE_SAVED = Counter("semseg_inference_saved_seconds_total", "Estimated inference seconds saved by reuse")
+CACHE_HITS = Counter("semseg_cache_hits_total", "Work items answered from a cache")
+REGISTRY: List[_Metric] = [STAGE_SECONDS, FRAMES_PROCESSED, FRAMES_FAILED, FRAMES_DEAD_LETTERED, INFERENCE_SKIPPED, INFERENCE_SAVED, CACHE_HITS, CONSUMER_LAG, CONSUMER_PENDING]
+
+# Observations made while capturing (inside a process-pool worker) are journaled here
+_CAPTURE = threading.local()
+
+
+def observe_step(stage: str, step: str, seconds: float) -> None:
+    journal = getattr(_CAPTURE, "journal", None)
+    if journal is not None:
+        journal.append(("step", stage, step, seconds))
+        return
+    STAGE_SECONDS.observe(seconds, stage=stage, step=step)
+
+
+def count(counter: Counter, amount: float = 1.0, **labels: str) -> None:
+    """``counter.inc`` that is also journaled while capturing."""
+    journal = getattr(_CAPTURE, "journal", None)
+    if journal is not None:
+        journal.append(("inc", counter.name, tuple(sorted(labels.items())), amount))
+        return
+    counter.inc(amount, **labels)
+
+
+@contextmanager
+def timed(stage: str, step: str) -> Iterator[None]:
+    """Observe the wall time of the block into ``semseg_stage_seconds``."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_step(stage, step, time.perf_counter() - t0)
+
+
+@contextmanager
+def capture() -> Iterator[List[Tuple]]:
+    """Journal observations instead of recording them (used in process-pool workers)."""
+    prev = getattr(_CAPTURE, "journal", None)
+    _CAPTURE.journal = journal = []
+    try:
+        yield journal
+    finally:
+        _CAPTURE.journal = prev
+
+
+def replay(journal: Sequence[Tuple]) -> None:
+    """Record observations journaled by `capture()` in another process."""
+    counters = {m.name: m for m in REGISTRY if isinstance(m, Counter)}
+    for kind, a, b, value in journal or ():
+        if kind == "step":
+            STAGE_SECONDS.observe(value, stage=a, step=b)
+        elif kind == "inc" and a in counters:
+            counters[a].inc(value, **dict(b))
+
+
+def render_latest() -> bytes:
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_latest()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt: str, *args: object) -> None:  # keep access logs out of service output
+        LOGGER.debug("metrics: " + fmt, *args)
+
+
+def add_metrics_args(parser: argparse.ArgumentParser, *, default_port: int) -> None:
+    """Register ``--metrics-port`` (env METRICS_PORT wins over the service default)."""
+    try:
+        port = int(os.environ.get("METRICS_PORT", default_port))
+    except ValueError:
+        port = default_port
+    parser.add_argument("--metrics-port", type=int, default=port, help="Port for the /metrics exporter (0 disables)")
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on a daemon thread; returns None when disabled or the port is taken."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, int(port)), _Handler)
+    except OSError as e:
+        LOGGER.warning("metrics: unable to bind :%s (%s); exporter disabled", port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    LOGGER.info("metrics: serving /metrics on :%d", port)
+    return server
+
+
+def poll_consumer_lag(r, stream: str, group: str, stage: str) -> None:
+    """Refresh lag/pending gauges for one group from XINFO GROUPS (lag needs Redis >= 7)."""
+    try:
+        groups = r.xinfo_groups(stream)
+    except Exception as e:
+        LOGGER.debug("metrics: xinfo_groups %s failed: %s", stream, e)
+        return
+    for g in groups or []:
+        name = g.get("name")
+        name = name.decode() if isinstance(name, (bytes, bytearray)) else name
+        if name != group:
+            continue
+        if g.get("lag") is not None:
+            CONSUMER_LAG.set(float(g["lag"]), stage=stage, stream=stream, group=group)
+        CONSUMER_PENDING.set(float(g.get("pending") or 0), stage=stage, stream=stream, group=group)
+
+
+def watch_consumer_lag(r, stream: str, group: str, stage: str, interval: float = 5.0) -> threading.Thread:
+    """Poll `poll_consumer_lag` on a daemon thread every ``interval`` seconds."""
+    def _loop() -> None:
+        while True:
+            poll_consumer_lag(r, stream, group, stage)
+            time.sleep(interval)
+
+    t = threading.Thread(target=_loop, name=f"lag-{stage}", daemon=True)
+    t.start()
+    return t
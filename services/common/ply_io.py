@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""PLY vertex I/O shared by the redactor and results_api.
+
+- `read_ply_header` / `iter_ply_chunks`: float32 xyz + uint8 rgb in bounded
+  chunks; binary PLYs are memory-mapped, ASCII is read line by line. The
+  vertex element must come first and have no list properties (what the
+  converter and the redactor write).
+- `binary_header` / `vertex_bytes` / `write_binary_ply`: binary little-endian
+  PLY with float x, y, z and uchar red, green, blue.
+"""
+from __future__ import annotations
+
+import itertools
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Tuple
+
+import numpy as np
+
+PLY_TYPES = {"char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1", "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+             "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4", "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"}
+VERTEX_DTYPE = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("red", "u1"), ("green", "u1"), ("blue", "u1")])
+DEFAULT_COLOR = 200  # gray for clouds without rgb
+
+
+def read_ply_header(path: Path) -> Tuple[str, int, List[Tuple[str, str]], int]:
+    """(format, vertex count, [(property, numpy type)], data offset); vertex must be the first element, no list properties."""
+    fmt, count, props, element = "", -1, [], None
+    with path.open("rb") as fh:
+        if fh.readline().strip() != b"ply":
+            raise ValueError(f"{path.name}: not a PLY file")
+        while True:
+            line = fh.readline()
+            if not line:
+                raise ValueError(f"{path.name}: truncated header")
+            tok = line.decode("ascii", "replace").split()
+            if not tok or tok[0] in ("comment", "obj_info"):
+                continue
+            if tok[0] == "end_header":
+                return fmt, count, props, fh.tell()
+            if tok[0] == "format":
+                fmt = tok[1]
+            elif tok[0] == "element":
+                if element is None and tok[1] != "vertex":
+                    raise ValueError(f"{path.name}: vertex is not the first element")
+                element = tok[1]
+                if element == "vertex":
+                    count = int(tok[2])
+            elif tok[0] == "property" and element == "vertex":
+                if tok[1] == "list" or tok[1] not in PLY_TYPES:
+                    raise ValueError(f"{path.name}: unsupported vertex property {' '.join(tok[1:])}")
+                props.append((tok[2], PLY_TYPES[tok[1]]))
+
+
+def iter_ply_chunks(path: Path, chunk_points: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield (float32 xyz, uint8 rgb) vertex chunks; binary PLYs are memory-mapped, ASCII is read line by line."""
+    fmt, count, props, offset = read_ply_header(path)
+    names = [n for n, _ in props]
+    has_rgb = all(c in names for c in ("red", "green", "blue"))
+    if fmt.startswith("binary"):
+        endian = "<" if fmt == "binary_little_endian" else ">"
+        if count <= 0:
+            return
+        mm = np.memmap(path.as_posix(), dtype=np.dtype([(n, endian + t) for n, t in props]), mode="r", offset=offset, shape=(count,))
+        for i in range(0, count, chunk_points):
+            sl = mm[i:i + chunk_points]
+            pts = np.stack([sl["x"], sl["y"], sl["z"]], axis=1).astype(np.float32)
+            cols = np.stack([sl["red"], sl["green"], sl["blue"]], axis=1).astype(np.uint8) if has_rgb else np.full(pts.shape, DEFAULT_COLOR, dtype=np.uint8)
+            yield pts, cols
+        del mm
+        return
+    cx, cy, cz = (names.index(c) for c in ("x", "y", "z"))
+    crgb = [names.index(c) for c in ("red", "green", "blue")] if has_rgb else None
+    with path.open("rb") as fh:
+        fh.seek(offset)
+        remaining = count
+        while remaining > 0:
+            lines = list(itertools.islice(fh, min(chunk_points, remaining)))
+            if not lines:
+                break
+            remaining -= len(lines)
+            rows = np.loadtxt(lines, dtype=np.float64, ndmin=2)
+            pts = rows[:, [cx, cy, cz]].astype(np.float32)
+            cols = rows[:, crgb].astype(np.uint8) if crgb else np.full(pts.shape, DEFAULT_COLOR, dtype=np.uint8)
+            yield pts, cols
+
+
+def binary_header(count_field: str) -> bytes:
+    """Header for `vertex_bytes` rows; ``count_field`` may be a placeholder patched later."""
+    return ("ply\nformat binary_little_endian 1.0\n" f"element vertex {count_field}\n"
+            "property float x\nproperty float y\nproperty float z\n"
+            "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode("ascii")
+
+
+def vertex_bytes(points: np.ndarray, colors: np.ndarray) -> bytes:
+    rows = np.empty(points.shape[0], dtype=VERTEX_DTYPE)
+    rows["x"], rows["y"], rows["z"] = points[:, 0], points[:, 1], points[:, 2]
+    rows["red"], rows["green"], rows["blue"] = colors[:, 0], colors[:, 1], colors[:, 2]
+    return rows.tobytes()
+
+
+def write_binary_ply(fh: BinaryIO, points: np.ndarray, colors: np.ndarray) -> None:
+    """Whole cloud as a binary PLY to an open file (callers own temp files and renames)."""
+    fh.write(binary_header(str(points.shape[0])))
+    fh.write(vertex_bytes(points, colors))
@@ -16,11 +16,24 @@ import numpy as np
 from PIL import Image  # type: ignore
 
 
-def render_preview_rgb(points: np.ndarray, colors: np.ndarray, *, size: Optional[int] = None, logger=None) -> Optional[np.ndarray]:
+def full_window(points: np.ndarray) -> Optional[Tuple[float, float, float]]:
+    """Square (x0, y0, span) window `render_preview_rgb` uses for the whole cloud."""
+    pts = points[np.isfinite(points).all(axis=1)]
+    if pts.shape[0] == 0:
+        return None
+    xmin, xmax = float(pts[:, 0].min()), float(pts[:, 0].max())
+    ymin, ymax = float(pts[:, 1].min()), float(pts[:, 1].max())
+    span = max(xmax - xmin, ymax - ymin, 1e-9)
+    return 0.5 * (xmin + xmax) - 0.5 * span, 0.5 * (ymin + ymax) - 0.5 * span, span
+
+
+def render_preview_rgb(points: np.ndarray, colors: np.ndarray, *, size: Optional[int] = None, logger=None, window: Optional[Tuple[float, float, float]] = None) -> Optional[np.ndarray]:
     """Rasterize a point cloud into an RGB image (numpy array).
 
     - Orthographic XY projection with uniform scaling and centering.
     - Y axis is mapped directly (increasing Y appears higher in the image).
+    - ``window=(x0, y0, span)`` renders only that square of the XY plane (crop);
+      points outside it are dropped.
     - Returns an RGB ndarray of shape (size, size, 3) or None on failure.
     """
     if size is None:
@@ -42,22 +55,32 @@ def render_preview_rgb(points: np.ndarray, colors: np.ndarray, *, size: Optional
         cols = cols[mask]
         if logger:
             logger.debug("Dropped %d invalid points before preview", dropped)
+    if window is not None:
+        x0, y0, wspan = window
+        inside = (pts[:, 0] >= x0) & (pts[:, 0] <= x0 + wspan) & (pts[:, 1] >= y0) & (pts[:, 1] <= y0 + wspan)
+        pts = pts[inside]
+        cols = cols[inside]
     if pts.shape[0] == 0:
         if logger:
             logger.warning("All points invalid for preview image")
         return None
     xs, ys, zs = pts[:,0], pts[:,1], pts[:,2]
-    xmin,xmax = float(xs.min()), float(xs.max()); xr = xmax - xmin
-    ymin,ymax = float(ys.min()), float(ys.max()); yr = ymax - ymin
-    if xr <= 0 and yr <= 0:
-        if logger:
-            logger.warning("Degenerate bounds for preview image")
-        return None
-    span = max(xr, yr, 1e-9)
-    # Centering box (use uniform span to preserve aspect)
-    cx = 0.5 * (xmin + xmax)
-    cy = 0.5 * (ymin + ymax)
-    half = 0.5 * span
+    if window is not None:
+        span = max(float(window[2]), 1e-9)
+        half = 0.5 * span
+        cx, cy = float(window[0]) + half, float(window[1]) + half
+    else:
+        xmin,xmax = float(xs.min()), float(xs.max()); xr = xmax - xmin
+        ymin,ymax = float(ys.min()), float(ys.max()); yr = ymax - ymin
+        if xr <= 0 and yr <= 0:
+            if logger:
+                logger.warning("Degenerate bounds for preview image")
+            return None
+        span = max(xr, yr, 1e-9)
+        # Centering box (use uniform span to preserve aspect)
+        cx = 0.5 * (xmin + xmax)
+        cy = 0.5 * (ymin + ymax)
+        half = 0.5 * span
     # Normalized coordinates in [0,1] (may slightly exceed due to centering when xr!=yr; clip)
     nx = (xs - (cx - half)) / span
     ny = (ys - (cy - half)) / span
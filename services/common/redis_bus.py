@@ -44,6 +44,26 @@ def get_client(url: Optional[str] = None):
     return redis.Redis.from_url(url, decode_responses=True)
 
 
+_SHARED_CLIENTS: Dict[Tuple[int, str], object] = {}
+
+
+def get_shared_client(url: Optional[str] = None):
+    """Per-process cached client (redis-py clients are thread-safe but not fork-safe).
+
+    Pool workers use this instead of receiving a client from the parent, so the
+    same handler works on both thread and process executors.
+    """
+    if url is None:
+        url = os.environ.get("REDIS_URL", "")
+    key = (os.getpid(), url)
+    client = _SHARED_CLIENTS.get(key)
+    if client is None:
+        client = get_client(url)
+        if client is not None:
+            _SHARED_CLIENTS[key] = client
+    return client
+
+
 def ensure_group(r, stream: str, group: str) -> None:
     """Ensure a consumer group exists on a stream.
 
@@ -94,11 +114,14 @@ def xadd_safe(r, stream: str, fields: Dict[str, str]) -> str:
         return ""
 
 
-def xack_safe(r, stream: str, group: str, msg_id: str) -> None:
+def xack_safe(r, stream: str, group: str, *msg_ids: str) -> None:
+    """XACK one or more ids in a single round trip."""
+    if not msg_ids:
+        return
     try:
-        r.xack(stream, group, msg_id)
+        r.xack(stream, group, *msg_ids)
     except Exception:
-        LOGGER.exception("Failed to XACK %s %s", stream, msg_id)
+        LOGGER.exception("Failed to XACK %s %s", stream, ",".join(msg_ids))
 
 
 def readgroup_blocking(
@@ -130,3 +153,66 @@ def readgroup_blocking(
             else:
                 LOGGER.debug("xreadgroup error: %s", msg)
         return []
+
+
+def autoclaim_idle(
+    r,
+    stream: str,
+    group: str,
+    consumer: str,
+    min_idle_ms: int,
+    start_id: str = "0-0",
+    count: int = 10,
+) -> Tuple[str, List[Tuple[str, Dict[str, str]]], List[str]]:
+    """XAUTOCLAIM entries pending longer than ``min_idle_ms`` (Redis >= 6.2).
+
+    Returns (next cursor, [(id, fields)], ids whose entry was deleted from the
+    stream). Errors (old server, missing group) yield an empty page.
+    """
+    try:
+        res = r.xautoclaim(stream, group, consumer, min_idle_time=min_idle_ms, start_id=start_id, count=count)
+    except Exception as e:
+        LOGGER.debug("xautoclaim %s failed: %s", stream, e)
+        return "0-0", [], []
+    cursor, entries = res[0], res[1]
+    deleted = [m for m, f in entries if not f] + [str(m) for m in (res[2] if len(res) > 2 else [])]
+    return str(cursor), [(m, f) for m, f in entries if f], deleted
+
+
+def touch_pending(r, stream: str, group: str, consumer: str, msg_ids: Iterable[str]) -> None:
+    """Reset the idle time of entries this consumer is still working on (XCLAIM JUSTID; delivery counts are unchanged)."""
+    ids = list(msg_ids)
+    if not ids:
+        return
+    try:
+        r.xclaim(stream, group, consumer, 0, ids, justid=True)
+    except Exception as e:
+        LOGGER.debug("xclaim %s failed: %s", stream, e)
+
+
+def delivery_counts(r, stream: str, group: str, msg_ids: Iterable[str]) -> Dict[str, int]:
+    """XPENDING times_delivered per pending id (one pipelined round trip); ids no longer pending are left out."""
+    ids = list(msg_ids)
+    if not ids:
+        return {}
+    pipe = r.pipeline(transaction=False)
+    for msg_id in ids:
+        pipe.xpending_range(stream, group, min=msg_id, max=msg_id, count=1)
+    try:
+        pages = pipe.execute()
+    except Exception as e:
+        LOGGER.debug("xpending %s failed: %s", stream, e)
+        return {}
+    return {m: int(rows[0]["times_delivered"]) for m, rows in zip(ids, pages) if rows}
+
+
+def dead_letter(r, stream: str, group: str, msg_id: str, fields: Dict[str, str], dead_stream: str, deliveries: int) -> bool:
+    """Copy an entry to ``dead_stream`` (with its origin and delivery count), then XACK it.
+
+    The entry stays pending when the copy fails, so it is never lost.
+    """
+    doc = dict(fields, dead_stream=stream, dead_group=group, dead_id=msg_id, dead_deliveries=str(deliveries))
+    if not xadd_safe(r, dead_stream, doc):
+        return False
+    xack_safe(r, stream, group, msg_id)
+    return True
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Optional in-memory point-cloud handoff between co-located stages.
+
+The converter copies the decoded arrays into a named POSIX shared-memory
+segment and adds three fields to its Redis event:
+
+- ``shm_name``  – segment name (``/dev/shm/<name>``)
+- ``shm_count`` – number of points N
+- ``shm_host``  – hostname of the producer; only consumers on the same host try it
+
+Layout: N*3 float32 xyz followed by N*3 uint8 rgb. Consumers map the segment
+with zero copies (read-only views) and fall back to the PLY path on any
+mismatch. The producer owns the lifetime: `ShmReaper` unlinks segments after a
+TTL, which is safe because a mapping stays valid after its name is unlinked.
+Segment names start with ``PREFIX``; a new reaper sweeps ``/dev/shm`` for
+them, so segments left by a crashed producer are unlinked (past the TTL) or
+adopted and counted against ``max_bytes`` (still within it).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import sys
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+LOGGER = logging.getLogger("shm-handoff")
+
+PREFIX = "semseg-"
+SHM_DIR = Path("/dev/shm")
+
+
+def _untrack(shm: shared_memory.SharedMemory) -> None:
+    """Stop this process's resource tracker from unlinking a segment it does not own (Python < 3.13)."""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    except Exception:
+        pass
+
+
+def publish_arrays(frame_id: str, points: np.ndarray, colors: np.ndarray) -> Optional[Tuple[shared_memory.SharedMemory, Dict[str, str]]]:
+    """Copy arrays into a new segment; returns (segment, event fields) or None if /dev/shm is unavailable."""
+    n = int(points.shape[0])
+    if n == 0:
+        return None
+    pts_bytes = n * 3 * 4
+    name = f"{PREFIX}{frame_id}-{int(time.time() * 1000)}"
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=pts_bytes + n * 3)
+    except Exception as e:
+        LOGGER.warning("shm: unable to create segment for %s: %s", frame_id, e)
+        return None
+    np.ndarray((n, 3), dtype=np.float32, buffer=shm.buf, offset=0)[:] = points
+    np.ndarray((n, 3), dtype=np.uint8, buffer=shm.buf, offset=pts_bytes)[:] = colors
+    return shm, {"shm_name": shm.name, "shm_count": str(n), "shm_host": socket.gethostname()}
+
+
+def attach_arrays(fields: Dict[str, str]) -> Optional[Tuple[np.ndarray, np.ndarray, shared_memory.SharedMemory]]:
+    """Map the segment referenced by an event; None when absent, remote or already reaped.
+
+    The returned arrays are read-only views into the segment; drop them before
+    calling ``shm.close()``.
+    """
+    name, count = fields.get("shm_name"), fields.get("shm_count")
+    if not name or not count or fields.get("shm_host") != socket.gethostname():
+        return None
+    try:
+        n = int(count)
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            _untrack(shm)
+    except Exception as e:
+        LOGGER.debug("shm: %s not attachable (%s); falling back to PLY", name, e)
+        return None
+    pts_bytes = n * 3 * 4
+    if shm.size < pts_bytes + n * 3:
+        shm.close()
+        return None
+    points = np.ndarray((n, 3), dtype=np.float32, buffer=shm.buf, offset=0)
+    colors = np.ndarray((n, 3), dtype=np.uint8, buffer=shm.buf, offset=pts_bytes)
+    points.flags.writeable = False
+    colors.flags.writeable = False
+    return points, colors, shm
+
+
+def release(shm: Optional[shared_memory.SharedMemory]) -> None:
+    """Close a consumer mapping; tolerate views that are still referenced."""
+    if shm is None:
+        return
+    try:
+        shm.close()
+    except BufferError:
+        LOGGER.debug("shm: %s still has live views; leaving mapping to GC", shm.name)
+
+
+class ShmReaper:
+    """Producer-side registry that unlinks segments after ``ttl`` seconds or beyond ``max_bytes``."""
+
+    def __init__(self, ttl: float = 30.0, max_bytes: int = 256 * 1024 * 1024, sweep: bool = True) -> None:
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._live: List[Tuple[float, shared_memory.SharedMemory]] = []
+        if sweep:
+            self.sweep()
+
+    def sweep(self) -> int:
+        """Unlink ``PREFIX`` segments older than the TTL (left by an earlier producer); adopt younger ones."""
+        try:
+            entries = [e for e in os.scandir(SHM_DIR) if e.name.startswith(PREFIX)]
+        except OSError:
+            return 0  # no /dev/shm (non-Linux)
+        tracked = {shm.name for _, shm in self._live}
+        dropped = 0
+        for entry in entries:
+            if entry.name in tracked:
+                continue
+            try:
+                age = max(0.0, time.time() - entry.stat().st_mtime)
+                if age >= self.ttl:
+                    os.unlink(entry.path)
+                    dropped += 1
+                else:
+                    self._live.append((time.monotonic() - age, shared_memory.SharedMemory(name=entry.name)))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                LOGGER.debug("shm: sweep of %s failed: %s", entry.name, e)
+        if dropped or len(self._live) > len(tracked):
+            LOGGER.info("shm: swept %d stale segment(s), adopted %d", dropped, len(self._live) - len(tracked))
+        return dropped
+
+    @property
+    def live_bytes(self) -> int:
+        return sum(s.size for _, s in self._live)
+
+    def has_room(self, nbytes: int) -> bool:
+        return self.live_bytes + nbytes <= self.max_bytes
+
+    def track(self, shm: shared_memory.SharedMemory) -> None:
+        self._live.append((time.monotonic(), shm))
+
+    def reap(self, force: bool = False) -> int:
+        now = time.monotonic()
+        keep: List[Tuple[float, shared_memory.SharedMemory]] = []
+        dropped = 0
+        for created, shm in self._live:
+            if force or now - created >= self.ttl:
+                try:
+                    shm.close()
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    LOGGER.debug("shm: unlink %s failed: %s", shm.name, e)
+                dropped += 1
+            else:
+                keep.append((created, shm))
+        self._live = keep
+        return dropped
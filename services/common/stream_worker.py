@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Reusable Redis Streams consumer loop shared by the pipeline workers.
+
+`part_labeler`, `redactor` and `analytics` all follow the same pattern:
+XREADGROUP a batch, run a handler per message, publish, XACK. This module
+keeps that loop in one place so every stage is tuned the same way:
+
+- read batch size (``count`` passed to XREADGROUP)
+- in-flight concurrency on a thread or process pool
+- prefetch (messages read ahead of free workers)
+- batched XACKs (one round trip for several ids)
+- optional re-delivery of pending messages (XAUTOCLAIM once idle for
+  ``reclaim_idle`` seconds), which retries parked/failed messages and
+  picks up work left behind by a dead consumer; a message delivered more
+  than ``max_deliveries`` times (XPENDING times_delivered) is copied to a
+  dead-letter stream (``<stream>:dead`` by default) and acked instead.
+  Messages still in flight are re-claimed by their own consumer with
+  XCLAIM JUSTID every third of ``reclaim_idle``, so a slow handler's
+  message never looks idle to another replica
+- graceful drain on SIGTERM/SIGINT (stop reading, finish in-flight, flush acks)
+- per-message timing (debug log, running totals in ``StreamWorker.stats`` and
+  the ``semseg_stage_seconds{step="handle"}`` histogram from `metrics`)
+
+Handler contract: ``handler(msg_id, fields)`` is called once per message.
+Returning anything but ``False`` acks the message; returning ``False`` leaves
+it pending ("parked"; with ``reclaim_idle`` it is handed to the handler again
+later). Exceptions are logged and the message is acked only when the
+worker was built with ``ack_on_error=True``. With ``executor="process"`` the
+handler and its bound arguments must be picklable (module-level function or
+``functools.partial`` of one).
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.common import metrics
+from services.common.redis_bus import autoclaim_idle, dead_letter, delivery_counts, ensure_group, readgroup_blocking, touch_pending, xack_safe
+
+LOGGER = logging.getLogger("stream-worker")
+
+Handler = Callable[[str, Dict[str, str]], Optional[bool]]
+
+
+def add_worker_args(parser: argparse.ArgumentParser, *, batch_size: int = 1, concurrency: int = 1, executor: str = "thread", prefetch: int = 0, ack_batch: int = 1, reclaim_idle: float = 0.0, max_deliveries: int = 10) -> None:
+    """Register the common StreamWorker tuning flags on a service CLI (defaults are per service)."""
+    g = parser.add_argument_group("stream worker")
+    g.add_argument("--batch-size", type=int, default=batch_size, help="Max messages fetched per XREADGROUP call")
+    g.add_argument("--concurrency", type=int, default=concurrency, help="Messages handled in parallel")
+    g.add_argument("--executor", choices=["thread", "process"], default=executor, help="Pool type used for --concurrency")
+    g.add_argument("--prefetch", type=int, default=prefetch, help="Extra messages read ahead of free workers")
+    g.add_argument("--ack-batch", type=int, default=ack_batch, help="Number of completed messages acked per XACK call")
+    g.add_argument("--ack-interval", type=float, default=0.5, help="Max seconds a completed message waits for its XACK")
+    g.add_argument("--reclaim-idle", type=float, default=reclaim_idle, help="Re-deliver pending messages idle this many seconds (0 disables; Redis >= 6.2)")
+    g.add_argument("--max-deliveries", type=int, default=max_deliveries, help="Dead-letter a reclaimed message once it has been delivered more than this many times (0 = retry forever)")
+    g.add_argument("--dead-letter-stream", default="", help="Stream receiving dead-lettered messages (default <in-stream>:dead)")
+
+
+def _timed_call(handler: Handler, msg_id: str, fields: Dict[str, str]) -> Tuple[Optional[bool], float]:
+    """Run the handler and return (result, seconds). Module-level so it pickles."""
+    t0 = time.perf_counter()
+    res = handler(msg_id, fields)
+    return res, time.perf_counter() - t0
+
+
+def _timed_call_captured(handler: Handler, msg_id: str, fields: Dict[str, str]) -> Tuple[Optional[bool], float, List[Tuple]]:
+    """Process-pool variant: also return metric observations made in the child."""
+    with metrics.capture() as journal:
+        res, took = _timed_call(handler, msg_id, fields)
+    return res, took, journal
+
+
+class StreamWorker:
+    """Consume one stream/group with a pool of handlers."""
+
+    def __init__(
+        self,
+        r,
+        stream: str,
+        group: str,
+        consumer: str,
+        handler: Handler,
+        *,
+        batch_size: int = 1,
+        concurrency: int = 1,
+        executor: str = "thread",
+        prefetch: int = 0,
+        ack_batch: int = 1,
+        ack_interval: float = 0.5,
+        ack_on_error: bool = False,
+        block_ms: int = 1000,
+        reclaim_idle: float = 0.0,
+        max_deliveries: int = 0,
+        dead_letter_stream: str = "",
+        name: str = "worker",
+    ) -> None:
+        self.r = r
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self.handler = handler
+        self.batch_size = max(1, int(batch_size))
+        self.concurrency = max(1, int(concurrency))
+        self.executor_kind = executor
+        self.prefetch = max(0, int(prefetch))
+        self.ack_batch = max(1, int(ack_batch))
+        self.ack_interval = max(0.0, float(ack_interval))
+        self.ack_on_error = ack_on_error
+        self.block_ms = max(1, int(block_ms))
+        self.reclaim_idle_ms = max(0, int(reclaim_idle * 1000))
+        self.max_deliveries = max(0, int(max_deliveries))
+        self.dead_letter_stream = dead_letter_stream or f"{stream}:dead"
+        self.name = name
+        self.stats: Dict[str, float] = {"processed": 0, "failed": 0, "deferred": 0, "reclaimed": 0, "dead": 0, "handler_s": 0.0}
+        self._stop = threading.Event()
+        self._pending_acks: List[str] = []
+        self._last_ack = time.monotonic()
+        self._reclaim_cursor = "0-0"
+        self._last_reclaim = 0.0
+        self._last_touch = 0.0
+
+    @classmethod
+    def from_args(cls, r, args: argparse.Namespace, handler: Handler, **kwargs) -> "StreamWorker":
+        """Build a worker from the flags registered by `add_worker_args` plus the usual redis_* flags."""
+        kwargs.setdefault("block_ms", int(getattr(args, "poll_interval", 1.0) * 1000))
+        return cls(
+            r,
+            args.redis_in_stream,
+            args.redis_group,
+            args.redis_consumer,
+            handler,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            executor=args.executor,
+            prefetch=args.prefetch,
+            ack_batch=args.ack_batch,
+            ack_interval=args.ack_interval,
+            reclaim_idle=getattr(args, "reclaim_idle", 0.0),
+            max_deliveries=getattr(args, "max_deliveries", 0),
+            dead_letter_stream=getattr(args, "dead_letter_stream", ""),
+            **kwargs,
+        )
+
+    # -- lifecycle -------------------------------------------------------------
+    def stop(self, *_: object) -> None:
+        """Request a graceful drain: stop reading, finish in-flight work, flush acks."""
+        if not self._stop.is_set():
+            LOGGER.info("%s: stop requested; draining in-flight messages", self.name)
+        self._stop.set()
+
+    def _install_signal_handlers(self) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                signal.signal(sig, self.stop)
+            except (ValueError, OSError):  # pragma: no cover
+                pass
+
+    def _make_executor(self) -> Executor:
+        if self.executor_kind == "process":
+            return ProcessPoolExecutor(max_workers=self.concurrency)
+        return ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=self.name)
+
+    # -- acks ------------------------------------------------------------------
+    def _ack(self, msg_id: str) -> None:
+        self._pending_acks.append(msg_id)
+        if len(self._pending_acks) >= self.ack_batch:
+            self._flush_acks()
+
+    def _flush_acks(self, force: bool = False) -> None:
+        if not self._pending_acks:
+            self._last_ack = time.monotonic()
+            return
+        if not force and len(self._pending_acks) < self.ack_batch and (time.monotonic() - self._last_ack) < self.ack_interval:
+            return
+        ids, self._pending_acks = self._pending_acks, []
+        xack_safe(self.r, self.stream, self.group, *ids)
+        self._last_ack = time.monotonic()
+
+    # -- re-delivery -----------------------------------------------------------
+    def _touch(self, inflight_ids: set) -> None:
+        """Keep in-flight entries from going idle (and being reclaimed elsewhere)."""
+        now = time.monotonic()
+        if not self.reclaim_idle_ms or not inflight_ids or (now - self._last_touch) * 1000 < self.reclaim_idle_ms / 3:
+            return
+        self._last_touch = now
+        touch_pending(self.r, self.stream, self.group, self.consumer, inflight_ids)
+
+    def _reclaim(self, room: int, inflight_ids: set) -> List[Tuple[str, Dict[str, str]]]:
+        """Pending entries idle past ``reclaim_idle``, at most every half interval."""
+        now = time.monotonic()
+        if not self.reclaim_idle_ms or room <= 0 or (now - self._last_reclaim) * 1000 < self.reclaim_idle_ms / 2:
+            return []
+        self._last_reclaim = now
+        cursor, entries, deleted = autoclaim_idle(self.r, self.stream, self.group, self.consumer, self.reclaim_idle_ms, self._reclaim_cursor, room)
+        self._reclaim_cursor = cursor if cursor not in ("0", "0-0") else "0-0"
+        for msg_id in deleted:  # trimmed from the stream; nothing left to retry
+            self._ack(msg_id)
+        out = [(m, f) for m, f in entries if m not in inflight_ids]
+        if self.max_deliveries and out:
+            out = self._dead_letter_exhausted(out)
+        self.stats["reclaimed"] += len(out)
+        if out:
+            LOGGER.debug("%s: reclaimed %d pending message(s)", self.name, len(out))
+        return out
+
+    def _dead_letter_exhausted(self, entries: List[Tuple[str, Dict[str, str]]]) -> List[Tuple[str, Dict[str, str]]]:
+        """Move entries delivered more than ``max_deliveries`` times to the dead-letter stream; return the rest."""
+        counts = delivery_counts(self.r, self.stream, self.group, (m for m, _ in entries))
+        keep = []
+        for msg_id, fields in entries:
+            n = counts.get(msg_id, 0)
+            if n <= self.max_deliveries:
+                keep.append((msg_id, fields))
+            elif dead_letter(self.r, self.stream, self.group, msg_id, fields, self.dead_letter_stream, n):
+                self.stats["dead"] += 1
+                metrics.FRAMES_DEAD_LETTERED.inc(stage=self.name)
+                LOGGER.warning("%s: %s (frame %s) delivered %d times; moved to %s", self.name, msg_id, fields.get("frame_id"), n, self.dead_letter_stream)
+        return keep
+
+    # -- main loop -------------------------------------------------------------
+    def _complete(self, fut: Future, msg_id: str, fields: Dict[str, str], t_submit: float) -> None:
+        wall = time.perf_counter() - t_submit
+        try:
+            res, took, *journal = fut.result()
+        except Exception:
+            self.stats["failed"] += 1
+            metrics.FRAMES_FAILED.inc(stage=self.name)
+            LOGGER.exception("%s: handler failed for %s (frame %s)", self.name, msg_id, fields.get("frame_id"))
+            if self.ack_on_error:
+                self._ack(msg_id)
+            return
+        if journal:
+            metrics.replay(journal[0])
+        self.stats["handler_s"] += took
+        metrics.observe_step(self.name, "handle", took)
+        if res is False:
+            self.stats["deferred"] += 1
+            LOGGER.debug("%s: left %s pending (frame %s)", self.name, msg_id, fields.get("frame_id"))
+            return
+        self.stats["processed"] += 1
+        metrics.FRAMES_PROCESSED.inc(stage=self.name)
+        LOGGER.debug("%s: handled %s (frame %s) in %.1f ms (%.1f ms incl. queue)", self.name, msg_id, fields.get("frame_id"), took * 1000.0, wall * 1000.0)
+        self._ack(msg_id)
+
+    def run(self) -> None:
+        ensure_group(self.r, self.stream, self.group)
+        self._install_signal_handlers()
+        max_inflight = self.concurrency + self.prefetch
+        inflight: Dict[Future, Tuple[str, Dict[str, str], float]] = {}
+        LOGGER.info(
+            "%s: consuming %s as %s/%s | batch=%d concurrency=%d (%s) prefetch=%d ack_batch=%d",
+            self.name, self.stream, self.group, self.consumer, self.batch_size, self.concurrency,
+            self.executor_kind, self.prefetch, self.ack_batch,
+        )
+        pool = self._make_executor()
+        call = _timed_call_captured if self.executor_kind == "process" else _timed_call
+        try:
+            while not self._stop.is_set():
+                room = max_inflight - len(inflight)
+                inflight_ids = {v[0] for v in inflight.values()}
+                self._touch(inflight_ids)
+                for msg_id, fields in self._reclaim(room, inflight_ids):
+                    fut = pool.submit(call, self.handler, msg_id, fields)
+                    inflight[fut] = (msg_id, fields, time.perf_counter())
+                room = max_inflight - len(inflight)
+                if room > 0:
+                    # Only block on Redis when there is nothing in flight to collect
+                    block = self.block_ms if not inflight else min(self.block_ms, 50)
+                    entries = readgroup_blocking(
+                        self.r, self.stream, self.group, self.consumer,
+                        count=min(self.batch_size, room), block_ms=block,
+                    )
+                    for _, messages in entries or []:
+                        for msg_id, fields in messages:
+                            fut = pool.submit(call, self.handler, msg_id, fields)
+                            inflight[fut] = (msg_id, fields, time.perf_counter())
+                if inflight:
+                    done, _ = wait(list(inflight), timeout=0 if room > 0 else self.block_ms / 1000.0, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        msg_id, fields, t_submit = inflight.pop(fut)
+                        self._complete(fut, msg_id, fields, t_submit)
+                self._flush_acks()
+            # Drain: no new reads, finish what we hold
+            for fut in list(inflight):
+                msg_id, fields, t_submit = inflight.pop(fut)
+                self._complete(fut, msg_id, fields, t_submit)
+        finally:
+            self._flush_acks(force=True)
+            pool.shutdown(wait=True)
+            LOGGER.info(
+                "%s: stopped | processed=%d failed=%d deferred=%d reclaimed=%d dead=%d handler_time=%.1fs",
+                self.name, self.stats["processed"], self.stats["failed"], self.stats["deferred"], self.stats["reclaimed"], self.stats["dead"], self.stats["handler_s"],
+            )
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Per-frame latency tracing carried in Redis event fields.
+
+Every stage copies the ``t_*`` fields of the event it consumed into the event
+it publishes and adds its own ``t_<stage>_recv`` / ``t_<stage>_done`` epoch
+timestamps (seconds, string-encoded like every other stream field). The last
+event of a frame therefore holds its whole path through the pipeline.
+
+Stages in pipeline order: ingest -> convert -> label -> (redact | analytics).
+``ingest_api`` has no Redis; it leaves its stamps in a ``<drc-stem>.trace.json``
+sidecar that ``convert-ply`` folds into the first event.
+"""
+from __future__ import annotations
+
+import math
+import time
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+STAGES: Sequence[str] = ("ingest", "convert", "label", "redact", "analytics")
+# Upstream stage for queue-wait computation (redact and analytics both follow label)
+PREVIOUS: Dict[str, Optional[str]] = {"ingest": None, "convert": "ingest", "label": "convert", "redact": "label", "analytics": "label"}
+PREFIX = "t_"
+
+
+def now() -> str:
+    return f"{time.time():.6f}"
+
+
+def carry(fields: Mapping[str, str]) -> Dict[str, str]:
+    """Return the trace fields of an inbound event."""
+    return {k: str(v) for k, v in fields.items() if str(k).startswith(PREFIX)}
+
+
+def inbound(fields: Mapping[str, str], stage: str) -> Dict[str, str]:
+    """Carry upstream stamps and mark ``stage`` as received now."""
+    trace = carry(fields)
+    trace[f"{PREFIX}{stage}_recv"] = now()
+    return trace
+
+
+def finish(trace: Optional[Dict[str, str]], stage: str) -> Dict[str, str]:
+    """Mark ``stage`` as done now; call right before publishing."""
+    trace = dict(trace or {})
+    trace[f"{PREFIX}{stage}_done"] = now()
+    return trace
+
+
+def _ts(fields: Mapping[str, str], stage: str, what: str) -> Optional[float]:
+    try:
+        return float(fields[f"{PREFIX}{stage}_{what}"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def timeline(fields: Mapping[str, str]) -> List[Dict[str, Optional[float]]]:
+    """Per-stage recv/done/duration and queue wait since the upstream stage finished."""
+    out: List[Dict[str, Optional[float]]] = []
+    for stage in STAGES:
+        recv, done = _ts(fields, stage, "recv"), _ts(fields, stage, "done")
+        if recv is None and done is None:
+            continue
+        prev = PREVIOUS.get(stage)
+        prev_done = _ts(fields, prev, "done") if prev else None
+        out.append({
+            "stage": stage,  # type: ignore[dict-item]
+            "recv": recv,
+            "done": done,
+            "duration": (done - recv) if (recv is not None and done is not None) else None,
+            "wait": (recv - prev_done) if (recv is not None and prev_done is not None) else None,
+        })
+    return out
+
+
+def end_to_end(fields: Mapping[str, str]) -> Optional[float]:
+    """Seconds from the first recorded receive to the last recorded finish."""
+    recvs = [t for t in (_ts(fields, s, "recv") for s in STAGES) if t is not None]
+    dones = [t for t in (_ts(fields, s, "done") for s in STAGES) if t is not None]
+    if not recvs or not dones:
+        return None
+    return max(dones) - min(recvs)
+
+
+def percentile(values: Iterable[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100)."""
+    vals = sorted(values)
+    if not vals:
+        return None
+    rank = max(1, int(math.ceil(q / 100.0 * len(vals))))
+    return vals[min(rank, len(vals)) - 1]
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
+import json
 import os
 import re
+import time
 from pathlib import Path
 from typing import Optional
 
@@ -27,7 +29,24 @@ def to_int(value: Optional[str], default: int = 0) -> int:
     except ValueError: raise HTTPException(status_code=400, detail="Invalid layer id")
 
 
-async def write_stream_to_file(dest_path: Path, upload: Optional[UploadFile], body: Optional[bytes]) -> None:
+def sanitize_sequence_id(sequence_id: Optional[str]) -> Optional[str]:
+    if not sequence_id: return None
+    if not re.fullmatch(r"[A-Za-z0-9_.\-]{1,128}", sequence_id): raise HTTPException(status_code=400, detail="Invalid sequence id")
+    return sequence_id
+
+
+def write_trace(dest_path: Path, recv_ts: float, sequence_id: Optional[str] = None) -> None:
+    """Leave ingest timestamps (and the capture sequence) next to the DRC for convert-ply (see services/common/tracing.py)."""
+    trace_path = dest_path.with_suffix(".trace.json")
+    tmp = trace_path.with_suffix(".json.tmp")
+    doc = {"t_ingest_recv": f"{recv_ts:.6f}", "t_ingest_done": f"{time.time():.6f}"}
+    if sequence_id: doc["sequence_id"] = sequence_id
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(doc, fh)
+    tmp.replace(trace_path)
+
+
+async def write_stream_to_file(dest_path: Path, upload: Optional[UploadFile], body: Optional[bytes], recv_ts: Optional[float] = None, sequence_id: Optional[str] = None) -> None:
     tmp_path = dest_path.with_suffix(dest_path.suffix + ".tmp")
     try:
         with open(tmp_path, "wb") as f:
@@ -38,6 +57,10 @@ async def write_stream_to_file(dest_path: Path, upload: Optional[UploadFile], bo
                     f.write(chunk)
             elif body: f.write(body)
             else: raise HTTPException(status_code=400, detail="Empty upload payload")
+        # Trace goes first so convert-ply never sees the DRC without it
+        if recv_ts is not None:
+            try: write_trace(dest_path, recv_ts, sequence_id)
+            except Exception: pass
         tmp_path.replace(dest_path)
     finally:
         try:
@@ -58,15 +81,19 @@ async def upload_single_frame(
     request: Request,
     file: Optional[UploadFile] = File(default=None),
     x_layer_id: Optional[str] = Header(default=None, convert_underscores=True),
+    x_sequence_id: Optional[str] = Header(default=None, convert_underscores=True),
 ):
     """
     Upload a single DRC for a frame. Stored as 0-<frame_id>.drc by default.
     Accepts either multipart/form-data (file field) or raw application/octet-stream body.
     Optional header X-Layer-Id can override the default layer id (0).
+    Optional header X-Sequence-Id names the capture sequence (carried on the pipeline events).
     """
+    recv_ts = time.time()
     out_dir = Path(get_out_dir())
     frame_id = sanitize_frame_id(frame_id)
     layer = to_int(x_layer_id, default=0)
+    sequence_id = sanitize_sequence_id(x_sequence_id)
 
     payload: Optional[bytes] = None
     if file is None:
@@ -75,11 +102,12 @@ async def upload_single_frame(
             raise HTTPException(status_code=400, detail="No upload payload provided")
 
     dest = out_dir / f"{layer}-{frame_id}.drc"
-    await write_stream_to_file(dest, file, payload)
+    await write_stream_to_file(dest, file, payload, recv_ts, sequence_id)
     return JSONResponse(status_code=201, content={
         "stored": str(dest),
         "layer": layer,
-        "frame_id": frame_id
+        "frame_id": frame_id,
+        "sequence_id": sequence_id
     })
 
 
@@ -89,15 +117,19 @@ async def upload_tiled(
     frame_id: str,
     request: Request,
     file: Optional[UploadFile] = File(default=None),
+    x_sequence_id: Optional[str] = Header(default=None, convert_underscores=True),
 ):
     """
     Upload a DRC tile for a given layer and frame.
     Stored as <layer>-<frame_id>.drc under the output directory.
     Accepts either multipart/form-data (file field) or raw application/octet-stream body.
+    Optional header X-Sequence-Id names the capture sequence.
     """
+    recv_ts = time.time()
     out_dir = Path(get_out_dir())
     frame_id = sanitize_frame_id(frame_id)
     layer = to_int(str(layer))
+    sequence_id = sanitize_sequence_id(x_sequence_id)
 
     payload: Optional[bytes] = None
     if file is None:
@@ -106,11 +138,12 @@ async def upload_tiled(
             raise HTTPException(status_code=400, detail="No upload payload provided")
 
     dest = out_dir / f"{layer}-{frame_id}.drc"
-    await write_stream_to_file(dest, file, payload)
+    await write_stream_to_file(dest, file, payload, recv_ts, sequence_id)
     return JSONResponse(status_code=201, content={
         "stored": str(dest),
         "layer": layer,
-        "frame_id": frame_id
+        "frame_id": frame_id,
+        "sequence_id": sequence_id
     })
 
 
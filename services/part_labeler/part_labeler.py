@@ -4,13 +4,18 @@
 from __future__ import annotations
 
 import argparse
+import functools
+import hashlib
 import json
 import logging
 import os
+import threading
 import time
+import types
+import zlib
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import sys
 ROOT_DIR = Path(__file__).resolve().parents[2]; sys.path.insert(0, str(ROOT_DIR)) if str(ROOT_DIR) not in sys.path else None
@@ -21,22 +26,45 @@ try:
 except Exception:  # pragma: no cover
     pmp = None  # type: ignore
 from plyfile import PlyData  # lightweight PLY reader/writer without pyvista
+from services.common import metrics, tracing  # type: ignore
 
 # Import preview helpers
 try:  # pragma: no cover
-    from services.common.preview import generate_preview, render_preview_rgb  # type: ignore
+    from services.common.preview import full_window, generate_preview, render_preview_rgb  # type: ignore
 except Exception:  # pragma: no cover
     generate_preview = None  # type: ignore
-    render_preview_rgb = None  # type: ignore
+    render_preview_rgb = full_window = None  # type: ignore
+
+# Optional shared-memory handoff from a co-located converter
+try:  # pragma: no cover
+    from services.common import shm_handoff  # type: ignore
+except Exception:  # pragma: no cover
+    shm_handoff = None  # type: ignore
+
+# Alternative pose backends (onnxruntime is optional)
+try:  # pragma: no cover
+    from services.part_labeler.pose_backends import get_backend  # type: ignore
+except Exception:  # pragma: no cover
+    get_backend = None  # type: ignore
+
+# Downstream stages, only needed for --fused mode
+try:  # pragma: no cover
+    from services.redactor.redactor import anonymized_path, redact_frame  # type: ignore
+    from services.analytics.analytics import analyze_frame, get_sequence_cache, get_timeseries_store  # type: ignore
+except Exception:  # pragma: no cover
+    anonymized_path = redact_frame = analyze_frame = get_sequence_cache = get_timeseries_store = None  # type: ignore
 
 # Import Redis helpers
 try:  # pragma: no cover
-    from services.common.redis_bus import get_client, ensure_group, readgroup_blocking, xack_safe, xadd_safe  # type: ignore
+    from services.common.redis_bus import get_client, get_shared_client, xadd_safe  # type: ignore
+    from services.common.stream_worker import StreamWorker, add_worker_args  # type: ignore
 except Exception:  # pragma: no cover
-    get_client = ensure_group = readgroup_blocking = xack_safe = xadd_safe = None  # type: ignore
+    get_client = get_shared_client = xadd_safe = None  # type: ignore
+    StreamWorker = add_worker_args = None  # type: ignore
 
 
 LOGGER = logging.getLogger("part-labeler")
+STAGE = "part-labeler"  # metrics stage label
 
 from mediapipe import solutions as mp_solutions  # type: ignore
 
@@ -65,6 +93,10 @@ POSE_LABELS: List[LabelSpec] = [
 
 BACKGROUND_COLOR = (160, 160, 160)
 
+# Per-point label ids (labels-<id>.npy): 0 = background, k = POSE_LABELS[k-1]
+LABEL_NAMES: List[str] = ["background"] + [spec.name for spec in POSE_LABELS]
+LABEL_PALETTE = np.array([BACKGROUND_COLOR] + [spec.color for spec in POSE_LABELS], dtype=np.uint8)
+
 
 def _get_env_float(name: str, default: float) -> float:
     try:
@@ -96,19 +128,24 @@ TORSO_TOP_MARGIN_NORM = _get_env_float("PL_TORSO_TOP_MARGIN_NORM", 0.02)
 TORSO_BOTTOM_MARGIN_NORM = _get_env_float("PL_TORSO_BOTTOM_MARGIN_NORM", 0.03)
 TORSO_MIN_POINTS = int(_get_env_float("PL_TORSO_MIN_POINTS", 120.0))
 
+# Inference render size, independent of the user-facing PREVIEW_SIZE (0 = same as PREVIEW_SIZE)
+INFER_SIZE = int(_get_env_float("PL_INFER_SIZE", 0.0))
+
 
 
 
 
 def write_colorized_ply(path: Path, points: np.ndarray, colors: np.ndarray) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as fh:
+    tmp = path.with_suffix(".ply.tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
         fh.write("ply\nformat ascii 1.0\n")
         fh.write(f"element vertex {points.shape[0]}\n")
         fh.write("property float x\nproperty float y\nproperty float z\n")
         fh.write("property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n")
         for (x, y, z), (r, g, b) in zip(points, colors):
             fh.write(f"{x} {y} {z} {int(r)} {int(g)} {int(b)}\n")
+    tmp.replace(path)
 
 def clamp(value: float, lo: float = 0.0, hi: float = 1.0) -> float: return max(lo, min(hi, value))
 
@@ -208,10 +245,11 @@ def refine_head_bbox(
     head_xy: Optional[Dict[str, float]],
     torso_pose_xy: Optional[Dict[str, float]],
     pc_bbox: Dict[str, float],
+    weights: Optional[np.ndarray] = None,
 ) -> Optional[Dict[str, float]]:
     if not head_xy:
         return None
-    head = ensure_min_size(head_xy, pc_bbox, HEAD_MIN_W_FRAC, HEAD_MIN_H_FRAC); head = refine_xy_bbox_with_points(points, head, pc_bbox, min_points=150)
+    head = ensure_min_size(head_xy, pc_bbox, HEAD_MIN_W_FRAC, HEAD_MIN_H_FRAC); head = refine_xy_bbox_with_points(points, head, pc_bbox, min_points=150, weights=weights)
     if not head:
         return None
     head = inflate_bbox(head, pc_bbox, scale_x=HEAD_INFLATE_X, scale_y=HEAD_INFLATE_Y)
@@ -234,10 +272,11 @@ def refine_hand_bbox(
     hand_xy: Optional[Dict[str, float]],
     torso_cx: float,
     pc_bbox: Dict[str, float],
+    weights: Optional[np.ndarray] = None,
 ) -> Optional[Dict[str, float]]:
     if not hand_xy:
         return None
-    hand = ensure_min_size(hand_xy, pc_bbox, HAND_MIN_W_FRAC, HAND_MIN_H_FRAC); hand = refine_xy_bbox_with_points(points, hand, pc_bbox, min_points=80)
+    hand = ensure_min_size(hand_xy, pc_bbox, HAND_MIN_W_FRAC, HAND_MIN_H_FRAC); hand = refine_xy_bbox_with_points(points, hand, pc_bbox, min_points=80, weights=weights)
     if not hand:
         return None
     hand = inflate_bbox(hand, pc_bbox, scale_x=HAND_INFLATE_X, scale_y=HAND_INFLATE_Y)
@@ -269,9 +308,10 @@ def torso_bbox_normalized(results) -> Optional[Tuple[float, float, float, float]
         return None
 
 
-def refine_xy_bbox_with_points(points: np.ndarray, bbox_xy: Dict[str, float], pc_bbox: Dict[str, float], min_points: int = 50) -> Optional[Dict[str, float]]:
+def refine_xy_bbox_with_points(points: np.ndarray, bbox_xy: Dict[str, float], pc_bbox: Dict[str, float], min_points: int = 50, weights: Optional[np.ndarray] = None) -> Optional[Dict[str, float]]:
+    """``weights`` = source points per row when ``points`` is a voxel-downsampled cloud."""
     bbox_xy = clamp_bbox_to_pc(bbox_xy, pc_bbox); idxs = select_points(points, bbox_xy)
-    if idxs.size < min_points: return None
+    if (idxs.size if weights is None else int(weights[idxs].sum())) < min_points: return None
     s = compute_stats(points[idxs]) or {}
     return {"xmin": float(bbox_xy["xmin"]), "xmax": float(bbox_xy["xmax"]), "ymin": float(bbox_xy["ymin"]), "ymax": float(bbox_xy["ymax"]), "zmin": s.get("zmin", float(pc_bbox["zmin"])), "zmax": s.get("zmax", float(pc_bbox["zmax"]))}
 
@@ -329,16 +369,353 @@ def compute_stats(points: np.ndarray) -> Optional[Dict[str, float]]:
     }
 
 
-def label_frame(
+def voxel_downsample(points: np.ndarray, voxel: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Centroid per occupied voxel; returns (voxel points, voxel index of every input point, points per voxel)."""
+    q = np.floor((points - points.min(axis=0)) / voxel).astype(np.int64)
+    dims = q.max(axis=0) + 1
+    keys = (q[:, 0] * dims[1] + q[:, 1]) * dims[2] + q[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    centroids = np.stack([np.bincount(inverse, weights=points[:, k], minlength=counts.size) for k in range(3)], axis=1) / counts[:, None]
+    return centroids.astype(np.float32), inverse, counts
+
+
+def assign_label_ids(points: np.ndarray, bboxes: List[Optional[Dict[str, float]]], chunk: int = 1 << 20) -> np.ndarray:
+    """One uint8 id per point in a single vectorized pass.
+
+    ``bboxes[k]`` is the XY box for ``POSE_LABELS[k]``; a point gets ``k + 1`` for
+    the first (highest-priority) box containing it and 0 (background) otherwise.
+    Bounds are compared in float32 like `select_points`, so ids match the old
+    label-by-label assignment exactly. Processed in chunks to bound the N x K mask.
+    """
+    k = len(bboxes)
+    lo = np.full((k, 2), np.inf, dtype=np.float32)
+    hi = np.full((k, 2), -np.inf, dtype=np.float32)
+    for i, b in enumerate(bboxes):
+        if b:
+            lo[i] = (b["xmin"], b["ymin"])
+            hi[i] = (b["xmax"], b["ymax"])
+    ids = np.zeros(points.shape[0], dtype=np.uint8)
+    for start in range(0, points.shape[0], chunk):
+        xy = points[start:start + chunk, None, :2]
+        inside = ((xy >= lo) & (xy <= hi)).all(axis=2)
+        first = inside.argmax(axis=1)
+        hit = inside[np.arange(inside.shape[0]), first]
+        ids[start:start + chunk] = np.where(hit, first + 1, 0)
+    return ids
+
+
+def label_stats(points: np.ndarray, label_ids: np.ndarray) -> Tuple[np.ndarray, List[Optional[Dict[str, float]]]]:
+    """Per-id point counts and `compute_stats` boxes from one sort (radix for uint8)."""
+    counts = np.bincount(label_ids, minlength=len(LABEL_NAMES))
+    stats: List[Optional[Dict[str, float]]] = [None] * len(LABEL_NAMES)
+    nonempty = np.nonzero(counts)[0]
+    if nonempty.size:
+        order = np.argsort(label_ids, kind="stable")
+        sorted_pts = points[order]
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        mins = np.minimum.reduceat(sorted_pts, starts, axis=0)
+        maxs = np.maximum.reduceat(sorted_pts, starts, axis=0)
+        for j, lid in enumerate(nonempty):
+            stats[lid] = {
+                "xmin": float(mins[j, 0]), "xmax": float(maxs[j, 0]),
+                "ymin": float(mins[j, 1]), "ymax": float(maxs[j, 1]),
+                "zmin": float(mins[j, 2]), "zmax": float(maxs[j, 2]),
+            }
+    return counts, stats
+
+
+def colorize(label_ids: np.ndarray) -> np.ndarray:
+    return LABEL_PALETTE[label_ids]
+
+
+def detect_pose_static(img: np.ndarray):
+    """Full Holistic detection on a single image (no state kept between frames)."""
+    holistic = mp_solutions.holistic.Holistic(static_image_mode=True, model_complexity=0)  # type: ignore
+    try:
+        return holistic.process(img)
+    finally:
+        holistic.close()
+
+
+def pose_confidence(results) -> float:
+    """Mean pose landmark visibility; 0 when no pose was found."""
+    if not getattr(results, "pose_landmarks", None):
+        return 0.0
+    vis = [float(getattr(lm, "visibility", 0.0)) for lm in results.pose_landmarks.landmark]
+    return float(sum(vis) / len(vis)) if vis else 0.0
+
+
+def _frame_index(frame_id: str) -> Optional[int]:
+    try:
+        return int(str(frame_id))
+    except ValueError:
+        return None
+
+
+class PoseTracker:
+    """Holistic in video mode (static_image_mode=False) for one capture sequence.
+
+    Consecutive frames reuse the previous landmarks as the tracking seed. The
+    graph is restarted, i.e. full detection runs, on the first frame, after a
+    gap of more than ``max_gap`` frame ids, and when pose confidence drops
+    below ``min_confidence``.
+    """
+
+    def __init__(self, min_confidence: float = 0.5, max_gap: int = 1) -> None:
+        self.min_confidence = min_confidence
+        self.max_gap = max(1, int(max_gap))
+        self.last_frame: Optional[int] = None
+        self.last_used = time.monotonic()
+        self.tracked = self.redetected = 0
+        self._holistic = None
+        self._lock = threading.Lock()
+
+    def _restart(self) -> None:
+        self.close()
+        self._holistic = mp_solutions.holistic.Holistic(  # type: ignore
+            static_image_mode=False, model_complexity=0,
+            min_detection_confidence=self.min_confidence, min_tracking_confidence=self.min_confidence,
+        )
+
+    def close(self) -> None:
+        if self._holistic is not None:
+            self._holistic.close()
+            self._holistic = None
+
+    def process(self, frame_id: str, img: np.ndarray):
+        with self._lock:
+            fid = _frame_index(frame_id)
+            continuous = fid is not None and self.last_frame is not None and 0 < fid - self.last_frame <= self.max_gap
+            if not continuous or self._holistic is None:
+                self._restart()
+                results = self._holistic.process(img)
+                self.redetected += 1
+            else:
+                results = self._holistic.process(img)
+                if pose_confidence(results) < self.min_confidence:
+                    LOGGER.debug("track: confidence dropped at %s; re-detecting", frame_id)
+                    self._restart()
+                    results = self._holistic.process(img)
+                    self.redetected += 1
+                else:
+                    self.tracked += 1
+            self.last_frame = fid
+            self.last_used = time.monotonic()
+            return results
+
+
+def frame_signature(points: np.ndarray) -> np.ndarray:
+    """Cheap change signature: cloud centroid followed by bbox min and max (9 floats)."""
+    return np.concatenate([points.mean(axis=0), points.min(axis=0), points.max(axis=0)]).astype(np.float64)
+
+
+class StaticFrameGate:
+    """Reuse the previous inference of a sequence while the cloud barely moves.
+
+    A frame is static when every component of its `frame_signature` is within
+    ``threshold`` x (bbox diagonal) of the last frame that ran inference. The
+    reference is not advanced on reuse, so slow drift still triggers inference,
+    and at most ``max_reuse`` frames in a row reuse one result.
+    """
+
+    def __init__(self, threshold: float = 0.01, max_reuse: int = 10, max_gap: int = 1) -> None:
+        self.threshold = threshold
+        self.max_reuse = max(0, int(max_reuse))
+        self.max_gap = max(1, int(max_gap))
+        self.last_used = time.monotonic()
+        self.inferred = self.skipped = 0
+        self.saved_s = 0.0
+        self._ref: Optional[Tuple[np.ndarray, object, float]] = None  # (signature, results, inference seconds)
+        self._last_frame: Optional[int] = None
+        self._run = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, frame_id: str, signature: np.ndarray):
+        """Previous results when the frame is static and continuous, else None."""
+        fid = _frame_index(frame_id)
+        with self._lock:
+            self.last_used = time.monotonic()
+            continuous = fid is not None and self._last_frame is not None and 0 < fid - self._last_frame <= self.max_gap
+            if self._ref is None or not continuous or self._run >= self.max_reuse:
+                return None
+            ref_sig, results, took = self._ref
+            scale = max(float(np.linalg.norm(ref_sig[6:9] - ref_sig[3:6])), 1e-9)
+            if float(np.abs(signature - ref_sig).max()) / scale > self.threshold:
+                return None
+            self._last_frame = fid
+            self._run += 1
+            self.skipped += 1
+            self.saved_s += took
+        metrics.count(metrics.INFERENCE_SKIPPED, stage=STAGE)
+        metrics.count(metrics.INFERENCE_SAVED, took, stage=STAGE)
+        LOGGER.debug("static-skip: reused inference for %s", frame_id)
+        return results
+
+    def store(self, frame_id: str, signature: np.ndarray, results, took: float) -> None:
+        with self._lock:
+            self._ref = (signature, results, took)
+            self._last_frame = _frame_index(frame_id)
+            self._run = 0
+            self.inferred += 1
+            total = self.inferred + self.skipped
+            if total % 100 == 0:
+                LOGGER.info("static-skip: %d/%d frames reused (%.0f%%), ~%.1fs inference saved", self.skipped, total, 100.0 * self.skipped / total, self.saved_s)
+
+    def close(self) -> None:
+        self._ref = None
+
+
+def density_roi(points: np.ndarray, bins: int = 32, min_frac: float = 0.1) -> Optional[Tuple[float, float, float, float]]:
+    """XY extent (xmin, xmax, ymin, ymax) of histogram cells holding at least ``min_frac`` of the densest cell."""
+    hist, xe, ye = np.histogram2d(points[:, 0], points[:, 1], bins=bins)
+    if hist.max() <= 0:
+        return None
+    ix, iy = np.nonzero(hist >= max(1.0, min_frac * hist.max()))
+    return float(xe[ix.min()]), float(xe[ix.max() + 1]), float(ye[iy.min()]), float(ye[iy.max() + 1])
+
+
+def _remap_landmarks(lms, ax: float, bx: float, ay: float, by: float):
+    if not lms:
+        return None
+    return types.SimpleNamespace(landmark=[
+        types.SimpleNamespace(x=ax * float(lm.x) + bx, y=ay * float(lm.y) + by, z=float(getattr(lm, "z", 0.0)), visibility=float(getattr(lm, "visibility", 0.0)))
+        for lm in lms.landmark
+    ])
+
+
+class InferenceWindow:
+    """ROI-cropped, resolution-adaptive inference render for one sequence.
+
+    The crop is the previous frame's labeled person extent (padded), or a
+    cheap XY density estimate on the first frame. The render side is
+    sqrt(points in crop / ``points_per_px``) clamped to [``min_size``,
+    ``max_size``]. Landmarks are mapped back to the normalized coordinates of
+    the full-cloud render, so everything downstream is unchanged. If the crop
+    from the previous frame finds no pose, the full cloud is rendered instead.
+    """
+
+    def __init__(self, max_size: int = 640, min_size: int = 256, pad: float = 0.15, points_per_px: float = 1.0) -> None:
+        self.max_size = max(1, int(max_size))
+        self.min_size = max(1, min(int(min_size), self.max_size))
+        self.pad = pad
+        self.points_per_px = max(1e-3, points_per_px)
+        self.last_used = time.monotonic()
+        self._person: Optional[Tuple[float, float, float, float]] = None
+
+    def _size(self, n_points: int) -> int:
+        return int(max(self.min_size, min(self.max_size, round((n_points / self.points_per_px) ** 0.5))))
+
+    def _crop(self, roi: Tuple[float, float, float, float], full: Tuple[float, float, float]) -> Tuple[float, float, float]:
+        xmin, xmax, ymin, ymax = roi
+        span = min(max(xmax - xmin, ymax - ymin) * (1.0 + 2.0 * self.pad), full[2])
+        return 0.5 * (xmin + xmax) - 0.5 * span, 0.5 * (ymin + ymax) - 0.5 * span, span
+
+    def _render_detect(self, points, colors, window, full, detect):
+        x0, y0, span = window
+        inside = int(np.count_nonzero((points[:, 0] >= x0) & (points[:, 0] <= x0 + span) & (points[:, 1] >= y0) & (points[:, 1] <= y0 + span)))
+        img = render_preview_rgb(points, colors, size=self._size(inside), logger=LOGGER, window=window)
+        if img is None:
+            return None
+        results = detect(img)
+        # crop-normalized -> full-render-normalized
+        ax = ay = span / full[2]
+        bx, by = (x0 - full[0]) / full[2], (y0 - full[1]) / full[2]
+        return types.SimpleNamespace(
+            pose_landmarks=_remap_landmarks(getattr(results, "pose_landmarks", None), ax, bx, ay, by),
+            face_landmarks=_remap_landmarks(getattr(results, "face_landmarks", None), ax, bx, ay, by),
+            left_hand_landmarks=_remap_landmarks(getattr(results, "left_hand_landmarks", None), ax, bx, ay, by),
+            right_hand_landmarks=_remap_landmarks(getattr(results, "right_hand_landmarks", None), ax, bx, ay, by),
+        )
+
+    def infer(self, points: np.ndarray, colors: np.ndarray, detect: Callable[[np.ndarray], object]):
+        self.last_used = time.monotonic()
+        full = full_window(points)
+        if full is None:
+            return None
+        tracked = self._person is not None
+        roi = self._person if tracked else density_roi(points)
+        results = self._render_detect(points, colors, self._crop(roi, full) if roi else full, full, detect)
+        if tracked and (results is None or not results.pose_landmarks):
+            LOGGER.debug("infer-roi: no pose in previous ROI; rendering full cloud")
+            results = self._render_detect(points, colors, full, full, detect)
+        return results
+
+    def update(self, part_boxes: List[Optional[Dict[str, float]]]) -> None:
+        """Remember the XY extent of this frame's labeled parts as the next frame's crop."""
+        boxes = [b for b in part_boxes if b]
+        self._person = (
+            min(b["xmin"] for b in boxes), max(b["xmax"] for b in boxes),
+            min(b["ymin"] for b in boxes), max(b["ymax"] for b in boxes),
+        ) if boxes else None
+
+    def close(self) -> None:
+        self._person = None
+
+
+_TRACKERS: Dict[str, PoseTracker] = {}
+_WINDOWS: Dict[str, InferenceWindow] = {}
+_GATES: Dict[str, StaticFrameGate] = {}
+_SEQUENCES_LOCK = threading.Lock()
+
+
+def sequence_key(fields: Dict[str, str]) -> str:
+    """Capture sequence of an event (``sequence_id`` field; events without one form a single sequence)."""
+    return str(fields.get("sequence_id") or "")
+
+
+def sequence_fields(sequence: str) -> Dict[str, str]:
+    """``sequence_id`` for outbound events, so downstream stages keep the frame in its sequence."""
+    return {"sequence_id": sequence} if sequence else {}
+
+
+def sequence_shard(sequence: str, shard_count: int) -> int:
+    return zlib.crc32(sequence.encode("utf-8")) % max(1, shard_count)
+
+
+def _sequence_state(registry: Dict, sequence: str, factory: Callable[[], object], idle_s: float):
+    """Per-process, per-sequence object from ``registry``; entries idle for ``idle_s`` are closed."""
+    now = time.monotonic()
+    with _SEQUENCES_LOCK:
+        for key in [k for k, v in registry.items() if k != sequence and now - v.last_used > idle_s]:
+            LOGGER.info("closing idle sequence %r state (%s)", key, type(registry[key]).__name__)
+            registry.pop(key).close()
+        state = registry.get(sequence)
+        if state is None:
+            state = registry[sequence] = factory()
+        return state
+
+
+def get_tracker(sequence: str, min_confidence: float, max_gap: int, idle_s: float) -> PoseTracker:
+    return _sequence_state(_TRACKERS, sequence, lambda: PoseTracker(min_confidence, max_gap), idle_s)
+
+
+def get_window(sequence: str, max_size: int, min_size: int, pad: float, points_per_px: float, idle_s: float) -> InferenceWindow:
+    return _sequence_state(_WINDOWS, sequence, lambda: InferenceWindow(max_size, min_size, pad, points_per_px), idle_s)
+
+
+def get_gate(sequence: str, threshold: float, max_reuse: int, max_gap: int, idle_s: float) -> StaticFrameGate:
+    return _sequence_state(_GATES, sequence, lambda: StaticFrameGate(threshold, max_reuse, max_gap), idle_s)
+
+
+def label_points(
     frame_id: str,
-    ply_path: Path,
-    out_dir: Path,
-    color_dir: Optional[Path],
-    redis_out_stream: Optional[str] = None,
-    redis_url: Optional[str] = None,
-) -> bool:
-    # Load PLY and compute bbox for mapping normalized coords
-    points, colors = load_ply(ply_path)
+    points: np.ndarray,
+    colors: np.ndarray,
+    detector: Optional[Callable[[np.ndarray], object]] = None,
+    gate: Optional[StaticFrameGate] = None,
+    window: Optional[InferenceWindow] = None,
+    voxel_size: float = 0.0,
+) -> Tuple[Dict, np.ndarray]:
+    """Detect pose on a rendered preview and assign parts; returns (labels document, uint8 label id per point).
+
+    ``detector`` maps the RGB preview to Holistic results (default: `detect_pose_static`).
+    With a ``gate``, near-static frames skip rendering and inference and reuse
+    the previous landmarks; boxes are still fitted to the current points.
+    With a ``window``, inference runs on an ROI-cropped, adaptively sized render.
+    With ``voxel_size`` > 0, box refinement and part assignment run on voxel
+    centroids and the ids are broadcast back to every point of each voxel.
+    """
     total_points = points.shape[0]
 
     # Compute pc bbox for mapping normalized coords to pc-space
@@ -352,15 +729,21 @@ def label_frame(
     }
 
     # Derive landmarks and PII boxes using MediaPipe on a rendered preview (always)
-    img = render_preview_rgb(points, colors, logger=LOGGER)
-    if img is None:
-        raise RuntimeError("preview rendering failed for labeling")
     mp_holistic = mp_solutions.holistic  # type: ignore
-    holistic = mp_holistic.Holistic(static_image_mode=True, model_complexity=0)
-    try:
-        results = holistic.process(img)
-    finally:
-        holistic.close()
+    signature = frame_signature(points) if gate is not None else None
+    results = gate.lookup(frame_id, signature) if gate is not None else None
+    if results is None:
+        t0 = time.perf_counter()
+        with metrics.timed(STAGE, "inference"):
+            if window is not None:
+                results = window.infer(points, colors, detector or detect_pose_static)
+            else:
+                img = render_preview_rgb(points, colors, size=INFER_SIZE or None, logger=LOGGER)
+                results = (detector or detect_pose_static)(img) if img is not None else None
+            if results is None:
+                raise RuntimeError("preview rendering failed for labeling")
+        if gate is not None:
+            gate.store(frame_id, signature, results, time.perf_counter() - t0)
 
     # Collect pose landmarks list of dicts
     pose_landmarks_list: List[Dict[str, float]] = (
@@ -417,20 +800,11 @@ def label_frame(
 
     pose_landmarks = pose_landmarks_list
 
-    labels_output: Dict[str, Dict] = {}
-    assigned = np.zeros(total_points, dtype=bool)
-    colored = colors.copy()
-
-    def apply_label(spec: LabelSpec, bbox: Optional[Dict[str, float]]):
-        if not bbox:
-            labels_output[spec.name] = {"point_count": 0, "fraction": 0.0, "bbox": None}; return
-        idxs = select_points(points, bbox); idxs = idxs[~assigned[idxs]]
-        if idxs.size == 0:
-            labels_output[spec.name] = {"point_count": 0, "fraction": 0.0, "bbox": None}; return
-        assigned[idxs] = True
-        stats = compute_stats(points[idxs])
-        labels_output[spec.name] = {"point_count": int(idxs.size), "fraction": float(idxs.size / total_points), "bbox": stats}
-        colored[idxs] = np.array(spec.color, dtype=np.uint8)
+    # Working cloud for box geometry: full resolution, or voxel centroids weighted by their point counts
+    work, weights, voxel_of = points, None, None
+    if voxel_size > 0:
+        with metrics.timed(STAGE, "downsample"):
+            work, voxel_of, weights = voxel_downsample(points, voxel_size)
 
     # Build initial PII XY boxes from MediaPipe specialized signals, then enforce min sizes and refine with points
     head_pc = to_pc(face_bbox_n)
@@ -450,18 +824,19 @@ def label_frame(
     else:
         torso_cx = 0.5 * (pc_bbox["xmin"] + pc_bbox["xmax"])  # center of scene
     if head_pc:
-        head_pc = refine_head_bbox(points, head_pc, torso_pose_bbox, pc_bbox)
+        head_pc = refine_head_bbox(work, head_pc, torso_pose_bbox, pc_bbox, weights)
     if rh_pc:
-        rh_pc = refine_hand_bbox(points, rh_pc, torso_cx, pc_bbox)
+        rh_pc = refine_hand_bbox(work, rh_pc, torso_cx, pc_bbox, weights)
     if lh_pc:
-        lh_pc = refine_hand_bbox(points, lh_pc, torso_cx, pc_bbox)
+        lh_pc = refine_hand_bbox(work, lh_pc, torso_cx, pc_bbox, weights)
 
     # Refine torso specialized bbox in PC space (optional) to avoid overhang
     torso_pc = to_pc(torso_n)
     if torso_pc:
-        torso_pc = refine_xy_bbox_with_points(points, torso_pc, pc_bbox, min_points=TORSO_MIN_POINTS)
+        torso_pc = refine_xy_bbox_with_points(work, torso_pc, pc_bbox, min_points=TORSO_MIN_POINTS, weights=weights)
 
-    # Pose-based labels
+    # Pose-based label boxes, in priority order
+    bboxes: List[Optional[Dict[str, float]]] = []
     for spec in POSE_LABELS:
         # Prefer specialized MediaPipe bboxes for head/hands; otherwise fall back to pose-only indices
         if spec.name == "head":
@@ -474,30 +849,193 @@ def label_frame(
             bbox = torso_pc
         else:
             bbox = bbox_from_pose(pose_landmarks, spec.pose_indices or [], pc_bbox, spec.margin)
-        apply_label(spec, bbox)
-
-    remaining = np.nonzero(~assigned)[0]
-    labels_output["background"] = {
-        "point_count": int(remaining.size),
-        "fraction": float(remaining.size / total_points),
-        "bbox": compute_stats(points[remaining]) if remaining.size else None,
-    }
-    colored[remaining] = np.array(BACKGROUND_COLOR, dtype=np.uint8)
+        bboxes.append(bbox)
+
+    label_ids = assign_label_ids(work, bboxes)
+    if voxel_of is not None:
+        label_ids = label_ids[voxel_of]  # voxel -> point, one gather
+    counts, stats = label_stats(points, label_ids)
+    if window is not None:
+        window.update(stats[1:])
+    labels_output: Dict[str, Dict] = {}
+    for lid in list(range(1, len(LABEL_NAMES))) + [0]:  # parts in priority order, background last
+        labels_output[LABEL_NAMES[lid]] = {"point_count": int(counts[lid]), "fraction": float(counts[lid] / total_points), "bbox": stats[lid]}
 
-    metrics = {
+    background = int(counts[0])
+    frame_metrics = {
         "frame_id": frame_id,
         "total_points": int(total_points),
-        "labeled_points": int(total_points - remaining.size),
-        "labeled_fraction": float((total_points - remaining.size) / total_points),
+        "labeled_points": int(total_points - background),
+        "labeled_fraction": float((total_points - background) / total_points),
     }
 
+    return {"frame_id": frame_id, "labels": labels_output, "metrics": frame_metrics, "label_names": LABEL_NAMES}, label_ids
+
+
+# Bump when labeling logic changes in a way the tunables do not capture
+LABEL_CACHE_VERSION = 1
+
+
+def tunables_fingerprint(args: argparse.Namespace) -> str:
+    """Hash of everything besides the cloud that shapes the labels: module tunables and labeling flags."""
+    tunables = {k: v for k, v in globals().items() if k.isupper() and isinstance(v, (int, float)) and not isinstance(v, bool)}
+    flags = {k: getattr(args, k, None) for k in (
+        "pose_backend", "onnx_model", "infer_size", "infer_roi", "infer_min_size", "infer_roi_pad", "infer_points_per_px",
+        "voxel_size", "track", "track_min_confidence", "skip_static", "skip_static_threshold",
+    )}
+    blob = json.dumps({"tunables": tunables, "flags": flags, "labels": LABEL_NAMES}, sort_keys=True, default=str)
+    return hashlib.blake2b(blob.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class LabelCache:
+    """On-disk labels keyed by cloud content hash + tunables fingerprint.
+
+    Entries are ``<key>.json`` (labels document) and ``<key>.npy`` (label ids),
+    written atomically. A re-sent or duplicated frame with unchanged tunables
+    is a hit and skips rendering and inference entirely. The oldest entries are
+    pruned beyond ``max_entries``.
+    """
+
+    def __init__(self, cache_dir: Path, salt: str, max_entries: int = 10000) -> None:
+        self.dir = cache_dir
+        self.salt = salt
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self._puts = 0
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, points: np.ndarray, colors: np.ndarray) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.salt.encode("ascii"))
+        h.update(np.ascontiguousarray(points, dtype=np.float32).data)
+        h.update(np.ascontiguousarray(colors, dtype=np.uint8).data)
+        return h.hexdigest()
+
+    def get(self, key: str, frame_id: str) -> Optional[Tuple[Dict, np.ndarray]]:
+        try:
+            with (self.dir / f"{key}.json").open("r", encoding="utf-8") as fh:
+                doc = json.load(fh)
+            label_ids = np.load((self.dir / f"{key}.npy").as_posix())
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        doc["frame_id"] = frame_id
+        doc.get("metrics", {})["frame_id"] = frame_id
+        return doc, label_ids
+
+    def put(self, key: str, doc: Dict, label_ids: np.ndarray) -> None:
+        ids_path, doc_path = self.dir / f"{key}.npy", self.dir / f"{key}.json"
+        with ids_path.with_suffix(".npy.tmp").open("wb") as fh:
+            np.save(fh, label_ids)
+        ids_path.with_suffix(".npy.tmp").replace(ids_path)
+        with doc_path.with_suffix(".json.tmp").open("w", encoding="utf-8") as fh:
+            json.dump(doc, fh)
+        doc_path.with_suffix(".json.tmp").replace(doc_path)
+        self._puts += 1
+        if self._puts % 100 == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        docs = sorted(self.dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for doc_path in docs[: max(0, len(docs) - self.max_entries)]:
+            for p in (doc_path, doc_path.with_suffix(".npy")):
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+_CACHES: Dict[Tuple[str, str], LabelCache] = {}
+
+
+def label_cache_dir(args: argparse.Namespace) -> str:
+    """--label-cache-dir; unset means ``<out-dir>/.label-cache`` unless a per-sequence mode is on ("off" disables)."""
+    if args.label_cache_dir:
+        return "" if args.label_cache_dir == "off" else args.label_cache_dir
+    # With --track, --skip-static or --infer-roi a frame's labels depend on its sequence's earlier
+    # frames (tracker, reused keypoints, ROI window), and a hit would also skip updating that state
+    stateful = args.track or args.skip_static or args.infer_roi
+    return "" if stateful else (Path(args.out_dir) / ".label-cache").as_posix()
+
+
+def get_label_cache(args: argparse.Namespace) -> Optional[LabelCache]:
+    """Per-process cache for --label-cache-dir, or None when caching is off."""
+    cache_dir = label_cache_dir(args)
+    if not cache_dir:
+        return None
+    salt = tunables_fingerprint(args)
+    with _SEQUENCES_LOCK:
+        cache = _CACHES.get((cache_dir, salt))
+        if cache is None:
+            cache = _CACHES[(cache_dir, salt)] = LabelCache(Path(cache_dir), salt, args.label_cache_max)
+        return cache
+
+
+def cached_label_points(frame_id: str, points: np.ndarray, colors: np.ndarray, cache: Optional[LabelCache], *a, **kw) -> Tuple[Dict, np.ndarray, bool]:
+    """`label_points` behind an optional `LabelCache`; (labels document, label ids, cache hit)."""
+    if cache is None:
+        return (*label_points(frame_id, points, colors, *a, **kw), False)
+    with metrics.timed(STAGE, "cache"):
+        key = cache.key(points, colors)
+        hit = cache.get(key, frame_id)
+    if hit is not None and hit[1].shape[0] == points.shape[0]:
+        metrics.count(metrics.CACHE_HITS, stage=STAGE, cache="labels")
+        LOGGER.debug("label cache hit for %s (%s)", frame_id, key)
+        return (*hit, True)
+    labels_doc, label_ids = label_points(frame_id, points, colors, *a, **kw)
+    cache.put(key, labels_doc, label_ids)
+    return labels_doc, label_ids, False
+
+
+def labels_complete(frame_id: str, out_dir: Path, color_dir: Optional[Path]) -> bool:
+    """Whether the frame's final artifact (labels-<id>.json) and, if wanted, its colorized PLY exist."""
+    if color_dir is not None and not (color_dir / f"labels-colored-{frame_id}.ply").exists():
+        return False
+    return (out_dir / f"labels-{frame_id}.json").exists()
+
+
+def artifacts_current(frame_id: str, labels_doc: Dict, out_dir: Path, color_dir: Optional[Path]) -> bool:
+    """Whether labels-<id>.json already holds ``labels_doc``, with its ids (and colorized PLY) next to it."""
+    labels_path = out_dir / f"labels-{frame_id}.json"
+    if not labels_path.with_suffix(".npy").exists():
+        return False
+    if color_dir is not None and not (color_dir / f"labels-colored-{frame_id}.ply").exists():
+        return False
+    try:
+        with labels_path.open("r", encoding="utf-8") as fh:
+            return json.load(fh) == labels_doc
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+def write_label_artifacts(
+    frame_id: str,
+    labels_doc: Dict,
+    points: np.ndarray,
+    label_ids: np.ndarray,
+    out_dir: Path,
+    color_dir: Optional[Path],
+    reuse: bool = False,
+) -> Path:
+    """Write labels-<id>.npy, the colorized PLY and its preview (if requested), then labels-<id>.json.
+
+    Every file is renamed into place, and the labels JSON comes last: it marks
+    the frame as complete for readers and for `run_batch` resumes. With ``reuse`` (a label cache hit) nothing is written when the frame's
+    artifacts already hold this labels document, e.g. for a re-delivered event.
+    """
     out_dir.mkdir(parents=True, exist_ok=True)
     labels_path = out_dir / f"labels-{frame_id}.json"
-    with labels_path.with_suffix(".json.tmp").open("w", encoding="utf-8") as fh:
-        json.dump({"frame_id": frame_id, "labels": labels_output, "metrics": metrics}, fh)
-    labels_path.with_suffix(".json.tmp").replace(labels_path)
+    if reuse and artifacts_current(frame_id, labels_doc, out_dir, color_dir):
+        LOGGER.debug("artifacts for %s are current; not rewriting", frame_id)
+        return labels_path
+    ids_path = labels_path.with_suffix(".npy")
+    with ids_path.with_suffix(".npy.tmp").open("wb") as fh:
+        np.save(fh, label_ids)
+    ids_path.with_suffix(".npy.tmp").replace(ids_path)
 
     if color_dir is not None:
+        colored = colorize(label_ids)
         output_path = color_dir / f"labels-colored-{frame_id}.ply"
         write_colorized_ply(output_path, points, colored)
         # Best-effort preview PNG (atomic write inside helper)
@@ -510,34 +1048,276 @@ def label_frame(
         except Exception:  # pragma: no cover
             LOGGER.exception("Failed to generate labels-colored preview for %s", frame_id)
 
+    # Last: a visible JSON always has its ids and colorized PLY next to it
+    with labels_path.with_suffix(".json.tmp").open("w", encoding="utf-8") as fh:
+        json.dump(labels_doc, fh)
+    labels_path.with_suffix(".json.tmp").replace(labels_path)
+    return labels_path
+
+
+def label_frame(
+    frame_id: str,
+    ply_path: Path,
+    out_dir: Path,
+    color_dir: Optional[Path],
+    redis_out_stream: Optional[str] = None,
+    redis_url: Optional[str] = None,
+    trace: Optional[Dict[str, str]] = None,
+    cloud: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    detector: Optional[Callable[[np.ndarray], object]] = None,
+    gate: Optional[StaticFrameGate] = None,
+    window: Optional[InferenceWindow] = None,
+    voxel_size: float = 0.0,
+    cache: Optional[LabelCache] = None,
+    sequence_id: str = "",
+) -> bool:
+    # Load PLY (unless the converter handed us the arrays) and compute bbox for mapping normalized coords
+    with metrics.timed(STAGE, "load"):
+        points, colors = cloud if cloud is not None else load_ply(ply_path)
+
+    labels_doc, label_ids, hit = cached_label_points(frame_id, points, colors, cache, detector, gate, window, voxel_size)
+    frame_metrics = labels_doc["metrics"]
+
+    with metrics.timed(STAGE, "write"):
+        labels_path = write_label_artifacts(frame_id, labels_doc, points, label_ids, out_dir, color_dir, reuse=hit)
 
     LOGGER.info(
         "Processed %s | labeled %.1f%% (%d / %d)",
         frame_id,
-        metrics["labeled_fraction"] * 100.0,
-        metrics["labeled_points"],
-        metrics["total_points"],
+        frame_metrics["labeled_fraction"] * 100.0,
+        frame_metrics["labeled_points"],
+        frame_metrics["total_points"],
     )
 
     # keep input files; no deletion in streamlined flow
 
     # Publish event to Redis (optional)
     if redis_out_stream:
-        r = get_client(redis_url)
+        r = get_shared_client(redis_url)
         if r is not None:
-            xadd_safe(
-                r,
-                redis_out_stream,
-                {
-                    "frame_id": frame_id,
-                    "labels_path": labels_path.as_posix(),
-                    "ply_path": ply_path.as_posix(),
-                },
-            )
+            with metrics.timed(STAGE, "publish"):
+                xadd_safe(
+                    r,
+                    redis_out_stream,
+                    {
+                        "frame_id": frame_id,
+                        "labels_path": labels_path.as_posix(),
+                        "label_ids_path": labels_path.with_suffix(".npy").as_posix(),
+                        "ply_path": ply_path.as_posix(),
+                        **sequence_fields(sequence_id),
+                        **tracing.finish(trace, "label"),
+                    },
+                )
+    return True
+
+
+
+
+
+def frame_detector(args: argparse.Namespace, frame_id: str, fields: Dict[str, str]) -> Optional[Callable[[np.ndarray], object]]:
+    """Pose detector for this frame: the --pose-backend, or its sequence's tracker with --track, else None (static detection)."""
+    if args.pose_backend != "mediapipe":
+        return get_backend(args.pose_backend, model_path=args.onnx_model, threads=args.onnx_threads, max_batch=args.infer_batch, max_wait_ms=args.infer_batch_wait_ms).detect
+    if not args.track:
+        return None
+    # Frames reused by --skip-static never reach the tracker; they are not a break in the sequence
+    max_gap = args.track_max_gap * (args.skip_static_max_reuse + 1) if args.skip_static else args.track_max_gap
+    tracker = get_tracker(sequence_key(fields), args.track_min_confidence, max_gap, args.track_idle)
+    return functools.partial(tracker.process, frame_id)
+
+
+def frame_gate(args: argparse.Namespace, fields: Dict[str, str]) -> Optional[StaticFrameGate]:
+    """The sequence's static-frame gate with --skip-static, else None."""
+    if not args.skip_static:
+        return None
+    return get_gate(sequence_key(fields), args.skip_static_threshold, args.skip_static_max_reuse, args.track_max_gap, args.track_idle)
+
+
+def frame_window(args: argparse.Namespace, fields: Dict[str, str]) -> Optional[InferenceWindow]:
+    """The sequence's ROI inference window with --infer-roi, else None."""
+    if not args.infer_roi:
+        return None
+    max_size = args.infer_size or INFER_SIZE or int(os.environ.get("PREVIEW_SIZE", "640"))
+    return get_window(sequence_key(fields), max_size, args.infer_min_size, args.infer_roi_pad, args.infer_points_per_px, args.track_idle)
+
+
+_UNSEQUENCED = 0  # events seen by a shard without sequence_id
+
+
+def owns_frame(args: argparse.Namespace, fields: Dict[str, str]) -> bool:
+    """With --shard-count > 1, whether this replica's shard handles the frame's sequence."""
+    global _UNSEQUENCED
+    if args.shard_count <= 1:
+        return True
+    if not fields.get("sequence_id"):
+        _UNSEQUENCED += 1
+        if _UNSEQUENCED % 1000 == 1:
+            LOGGER.warning("part-labeler: %d event(s) without sequence_id (e.g. frame %s); they all hash to one shard. "
+                           "Set X-Sequence-Id on ingest or --sequence-id on convert-ply", _UNSEQUENCED, fields.get("frame_id"))
+    return sequence_shard(sequence_key(fields), args.shard_count) == args.shard_index
+
+
+def handle_message(args: argparse.Namespace, msg_id: str, fields: Dict[str, str]) -> bool:
+    """StreamWorker handler: label one s_frames_converted event."""
+    frame_id = fields.get("frame_id")
+    ply_field = fields.get("ply_path")
+    if not frame_id or not ply_field:
+        return True  # malformed; ack and drop
+    if not owns_frame(args, fields):
+        return True  # another shard's sequence
+    out_dir = Path(args.out_dir)
+    color_dir = Path(args.colorized_dir) if args.colorized_dir else out_dir
+    trace = tracing.inbound(fields, "label")
+    mapped = shm_handoff.attach_arrays(fields) if shm_handoff is not None else None
+    try:
+        label_frame(
+            frame_id,
+            Path(ply_field),
+            out_dir,
+            color_dir if args.write_colorized else None,
+            args.redis_out_stream,
+            args.redis_url,
+            trace=trace,
+            cloud=mapped[:2] if mapped else None,
+            detector=frame_detector(args, frame_id, fields),
+            gate=frame_gate(args, fields),
+            window=frame_window(args, fields),
+            voxel_size=args.voxel_size,
+            cache=get_label_cache(args),
+            sequence_id=sequence_key(fields),
+        )
+    finally:
+        if mapped:
+            shm = mapped[2]; del mapped
+            shm_handoff.release(shm)
+    return True
+
+
+def handle_message_fused(args: argparse.Namespace, msg_id: str, fields: Dict[str, str]) -> bool:
+    """StreamWorker handler for --fused: label, redact and analyze one frame on the same arrays.
+
+    Writes the same artifacts and publishes the same s_parts_labeled / s_redacted_done /
+    s_analytics_done events as the three separate services, without re-parsing the PLY,
+    re-reading the labels JSON or waiting on file ages between stages.
+    """
+    frame_id = fields.get("frame_id")
+    ply_field = fields.get("ply_path")
+    if not frame_id or not ply_field or not owns_frame(args, fields):
+        return True
+    ply_path = Path(ply_field)
+    out_dir = Path(args.out_dir)
+    color_dir = Path(args.colorized_dir) if args.colorized_dir else out_dir
+    r = get_shared_client(args.redis_url)
+    trace = tracing.inbound(fields, "label")
+    seq = sequence_fields(sequence_key(fields))
+    mapped = shm_handoff.attach_arrays(fields) if shm_handoff is not None else None
+    try:
+        with metrics.timed(STAGE, "load"):
+            points, colors = mapped[:2] if mapped else load_ply(ply_path)
+
+        # 1) labels
+        labels_doc, label_ids, hit = cached_label_points(frame_id, points, colors, get_label_cache(args), frame_detector(args, frame_id, fields), frame_gate(args, fields), frame_window(args, fields), args.voxel_size)
+        with metrics.timed(STAGE, "write"):
+            labels_path = write_label_artifacts(frame_id, labels_doc, points, label_ids, out_dir, color_dir if args.write_colorized else None, reuse=hit)
+        labeled = tracing.finish(trace, "label")
+        if r is not None and args.redis_out_stream:
+            with metrics.timed(STAGE, "publish"):
+                xadd_safe(r, args.redis_out_stream, {"frame_id": frame_id, "labels_path": labels_path.as_posix(), "label_ids_path": labels_path.with_suffix(".npy").as_posix(), "ply_path": ply_path.as_posix(), **seq, **labeled})
+
+        # 2) redaction (same arrays, labels from memory)
+        anon_path = anonymized_path(Path(args.redacted_out_dir or args.out_dir), frame_id, args.redact_output_format)
+        if not anon_path.exists():
+            redact_trace = tracing.inbound(labeled, "redact")
+            redact_frame(frame_id, ply_path, labels_path, anon_path, mode=args.redact_mode, cloud=(points, colors), labels=labels_doc,
+                         label_ids=label_ids if args.redact_mask_source == "label-ids" else None,
+                         output_format=args.redact_output_format, quantization_bits=args.redact_draco_quantization)
+            if r is not None and args.redacted_stream:
+                xadd_safe(r, args.redacted_stream, {"frame_id": frame_id, "anonymized_path": anon_path.as_posix(), "anonymized_format": args.redact_output_format, **seq, **tracing.finish(redact_trace, "redact")})
+
+        # 3) analytics (labels document from memory)
+        metrics_path = out_dir / f"metrics-{frame_id}.json"
+        if not metrics_path.exists():
+            analytics_trace = tracing.inbound(labeled, "analytics")
+            analyze_frame(get_sequence_cache(args), sequence_key(fields), frame_id, labels_doc, out_dir, args.low_coverage_threshold, get_timeseries_store(args))
+            if r is not None and args.analytics_stream:
+                xadd_safe(r, args.analytics_stream, {"frame_id": str(frame_id), "metrics_path": metrics_path.as_posix(), **seq, **tracing.finish(analytics_trace, "analytics")})
+        LOGGER.info("Fused %s | labeled %.1f%% -> %s, %s", frame_id, labels_doc["metrics"]["labeled_fraction"] * 100.0, anon_path.name, metrics_path.name)
+    finally:
+        points = colors = None
+        if mapped:
+            shm = mapped[2]; del mapped
+            shm_handoff.release(shm)
     return True
 
 
+def _batch_label_one(args: argparse.Namespace, ply_path: Path) -> Tuple[str, int, float, Optional[str]]:
+    """Process-pool task for --batch-dir: (frame_id, points, seconds, error)."""
+    frame_id = ply_path.stem
+    out_dir = Path(args.out_dir)
+    color_dir = Path(args.colorized_dir) if args.colorized_dir else out_dir
+    t0 = time.perf_counter()
+    try:
+        points, colors = load_ply(ply_path)
+        label_frame(
+            frame_id, ply_path, out_dir, color_dir if args.write_colorized else None,
+            cloud=(points, colors), detector=frame_detector(args, frame_id, {}), voxel_size=args.voxel_size, cache=get_label_cache(args),
+        )
+        return frame_id, int(points.shape[0]), time.perf_counter() - t0, None
+    except Exception as e:
+        LOGGER.debug("batch: %s failed", frame_id, exc_info=True)
+        return frame_id, 0, time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+
 
+def run_batch(args: argparse.Namespace) -> int:
+    """Label every PLY in --batch-dir with a process pool; never touches Redis.
+
+    Frames whose labels-<id>.json (written last) already exists, with its
+    colorized PLY under --write-colorized, are skipped unless --overwrite, so
+    an interrupted run resumes where it stopped. Returns the number of failed
+    frames.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    global INFER_SIZE
+    INFER_SIZE = args.infer_size or INFER_SIZE
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if args.colorized_dir:
+        Path(args.colorized_dir).mkdir(parents=True, exist_ok=True)
+    # Per-sequence state (--track, --skip-static, --infer-roi) does not survive frames spread over a pool
+    args.track = args.skip_static = args.infer_roi = False
+
+    plys = sorted(Path(args.batch_dir).glob("*.ply"))
+    color_dir = (Path(args.colorized_dir) if args.colorized_dir else out_dir) if args.write_colorized else None
+    todo = [p for p in plys if args.overwrite or not labels_complete(p.stem, out_dir, color_dir)]
+    LOGGER.info("batch: %d PLYs in %s, %d already labeled, %d to do | workers=%d", len(plys), args.batch_dir, len(plys) - len(todo), len(todo), args.batch_workers)
+    if not todo:
+        return 0
+
+    done = failed = total_points = 0
+    busy_s = 0.0
+    t0 = time.perf_counter()
+    every = max(1, len(todo) // 20)
+    with ProcessPoolExecutor(max_workers=args.batch_workers) as pool:
+        futures = [pool.submit(_batch_label_one, args, p) for p in todo]
+        for fut in as_completed(futures):
+            frame_id, n_points, took, err = fut.result()
+            done += 1
+            busy_s += took
+            if err:
+                failed += 1
+                LOGGER.error("batch: %s failed: %s", frame_id, err)
+            else:
+                total_points += n_points
+            if done % every == 0 or done == len(todo):
+                elapsed = time.perf_counter() - t0
+                LOGGER.info("batch: %d/%d (%.0f%%) | %.2f frames/s | eta %.0fs", done, len(todo), 100.0 * done / len(todo), done / elapsed, (len(todo) - done) * elapsed / done)
+    elapsed = time.perf_counter() - t0
+    LOGGER.info(
+        "batch: finished %d frames (%d failed) in %.1fs | %.2f frames/s, %.0f points/s, %.0f ms/frame per worker",
+        done, failed, elapsed, done / elapsed, total_points / elapsed, 1000.0 * busy_s / done,
+    )
+    return failed
 
 
 def run_loop(args: argparse.Namespace) -> None:
@@ -547,53 +1327,53 @@ def run_loop(args: argparse.Namespace) -> None:
     out_dir.mkdir(parents=True, exist_ok=True)
     color_dir.mkdir(parents=True, exist_ok=True)
 
+    global INFER_SIZE
+    INFER_SIZE = args.infer_size or INFER_SIZE
+
     # Redis mode
     r = get_client(args.redis_url)
     if r is None:
         LOGGER.error("part-labeler: unable to connect to Redis at %s", args.redis_url)
         sys.exit(1)
+    if args.shard_count > 1:
+        # Every shard reads the whole stream through its own group and keeps only its sequences
+        args.redis_group = f"{args.redis_group}.{args.shard_index}"
+        LOGGER.info("part-labeler: shard %d/%d (group %s)", args.shard_index, args.shard_count, args.redis_group)
+    if args.pose_backend != "mediapipe":
+        if get_backend is None:
+            LOGGER.error("part-labeler: pose backend %s unavailable", args.pose_backend)
+            sys.exit(1)
+        get_backend(args.pose_backend, model_path=args.onnx_model, threads=args.onnx_threads, max_batch=args.infer_batch, max_wait_ms=args.infer_batch_wait_ms)
+        if args.track:
+            LOGGER.warning("part-labeler: --track needs the mediapipe backend; ignoring it")
+            args.track = False
+        if args.concurrency == 1 and args.executor == "thread" and args.infer_batch > 1:
+            # Batches form across concurrent handlers; run as many as a read batch holds
+            args.concurrency = min(args.batch_size, args.infer_batch)
+            LOGGER.info("part-labeler: %s backend batching up to %d frames (concurrency=%d)", args.pose_backend, args.infer_batch, args.concurrency)
+    if args.track and (args.concurrency > 1 or args.executor == "process"):
+        LOGGER.warning("part-labeler: --track with concurrency>1 or a process pool may reorder frames; tracks restart on gaps")
+    metrics.start_metrics_server(args.metrics_port)
+    metrics.watch_consumer_lag(r, args.redis_in_stream, args.redis_group, STAGE)
+    handler = handle_message
+    if args.fused:
+        if redact_frame is None or analyze_frame is None:
+            LOGGER.error("part-labeler: --fused needs the redactor and analytics modules")
+            sys.exit(1)
+        from services.redactor import redactor as _redactor
+        if args.redact_output_format == "draco" and _redactor.DracoPy is None:
+            LOGGER.warning("part-labeler: DracoPy not installed; fused redaction writes binary PLY")
+            args.redact_output_format = "binary"
+        LOGGER.info("part-labeler: fused mode (label + redact + analytics in-process)")
+        handler = handle_message_fused
+    # ack regardless of outcome; upstream can resend if needed
+    worker = StreamWorker.from_args(r, args, functools.partial(handler, args), ack_on_error=True, name=STAGE)
     try:
-        ensure_group(r, args.redis_in_stream, args.redis_group)
+        worker.run()
     except Exception:
-        LOGGER.exception("part-labeler: failed to ensure Redis group")
+        LOGGER.exception("part-labeler: stream worker failed")
         sys.exit(1)
 
-    while True:
-        entries = readgroup_blocking(
-            r,
-            args.redis_in_stream,
-            args.redis_group,
-            args.redis_consumer,
-            count=8,
-            block_ms=int(args.poll_interval * 1000),
-        )
-        for _, messages in entries or []:
-            for msg_id, fields in messages:
-                frame_id = fields.get("frame_id")
-                if not frame_id:
-                    xack_safe(r, args.redis_in_stream, args.redis_group, msg_id)
-                    continue
-                ply_field = fields.get("ply_path")
-                if not ply_field:
-                    xack_safe(r, args.redis_in_stream, args.redis_group, msg_id)
-                    continue
-                ply_path = Path(ply_field)
-                try:
-                    label_frame(
-                        frame_id,
-                        ply_path,
-                        out_dir,
-                        color_dir if args.write_colorized else None,
-                        args.redis_out_stream,
-                        args.redis_url,
-                    )
-                except Exception:
-                    LOGGER.exception("Failed to label frame %s", frame_id)
-                finally:
-                    # ack regardless; upstream can resend if needed
-                    xack_safe(r, args.redis_in_stream, args.redis_group, msg_id)
-        continue
-
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Part labeler service")
@@ -602,12 +1382,59 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--write-colorized", action="store_true", help="Emit colorized PLY previews alongside JSON labels")
     parser.add_argument("--poll-interval", type=float, default=1.0, help="Polling interval in seconds while waiting for new frames")
     parser.add_argument("--log-level", choices=["debug","info","warning","error"], default="info")
+    parser.add_argument("--batch-dir", default="", help="Offline mode: label every *.ply in this directory and exit (no Redis)")
+    parser.add_argument("--batch-workers", type=int, default=os.cpu_count() or 1, help="Worker processes for --batch-dir")
+    parser.add_argument("--overwrite", action="store_true", help="With --batch-dir, relabel frames whose labels JSON already exists")
     parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", ""), help="Redis URL (e.g., redis://host:6379/0)")
     parser.add_argument("--redis-out-stream", default=os.environ.get("REDIS_STREAM_PARTS_LABELED", "s_parts_labeled"), help="Stream to publish s_parts_labeled")
     parser.add_argument("--redis-in-stream", default=os.environ.get("REDIS_STREAM_FRAMES_CONVERTED", "s_frames_converted"), help="Stream to consume converted frames")
     parser.add_argument("--redis-group", default=os.environ.get("REDIS_GROUP_PART_LABELER", "g_part_labeler"), help="Consumer group name")
     parser.add_argument("--redis-consumer", default=os.environ.get("HOSTNAME", "part-labeler-1"), help="Consumer name")
-    return parser.parse_args()
+    add_worker_args(parser, batch_size=8)
+    fused = parser.add_argument_group("fused mode")
+    fused.add_argument("--fused", action="store_true", help="Also redact and compute analytics in-process (scale the redactor/analytics deployments to 0)")
+    fused.add_argument("--redact-mode", choices=["recolor", "remove"], default="recolor", help="PII handling in fused mode")
+    fused.add_argument("--redact-mask-source", choices=["bbox", "label-ids"], default="bbox", help="Mask PII by expanded label bboxes or by the per-point label ids")
+    fused.add_argument("--redact-output-format", choices=["ascii", "binary", "draco"], default=os.environ.get("REDACTOR_OUTPUT_FORMAT", "ascii"), help="Anonymized output in fused mode: ascii PLY, binary PLY or Draco (.drc)")
+    fused.add_argument("--redact-draco-quantization", type=int, default=int(os.environ.get("REDACTOR_DRACO_QBITS", "14")), help="Draco position quantization bits in fused mode")
+    fused.add_argument("--redacted-out-dir", default="", help="Directory for anonymized-*.ply (defaults to --out-dir)")
+    fused.add_argument("--redacted-stream", default=os.environ.get("REDIS_STREAM_REDACTED_DONE", "s_redacted_done"), help="Stream for s_redacted_done events")
+    fused.add_argument("--analytics-stream", default=os.environ.get("REDIS_STREAM_ANALYTICS_DONE", "s_analytics_done"), help="Stream for s_analytics_done events")
+    fused.add_argument("--timeseries-dir", default=os.environ.get("ANALYTICS_TIMESERIES_DIR", ""), help="Per-sequence SQLite analytics time series in fused mode (default <out-dir>/timeseries)")
+    fused.add_argument("--no-timeseries", action="store_true", help="Fused mode: only write metrics-*.json")
+    fused.add_argument("--low-coverage-threshold", type=float, default=0.2, help="QoS threshold for the low_coverage flag")
+    fused.add_argument("--motion-cache-frames", type=int, default=32, help="Fused mode: recent metrics kept in memory per sequence for motion (0 = always read the previous frame from disk)")
+    fused.add_argument("--motion-cache-sequences", type=int, default=64, help="Fused mode: sequences kept in the motion cache (least recently used dropped)")
+    fused.add_argument("--reorder-window", type=int, default=16, help="Fused mode: frames a successor may arrive ahead of its predecessor and still get motion")
+    track = parser.add_argument_group("pose tracking")
+    track.add_argument("--track", action="store_true", help="Track pose across consecutive frames of a sequence (Holistic video mode) instead of detecting every frame")
+    track.add_argument("--track-min-confidence", type=float, default=_get_env_float("PL_TRACK_MIN_CONFIDENCE", 0.5), help="Re-run full detection when mean pose visibility drops below this")
+    track.add_argument("--track-max-gap", type=int, default=1, help="Largest frame-id step still treated as continuous")
+    track.add_argument("--track-idle", type=float, default=300.0, help="Seconds before an idle sequence's tracker is closed")
+    track.add_argument("--skip-static", action="store_true", help="Reuse the previous frame's landmarks when the cloud barely moved (centroid/bbox delta)")
+    track.add_argument("--skip-static-threshold", type=float, default=_get_env_float("PL_SKIP_STATIC_THRESHOLD", 0.01), help="Max centroid/bbox change, as a fraction of the bbox diagonal, for a frame to count as static")
+    track.add_argument("--skip-static-max-reuse", type=int, default=10, help="Force inference after this many reused frames in a row")
+    infer = parser.add_argument_group("inference render")
+    infer.add_argument("--label-cache-dir", default=os.environ.get("PL_LABEL_CACHE_DIR", ""), help="Reuse labels for identical clouds under identical tunables (content-hash cache; default <out-dir>/.label-cache unless --track/--skip-static/--infer-roi; 'off' disables)")
+    infer.add_argument("--label-cache-max", type=int, default=10000, help="Max entries kept in --label-cache-dir")
+    infer.add_argument("--voxel-size", type=float, default=_get_env_float("PL_VOXEL_SIZE", 0.0), help="Voxel edge (cloud units) for the downsampled working cloud used by box refinement and assignment (0 = full resolution)")
+    infer.add_argument("--pose-backend", choices=["mediapipe", "onnx"], default=os.environ.get("PL_POSE_BACKEND", "mediapipe"), help="Pose model runtime")
+    infer.add_argument("--onnx-model", default=os.environ.get("PL_ONNX_MODEL", ""), help="BlazePose-style landmark model for --pose-backend onnx")
+    infer.add_argument("--onnx-threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = runtime default)")
+    infer.add_argument("--infer-batch", type=int, default=8, help="Max frames per batched inference call (onnx backend, thread executor)")
+    infer.add_argument("--infer-batch-wait-ms", type=float, default=5.0, help="Max wait for a batch to fill")
+    infer.add_argument("--infer-size", type=int, default=0, help="Max inference render side in px (default: PL_INFER_SIZE, else PREVIEW_SIZE); independent of the saved previews")
+    infer.add_argument("--infer-roi", action="store_true", help="Crop the inference render to the person (previous frame's parts or an XY density estimate) and size it to the points in the crop")
+    infer.add_argument("--infer-min-size", type=int, default=256, help="Smallest adaptive inference render side in px")
+    infer.add_argument("--infer-roi-pad", type=float, default=0.15, help="Padding around the ROI per side, as a fraction of its size")
+    infer.add_argument("--infer-points-per-px", type=float, default=1.0, help="Target points per pixel when sizing the ROI render")
+    track.add_argument("--shard-index", type=int, default=int(os.environ.get("PL_SHARD_INDEX", "0")), help="This replica's shard (sequences are hashed over --shard-count)")
+    track.add_argument("--shard-count", type=int, default=int(os.environ.get("PL_SHARD_COUNT", "1")), help="Replicas splitting the stream by sequence; each uses group <redis-group>.<shard-index>")
+    metrics.add_metrics_args(parser, default_port=9102)
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < max(1, args.shard_count):
+        parser.error("--shard-index must be in [0, --shard-count)")
+    return args
 
 
 def main() -> None:
@@ -617,6 +1444,9 @@ def main() -> None:
         format="%(asctime)s.%(msecs)03d %(levelname)s %(name)s: %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
     )
+    if args.batch_dir:
+        LOGGER.info("Starting part labeler (batch) | in=%s out=%s", args.batch_dir, args.out_dir)
+        sys.exit(1 if run_batch(args) else 0)
     LOGGER.info(
         "Starting part labeler (Redis-driven) | out=%s in-stream=%s out-stream=%s",
         args.out_dir,
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Pose backends for the part labeler.
+
+A backend maps an RGB render to a Holistic-style result object with the
+attributes `label_points` reads: ``pose_landmarks``, ``face_landmarks``,
+``left_hand_landmarks`` and ``right_hand_landmarks``. Each is None or has a
+``.landmark`` list of items with x/y (normalized to the image), z and
+visibility.
+
+- ``mediapipe`` – ``mediapipe.solutions.holistic`` in static mode, one image per call
+- ``onnx``      – ONNX Runtime CPU session over a BlazePose-style landmark model
+  (NHWC or NCHW float input in [0, 1], first output ``[B, 33*k]`` with
+  x, y, z, visibility(, presence) per landmark in input pixels). Face/hand
+  landmarks are not produced; the labeler falls back to pose indices for them.
+
+`BatchingBackend` collects images from concurrent handler threads and runs
+them through ``detect_batch`` together (up to ``max_batch`` images, waiting at
+most ``max_wait_ms`` for a batch to fill).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import types
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:  # pragma: no cover
+    import onnxruntime as ort  # type: ignore
+except Exception:  # pragma: no cover
+    ort = None  # type: ignore
+
+try:  # pragma: no cover
+    from PIL import Image  # type: ignore
+except Exception:  # pragma: no cover
+    Image = None  # type: ignore
+
+LOGGER = logging.getLogger("pose-backend")
+
+NUM_POSE_LANDMARKS = 33
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def landmarks_result(pose: Optional[np.ndarray]):
+    """Holistic-style result from a (33, 4) array of x, y, z, visibility (None = no pose)."""
+    pose_landmarks = None
+    if pose is not None:
+        pose_landmarks = types.SimpleNamespace(landmark=[
+            types.SimpleNamespace(x=float(x), y=float(y), z=float(z), visibility=float(v)) for x, y, z, v in pose
+        ])
+    return types.SimpleNamespace(pose_landmarks=pose_landmarks, face_landmarks=None, left_hand_landmarks=None, right_hand_landmarks=None)
+
+
+class PoseBackend:
+    """Interface: ``detect`` one image, ``detect_batch`` several (default: one by one)."""
+
+    name = "base"
+
+    def detect(self, img: np.ndarray):
+        return self.detect_batch([img])[0]
+
+    def detect_batch(self, imgs: Sequence[np.ndarray]) -> List[object]:
+        return [self.detect(img) for img in imgs]
+
+    def close(self) -> None:
+        pass
+
+
+class MediaPipeBackend(PoseBackend):
+    """``mediapipe.solutions.holistic`` in static image mode (fresh graph per image, as before)."""
+
+    name = "mediapipe"
+
+    def __init__(self, model_complexity: int = 0) -> None:
+        from mediapipe import solutions as mp_solutions  # type: ignore
+        self._holistic = mp_solutions.holistic
+        self.model_complexity = model_complexity
+
+    def detect(self, img: np.ndarray):
+        holistic = self._holistic.Holistic(static_image_mode=True, model_complexity=self.model_complexity)
+        try:
+            return holistic.process(img)
+        finally:
+            holistic.close()
+
+
+class OnnxPoseBackend(PoseBackend):
+    """Batched CPU landmark inference with ONNX Runtime."""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, threads: int = 0, min_presence: float = 0.5) -> None:
+        if ort is None:
+            raise RuntimeError("onnxruntime is not installed")
+        if Image is None:
+            raise RuntimeError("Pillow is required for the onnx pose backend")
+        opts = ort.SessionOptions()
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        shape = list(inp.shape)
+        self.nchw = len(shape) == 4 and shape[1] == 3
+        hw = shape[2:4] if self.nchw else shape[1:3]
+        self.height, self.width = (int(d) if isinstance(d, int) else 256 for d in hw)
+        self.fixed_batch = shape[0] if isinstance(shape[0], int) else None
+        self.min_presence = min_presence
+        LOGGER.info("onnx pose backend: %s input=%s %dx%d batch=%s", os.path.basename(model_path), "NCHW" if self.nchw else "NHWC", self.width, self.height, self.fixed_batch or "dynamic")
+
+    def _prepare(self, img: np.ndarray) -> np.ndarray:
+        if img.shape[0] != self.height or img.shape[1] != self.width:
+            img = np.asarray(Image.fromarray(img).resize((self.width, self.height), Image.BILINEAR))
+        x = img.astype(np.float32) / 255.0
+        return x.transpose(2, 0, 1) if self.nchw else x
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self.session.run(None, {self.input_name: batch})[0], dtype=np.float32).reshape(batch.shape[0], -1)
+
+    def detect_batch(self, imgs: Sequence[np.ndarray]) -> List[object]:
+        if not imgs:
+            return []
+        batch = np.stack([self._prepare(img) for img in imgs])
+        if self.fixed_batch == 1 and batch.shape[0] > 1:
+            raw = np.concatenate([self._run(batch[i:i + 1]) for i in range(batch.shape[0])])
+        else:
+            raw = self._run(batch)
+        per = raw.shape[1] // NUM_POSE_LANDMARKS if raw.shape[1] >= NUM_POSE_LANDMARKS * 4 else 0
+        out: List[object] = []
+        for row in raw:
+            if not per:
+                out.append(landmarks_result(None))
+                continue
+            lm = row[: NUM_POSE_LANDMARKS * per].reshape(NUM_POSE_LANDMARKS, per)
+            vis = _sigmoid(lm[:, 3])
+            if per > 4 and float(_sigmoid(lm[:, 4]).mean()) < self.min_presence:
+                out.append(landmarks_result(None))
+                continue
+            pose = np.stack([lm[:, 0] / self.width, lm[:, 1] / self.height, lm[:, 2] / self.width, vis], axis=1)
+            out.append(landmarks_result(pose))
+        return out
+
+
+class BatchingBackend(PoseBackend):
+    """Coalesce ``detect`` calls from concurrent threads into ``detect_batch`` calls on ``inner``."""
+
+    def __init__(self, inner: PoseBackend, max_batch: int = 8, max_wait_ms: float = 5.0) -> None:
+        self.inner = inner
+        self.name = f"{inner.name}+batch"
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.batches = self.images = 0
+        self._queue: List[Tuple[np.ndarray, Future]] = []
+        self._cond = threading.Condition()
+        self._running = False
+
+    def detect(self, img: np.ndarray):
+        fut: Future = Future()
+        with self._cond:
+            self._queue.append((img, fut))
+            self._cond.notify_all()
+            lead = not self._running
+            if lead:
+                self._running = True
+        if lead:
+            self._drain()
+        return fut.result()
+
+    def _drain(self) -> None:
+        # The first caller without a running leader runs batches until the queue is empty
+        while True:
+            with self._cond:
+                if len(self._queue) < self.max_batch:
+                    self._cond.wait_for(lambda: len(self._queue) >= self.max_batch, timeout=self.max_wait)
+                batch, self._queue = self._queue[: self.max_batch], self._queue[self.max_batch:]
+                if not batch:
+                    self._running = False
+                    return
+            try:
+                results = self.inner.detect_batch([img for img, _ in batch])
+                for (_, fut), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            self.batches += 1
+            self.images += len(batch)
+
+    def detect_batch(self, imgs: Sequence[np.ndarray]) -> List[object]:
+        return self.inner.detect_batch(imgs)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+_BACKENDS: Dict[Tuple, PoseBackend] = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def get_backend(name: str, *, model_path: str = "", threads: int = 0, max_batch: int = 8, max_wait_ms: float = 5.0) -> PoseBackend:
+    """Per-process backend instance for these options."""
+    key = (os.getpid(), name, model_path, threads, max_batch, max_wait_ms)
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get(key)
+        if backend is None:
+            if name == "onnx":
+                if not model_path:
+                    raise RuntimeError("onnx pose backend needs a model path (--onnx-model / PL_ONNX_MODEL)")
+                backend = OnnxPoseBackend(model_path, threads=threads)
+                if max_batch > 1:
+                    backend = BatchingBackend(backend, max_batch=max_batch, max_wait_ms=max_wait_ms)
+            elif name == "mediapipe":
+                backend = MediaPipeBackend()
+            else:
+                raise ValueError(f"unknown pose backend {name!r}")
+            _BACKENDS[key] = backend
+        return backend
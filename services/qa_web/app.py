@@ -14,11 +14,12 @@ import os
 import json
 from typing import Dict, Any
 from pathlib import Path
+from urllib.parse import quote
 
 import httpx
 import asyncio
 from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 RESULTS_API_URL = os.environ.get("RESULTS_API_URL", "http://results-api.semseg.svc.cluster.local")
@@ -42,6 +43,7 @@ th{{background:#f5f5f5}}
 a{{text-decoration:none;color:#0366d6}}
 form.inline{{display:inline}}
 code{{background:#f0f0f0;padding:2px 4px;border-radius:3px}}
+tr.updated{{background:#fffbe6}}
 </style></head><body>{body}</body></html>"""
 
 
@@ -63,9 +65,24 @@ async def healthz():
     return {"status": "ok"}
 
 
+PAGE_SIZE = int(os.environ.get("QA_PAGE_SIZE", "200"))
+
+
+# Highlights listed frames and counts updates from the results_api event feed (relayed by /events)
+LIVE_SNIPPET = """<p id='live' hidden></p><script>
+let updates = 0;
+new EventSource('/events').addEventListener('stage', e => {
+  const d = JSON.parse(e.data), row = document.getElementById('f-' + d.frame_id), live = document.getElementById('live');
+  if (row) row.classList.add('updated');
+  live.hidden = false; live.innerHTML = (++updates) + ' pipeline update(s) since load (last: ' + d.frame_id + ' ' + d.stage + ') | <a href="">reload</a>';
+});
+</script>"""
+
+
 @app.get("/")
-async def index():
-    frames_doc = await fetch_json("/frames")
+async def index(cursor: str = "", flag: str = ""):
+    query = f"/frames?limit={PAGE_SIZE}" + (f"&cursor={quote(cursor)}" if cursor else "") + (f"&flag={quote(flag)}" if flag else "")
+    frames_doc = await fetch_json(query)
     frames = frames_doc.get("frames", [])
     rows = []
     for f in frames:
@@ -82,7 +99,7 @@ async def index():
         if flags.get("head_missing") and flags.get("hands_missing"):
             cls = "bad"
         rows.append(
-            f"<tr><td><a href='/frames/{fid}'>{fid}</a></td>"
+            f"<tr id='f-{fid}'><td><a href='/frames/{fid}'>{fid}</a></td>"
             f"<td class='{cls}'>{lf_pct}</td>"
             f"<td>{'Y' if has.get('labels') else ''}</td>"
             f"<td>{'Y' if has.get('metrics') else ''}</td>"
@@ -93,7 +110,13 @@ async def index():
             f"<form class='inline' method='post' action='/frames/{fid}/qa'><input type='hidden' name='status' value='rejected'><button>✗</button></form>"
             f"</td></tr>"
         )
-    body = "<h1>QA Frames</h1><table><tr><th>Frame</th><th>Coverage</th><th>Lbl</th><th>Met</th><th>Anon</th><th>QA</th><th>Actions</th></tr>" + "".join(rows) + "</table>"
+    next_cursor = frames_doc.get("next_cursor")
+    nav = f"<p>{frames_doc.get('total', len(frames))} frames"
+    nav += " | filter: " + " ".join(f"<a href='/?flag={f}'>{f}</a>" for f in ("low_coverage", "head_missing", "hands_missing")) + " <a href='/'>all</a>"
+    if next_cursor:
+        nav += f" | <a href='/?cursor={quote(next_cursor)}" + (f"&flag={quote(flag)}" if flag else "") + "'>next page &raquo;</a>"
+    nav += "</p>"
+    body = "<h1>QA Frames</h1>" + nav + LIVE_SNIPPET + "<table><tr><th>Frame</th><th>Coverage</th><th>Lbl</th><th>Met</th><th>Anon</th><th>QA</th><th>Actions</th></tr>" + "".join(rows) + "</table>"
     return render(body)
 
 
@@ -133,25 +156,25 @@ async def frame_detail(frame_id: str, kind: str = "metrics"):
         body += f"<h2>Labels</h2><img src='/proxy/{frame_id}/preview-labels-colored.png' style='max-width:480px;border:1px solid #ccc;float:right;margin:0 0 1rem 1rem' alt='preview missing'/><pre>" + json.dumps(labels.get("labels", {}), indent=2) + "</pre><div style='clear:both'></div>"
     
     elif kind == "preview":
-        body += f"<h2>Preview</h2><img src='/proxy/{frame_id}/preview.png?t=1' style='max-width:640px;border:1px solid #ccc' alt='preview missing'/>"
+        body += f"<h2>Preview</h2><img src='/proxy/{frame_id}/preview.png' style='max-width:640px;border:1px solid #ccc' alt='preview missing'/>"
     elif kind == "anonymized":
         body += (
             f"<h2>Anonymized Cloud</h2><p><code>.ply</code> download via proxy: "
             f"<a href='/proxy/{frame_id}/anonymized.ply' download>anonymized-{frame_id}.ply</a></p>"
-            f"<p>Anonymized Preview:<br><img src='/proxy/{frame_id}/preview-anonymized.png?t=anon' style='max-width:640px;border:1px solid #ccc' alt='preview missing'/></p>"
+            f"<p>Anonymized Preview:<br><img src='/proxy/{frame_id}/preview-anonymized.png' style='max-width:640px;border:1px solid #ccc' alt='preview missing'/></p>"
         )
     elif kind == "labels-colored":
         body += (
             f"<h2>Colorized Labels PLY</h2><p><a href='/proxy/{frame_id}/labels-colored.ply' download>labels-colored-{frame_id}.ply</a></p>"
-            f"<p>Labels-colored Preview:<br><img src='/proxy/{frame_id}/preview-labels-colored.png?t=lbl' style='max-width:640px;border:1px solid #ccc' alt='preview missing'/></p>"
+            f"<p>Labels-colored Preview:<br><img src='/proxy/{frame_id}/preview-labels-colored.png' style='max-width:640px;border:1px solid #ccc' alt='preview missing'/></p>"
         )
     elif kind == "compare":
         # Build side-by-side comparison (generic, labels-colored, anonymized)
         body += "<h2>Comparison</h2>"
         imgs = [
-            ("Original/Generic", f"/proxy/{frame_id}/preview.png?t=cmp"),
-            ("Labels-Colored", f"/proxy/{frame_id}/preview-labels-colored.png?t=cmp"),
-            ("Anonymized", f"/proxy/{frame_id}/preview-anonymized.png?t=cmp"),
+            ("Original/Generic", f"/proxy/{frame_id}/preview.png"),
+            ("Labels-Colored", f"/proxy/{frame_id}/preview-labels-colored.png"),
+            ("Anonymized", f"/proxy/{frame_id}/preview-anonymized.png"),
         ]
         grid = "<table style='width:100%;text-align:center'><tr>" + "".join([f"<th>{title}</th>" for title,_ in imgs]) + "</tr><tr>" + \
                "".join([f"<td><img src='{src}' style='max-width:100%;border:1px solid #ccc' alt='{title} missing'/></td>" for title,src in imgs]) + "</tr></table>"
@@ -176,8 +199,13 @@ async def qa_dump():
     return {"qa": QA_STATE}
 
 
+# Conditional-request and caching headers passed through the proxy (results_api sets validators)
+PROXY_REQUEST_HEADERS = ("if-none-match", "if-modified-since")
+PROXY_RESPONSE_HEADERS = ("etag", "last-modified", "cache-control")
+
+
 @app.get("/proxy/{frame_id}/{artifact}")
-async def proxy_artifact(frame_id: str, artifact: str):
+async def proxy_artifact(frame_id: str, artifact: str, request: Request):
     # Allow fixed set of artifact names
     allowed = {"labels.json","metrics.json","anonymized.ply","labels-colored.ply","preview.png","preview-anonymized.png","preview-labels-colored.png"}
     if artifact not in allowed:
@@ -186,7 +214,10 @@ async def proxy_artifact(frame_id: str, artifact: str):
     url = f"{RESULTS_API_URL.rstrip('/')}{upstream_path}"
     try:
         async with httpx.AsyncClient(timeout=15) as client:
-            r = await client.get(url)
+            r = await client.get(url, headers={h: request.headers[h] for h in PROXY_REQUEST_HEADERS if h in request.headers})
+            cache_headers = {h: r.headers[h] for h in PROXY_RESPONSE_HEADERS if h in r.headers}
+            if r.status_code == 304:
+                return Response(status_code=304, headers=cache_headers)
             if r.status_code != 200:
                 raise HTTPException(status_code=r.status_code, detail=f"Upstream returned {r.status_code}")
             media = r.headers.get("content-type", "application/octet-stream")
@@ -199,9 +230,33 @@ async def proxy_artifact(frame_id: str, artifact: str):
             if filename.endswith('.ply'):
                 disp = "attachment"
             return Response(content=r.content, media_type=media, headers={
-                "Content-Disposition": f"{disp}; filename={filename}"
+                "Content-Disposition": f"{disp}; filename={filename}", **cache_headers
             })
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Proxy fetch failed: {e}")
+
+
+@app.get("/events")
+async def relay_events(request: Request):
+    """Relay results_api's /events SSE feed (browsers reach qa_web, not results_api)."""
+    client = httpx.AsyncClient(timeout=httpx.Timeout(10, read=None))
+    headers = {"last-event-id": request.headers["last-event-id"]} if "last-event-id" in request.headers else {}
+    try:
+        upstream = await client.send(client.build_request("GET", f"{RESULTS_API_URL.rstrip('/')}/events", headers=headers), stream=True)
+    except Exception as e:
+        await client.aclose()
+        raise HTTPException(status_code=502, detail=f"Event feed unavailable: {e}")
+    if upstream.status_code != 200:
+        await upstream.aclose(); await client.aclose()
+        raise HTTPException(status_code=upstream.status_code, detail="Event feed unavailable")
+
+    async def relay():
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.aclose(); await client.aclose()
+
+    return StreamingResponse(relay(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
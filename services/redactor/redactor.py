@@ -3,6 +3,8 @@
 """Redactor: recolor/remove PII (head, hands) using labels; publishes s_redacted_done."""
 
 import argparse
+import functools
+import io
 import json
 import logging
 import os
@@ -17,18 +19,32 @@ ROOT_DIR = Path(__file__).resolve().parents[2]; sys.path.insert(0, str(ROOT_DIR)
 import numpy as np
 from plyfile import PlyData
 from services.common.preview import generate_preview
+from services.common.ply_io import binary_header, iter_ply_chunks, read_ply_header, vertex_bytes, write_binary_ply
+from services.common import metrics, tracing
+
+# Optional in-process Draco encoder for --output-format draco
+try:  # pragma: no cover
+	import DracoPy  # type: ignore
+except Exception:  # pragma: no cover
+	DracoPy = None  # type: ignore
 
 # Fail-fast imports for Redis helpers (required)
 REDIS_IMPORT_ERR: Optional[Exception] = None
 try:  # pragma: no cover
-	from services.common.redis_bus import get_client, ensure_group, readgroup_blocking, xack_safe, xadd_safe  # type: ignore
+	from services.common.redis_bus import dead_letter, delivery_counts, get_client, get_shared_client, xadd_safe  # type: ignore
+	from services.common.stream_worker import StreamWorker, add_worker_args  # type: ignore
 except Exception as _e:  # pragma: no cover
-	REDIS_IMPORT_ERR = _e; get_client = ensure_group = readgroup_blocking = xack_safe = xadd_safe = None  # type: ignore
+	REDIS_IMPORT_ERR = _e; dead_letter = delivery_counts = get_client = get_shared_client = xadd_safe = StreamWorker = add_worker_args = None  # type: ignore
 
 LOGGER = logging.getLogger("redactor")
+STAGE = "redactor"  # metrics stage label
 
 PII_LABELS = ["head", "hand_left", "hand_right"]
 ANONYMIZED_COLOR = (128, 128, 128)  # Gray for anonymized regions
+OUTPUT_FORMATS = {"ascii": ".ply", "binary": ".ply", "draco": ".drc"}
+
+def anonymized_path(out_dir: Path, frame_id: str, output_format: str = "ascii") -> Path:
+	return out_dir / f"anonymized-{frame_id}{OUTPUT_FORMATS[output_format]}"
 
 def load_json(path: Path) -> Dict:
 	with path.open("r", encoding="utf-8") as fh:
@@ -47,14 +63,11 @@ def load_ply(path: Path) -> Tuple[np.ndarray, np.ndarray]:
 		colors = np.full_like(points, 200, dtype=np.uint8)
 	return points.astype(np.float32), colors.astype(np.uint8)
 
-def write_ply(path: Path, points: np.ndarray, colors: np.ndarray) -> None:
-	path.parent.mkdir(parents=True, exist_ok=True)
-	tmp = path.with_suffix(path.suffix + f".{os.getpid()}.{int(time.time()*1000)}.tmp")
-	with tmp.open("w", encoding="utf-8") as fh:
-		fh.write("ply\nformat ascii 1.0\n"); fh.write(f"element vertex {points.shape[0]}\n")
-		fh.write("property float x\nproperty float y\nproperty float z\n")
-		fh.write("property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n")
-		for (x, y, z), (r, g, b) in zip(points, colors): fh.write(f"{x} {y} {z} {int(r)} {int(g)} {int(b)}\n")
+def _tmp_path(path: Path) -> Path:
+	return path.with_suffix(path.suffix + f".{os.getpid()}.{int(time.time()*1000)}.tmp")
+
+def _finalize(tmp: Path, path: Path) -> None:
+	"""Rename tmp into place unless another worker got there first (first writer wins)."""
 	try:
 		if path.exists():
 			try: tmp.unlink()
@@ -66,90 +79,266 @@ def write_ply(path: Path, points: np.ndarray, colors: np.ndarray) -> None:
 			if tmp.exists(): tmp.unlink()
 		except Exception: pass
 
+def _write_ascii_header(fh, count_field: str) -> None:
+	fh.write("ply\nformat ascii 1.0\n"); fh.write(f"element vertex {count_field}\n")
+	fh.write("property float x\nproperty float y\nproperty float z\n")
+	fh.write("property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n")
+
+def _write_ascii_rows(fh, points: np.ndarray, colors: np.ndarray) -> None:
+	for (x, y, z), (r, g, b) in zip(points, colors): fh.write(f"{x} {y} {z} {int(r)} {int(g)} {int(b)}\n")
+
+def write_ply(path: Path, points: np.ndarray, colors: np.ndarray) -> None:
+	path.parent.mkdir(parents=True, exist_ok=True)
+	tmp = _tmp_path(path)
+	with tmp.open("w", encoding="utf-8") as fh:
+		_write_ascii_header(fh, str(points.shape[0]))
+		_write_ascii_rows(fh, points, colors)
+	_finalize(tmp, path)
+
+def write_ply_binary(path: Path, points: np.ndarray, colors: np.ndarray) -> None:
+	"""Binary little-endian PLY with the same properties as `write_ply` (~3x smaller, no float formatting)."""
+	path.parent.mkdir(parents=True, exist_ok=True)
+	tmp = _tmp_path(path)
+	with tmp.open("wb") as fh:
+		write_binary_ply(fh, points, colors)
+	_finalize(tmp, path)
+
+def write_drc(path: Path, points: np.ndarray, colors: np.ndarray, quantization_bits: int = 14, compression_level: int = 7) -> None:
+	"""Draco point cloud (positions quantized to ``quantization_bits``, RGB attribute), encoded in-process."""
+	if DracoPy is None: raise RuntimeError("DracoPy is not installed")
+	path.parent.mkdir(parents=True, exist_ok=True)
+	data = DracoPy.encode(np.ascontiguousarray(points, dtype=np.float32), quantization_bits=quantization_bits, compression_level=compression_level, colors=np.ascontiguousarray(colors, dtype=np.uint8), preserve_order=True)
+	tmp = _tmp_path(path)
+	with tmp.open("wb") as fh: fh.write(data)
+	_finalize(tmp, path)
+
+def write_cloud(path: Path, points: np.ndarray, colors: np.ndarray, output_format: str = "ascii", quantization_bits: int = 14, compression_level: int = 7) -> None:
+	if output_format == "draco": write_drc(path, points, colors, quantization_bits, compression_level)
+	elif output_format == "binary": write_ply_binary(path, points, colors)
+	else: write_ply(path, points, colors)
+
+# -- streaming (out-of-core) I/O ---------------------------------------------
+_COUNT_WIDTH = 20  # room for any vertex count; PLY header tokens are whitespace separated
+
+class PlyStreamWriter:
+	"""ASCII or binary PLY writer fed chunk by chunk; the vertex count is patched into the header on close."""
+
+	def __init__(self, path: Path, binary: bool = False) -> None:
+		self.path = path
+		self.binary = binary
+		path.parent.mkdir(parents=True, exist_ok=True)
+		self.tmp = _tmp_path(path)
+		self.count = 0
+		self._fh = self.tmp.open("wb")
+		placeholder = " " * _COUNT_WIDTH
+		if binary: header = binary_header(placeholder)
+		else:
+			buf = io.StringIO(); _write_ascii_header(buf, placeholder); header = buf.getvalue().encode("ascii")
+		self._count_at = header.index(b"element vertex ") + len(b"element vertex ")
+		self._fh.write(header)
+
+	def write(self, points: np.ndarray, colors: np.ndarray) -> None:
+		if self.binary: self._fh.write(vertex_bytes(points, colors))
+		else:
+			buf = io.StringIO(); _write_ascii_rows(buf, points, colors); self._fh.write(buf.getvalue().encode("utf-8"))
+		self.count += int(points.shape[0])
+
+	def close(self) -> None:
+		self._fh.seek(self._count_at)
+		self._fh.write(str(self.count).ljust(_COUNT_WIDTH).encode("ascii"))
+		self._fh.close()
+		_finalize(self.tmp, self.path)
+
+	def abort(self) -> None:
+		self._fh.close()
+		try: self.tmp.unlink()
+		except FileNotFoundError: pass
+
 def _expand_bbox(b: Dict[str, float], margin: float = 0.0) -> Dict[str, float]:
 	return b if margin <= 0 else {"xmin": float(b["xmin"]) - margin, "xmax": float(b["xmax"]) + margin, "ymin": float(b["ymin"]) - margin, "ymax": float(b["ymax"]) + margin, **({"zmin": float(b.get("zmin",0))-margin, "zmax": float(b.get("zmax",0))+margin} if "zmin" in b and "zmax" in b else {})}
 
 
 
-def redact_frame(frame_id: str, ply_path: Path, labels_path: Path, out_path: Path, mode: str = "recolor") -> bool:
-	points, colors = load_ply(ply_path)
-	labels = load_json(labels_path)
-	total_points = points.shape[0]
-	mask = np.zeros(total_points, dtype=bool)
+def load_label_ids(path: Path) -> Optional[np.ndarray]:
+	"""Per-point uint8 label ids written by the part labeler (labels-<id>.npy); None if absent."""
+	try: return np.load(path.as_posix(), mmap_mode="r")
+	except (FileNotFoundError, ValueError, OSError): return None
+
+def pii_mask_from_ids(label_ids: np.ndarray, labels: Dict) -> Optional[np.ndarray]:
+	names = labels.get("label_names")
+	if not names: return None
+	return np.isin(label_ids, [i for i, n in enumerate(names) if n in PII_LABELS])
+
+def pii_boxes(labels: Dict) -> List[Dict[str, float]]:
+	"""PII label boxes expanded by the safety margin."""
+	out = []
 	for label_name in PII_LABELS:
 		bbox = (labels.get("labels", {}).get(label_name) or {}).get("bbox")
-		if not bbox: continue
-		bbox = _expand_bbox(bbox, margin=0.01)
+		if bbox: out.append(_expand_bbox(bbox, margin=0.01))
+	return out
+
+def bbox_mask(points: np.ndarray, boxes: List[Dict[str, float]]) -> np.ndarray:
+	mask = np.zeros(points.shape[0], dtype=bool)
+	for bbox in boxes:
 		xy = ((points[:,0] >= bbox["xmin"]) & (points[:,0] <= bbox["xmax"]) & (points[:,1] >= bbox["ymin"]) & (points[:,1] <= bbox["ymax"]))
 		zok = (points[:,2] >= bbox["zmin"]) & (points[:,2] <= bbox["zmax"]) if ("zmin" in bbox and "zmax" in bbox) else True
 		mask |= (xy & zok)
-	if mode == "remove": points, colors = points[~mask], colors[~mask]
-	else: colors[mask] = np.array(ANONYMIZED_COLOR, dtype=np.uint8)
-	write_ply(out_path, points, colors)
-	LOGGER.info(f"Redacted frame {frame_id}: {np.sum(mask)} PII points {'removed' if mode=='remove' else 'recolored'}.")
+	return mask
+
+def redact_frame(frame_id: str, ply_path: Path, labels_path: Path, out_path: Path, mode: str = "recolor", cloud: Optional[Tuple[np.ndarray, np.ndarray]] = None, labels: Optional[Dict] = None, label_ids: Optional[np.ndarray] = None, output_format: str = "ascii", quantization_bits: int = 14, compression_level: int = 7) -> bool:
+	"""Mask PII and write anonymized-<id>.ply (or .drc); ``cloud``/``labels`` skip the disk reads (fused mode).
+
+	With ``label_ids`` the mask is one ``np.isin`` over the labeler's per-point ids
+	(exactly the labeled PII points); otherwise each PII bbox is expanded by a margin
+	and tested geometrically.
+	"""
+	with metrics.timed(STAGE, "load"):
+		if cloud is not None: points, colors = cloud[0], cloud[1].copy()  # never recolor the caller's array
+		else: points, colors = load_ply(ply_path)
+		if labels is None: labels = load_json(labels_path)
+	total_points = points.shape[0]
+	with metrics.timed(STAGE, "compute"):
+		mask = pii_mask_from_ids(label_ids, labels) if (label_ids is not None and label_ids.shape[0] == total_points) else None
+		if mask is None: mask = bbox_mask(points, pii_boxes(labels))
+		if mode == "remove": points, colors = points[~mask], colors[~mask]
+		else: colors[mask] = np.array(ANONYMIZED_COLOR, dtype=np.uint8)
+	with metrics.timed(STAGE, "write"):
+		write_cloud(out_path, points, colors, output_format, quantization_bits, compression_level)
+		LOGGER.info(f"Redacted frame {frame_id}: {np.sum(mask)} PII points {'removed' if mode=='remove' else 'recolored'}.")
+		preview_path = out_path.parent / f"preview-anonymized-{frame_id}.png"
+		generate_preview(points, colors, preview_path, logger=LOGGER)
+	return True
+
+
+
+def redact_frame_streaming(frame_id: str, ply_path: Path, labels_path: Path, out_path: Path, mode: str = "recolor", label_ids: Optional[np.ndarray] = None, chunk_points: int = 1_000_000, preview_points: int = 1_000_000, binary: bool = False) -> bool:
+	"""Out-of-core `redact_frame`: read, mask and write ``chunk_points`` vertices at a time.
+
+	Peak memory is a few chunks regardless of frame size. ``label_ids`` may be a
+	memory-mapped array (it is sliced per chunk). The preview is rendered from a
+	strided sample of at most ``preview_points`` points. Output is ASCII or
+	binary PLY (Draco needs the whole cloud in memory).
+	"""
+	labels = load_json(labels_path)
+	boxes = pii_boxes(labels)
+	_, count, _, _ = read_ply_header(ply_path)
+	use_ids = label_ids is not None and label_ids.shape[0] == count and bool(labels.get("label_names"))
+	stride = max(1, -(-count // max(1, preview_points)))
+	steps = {"load": 0.0, "compute": 0.0, "write": 0.0}
+	sample_pts: List[np.ndarray] = []; sample_cols: List[np.ndarray] = []
+	writer = PlyStreamWriter(out_path, binary=binary)
+	masked = start = 0
+	try:
+		t = time.perf_counter()
+		for points, colors in iter_ply_chunks(ply_path, chunk_points):
+			t1 = time.perf_counter(); steps["load"] += t1 - t
+			n = points.shape[0]
+			mask = pii_mask_from_ids(np.asarray(label_ids[start:start + n]), labels) if use_ids else bbox_mask(points, boxes)
+			masked += int(mask.sum())
+			if mode == "remove": points, colors = points[~mask], colors[~mask]
+			else: colors[mask] = np.array(ANONYMIZED_COLOR, dtype=np.uint8)
+			first = (-start) % stride if mode != "remove" else 0
+			sample_pts.append(points[first::stride]); sample_cols.append(colors[first::stride])
+			start += n
+			t2 = time.perf_counter(); steps["compute"] += t2 - t1
+			writer.write(points, colors)
+			t = time.perf_counter(); steps["write"] += t - t2
+	except BaseException:
+		writer.abort(); raise
+	t = time.perf_counter()
+	writer.close()
+	LOGGER.info(f"Redacted frame {frame_id} (streamed, {start} points): {masked} PII points {'removed' if mode=='remove' else 'recolored'}.")
 	preview_path = out_path.parent / f"preview-anonymized-{frame_id}.png"
-	generate_preview(points, colors, preview_path, logger=LOGGER)
+	if sample_pts: generate_preview(np.concatenate(sample_pts), np.concatenate(sample_cols), preview_path, logger=LOGGER)
+	steps["write"] += time.perf_counter() - t
+	for step, secs in steps.items(): metrics.observe_step(STAGE, step, secs)
+	return True
+
+def event_age(msg_id: str) -> float:
+	"""Seconds since a stream entry was added (from its ms-time id)."""
+	try: return max(0.0, time.time() - int(str(msg_id).split("-", 1)[0]) / 1000.0)
+	except ValueError: return 0.0
+
+def wait_ready_by_age(args: argparse.Namespace, frame_id: str, ply_path: Path, labels_path: Path) -> None:
+	"""Legacy readiness: block until both files exist and are older than --min-age (raises on deadline)."""
+	start = time.monotonic()
+	deadline = start + max(2.0, args.min_age * 4)
+	while True:
+		now = time.monotonic()
+		if ply_path.exists() and labels_path.exists():
+			try:
+				ok_age = ((time.time()-ply_path.stat().st_mtime) >= args.min_age and (time.time()-labels_path.stat().st_mtime) >= args.min_age)
+			except FileNotFoundError:
+				ok_age = False
+			if ok_age: return
+		if now >= deadline:
+			LOGGER.debug("Artifacts not ready for %s; will retry later", frame_id); raise RuntimeError("Artifacts not ready")
+		time.sleep(min(0.2, args.poll_interval))
+
+def dead_letter_parked(args: argparse.Namespace, msg_id: str, fields: Dict[str, str]) -> bool:
+	"""Move a message parked past --park-timeout to the dead-letter stream; False (stay pending) if that fails."""
+	r = get_shared_client(args.redis_url)
+	if r is None: return False
+	dead_stream = args.dead_letter_stream or f"{args.redis_in_stream}:dead"
+	deliveries = delivery_counts(r, args.redis_in_stream, args.redis_group, [msg_id]).get(msg_id, 0)
+	if not dead_letter(r, args.redis_in_stream, args.redis_group, msg_id, fields, dead_stream, deliveries): return False
+	metrics.count(metrics.FRAMES_DEAD_LETTERED, stage=STAGE)
 	return True
 
+def handle_message(args: argparse.Namespace, msg_id: str, fields: Dict[str, str]) -> bool:
+	"""StreamWorker handler: redact one s_parts_labeled event.
 
+	Returns False (park: leave pending for re-delivery) when an artifact is missing
+	in event readiness mode; raises to leave the message unacked on errors.
+	"""
+	frame_id = fields.get("frame_id")
+	trace = tracing.inbound(fields, "redact")
+	ply_path = Path(fields.get("ply_path") or (Path(args.in_dir) / f"{frame_id}.ply").as_posix())
+	labels_path = Path(fields.get("labels_path") or (Path(args.labels_dir) / f"labels-{frame_id}.json").as_posix())
+	out_path = anonymized_path(Path(args.out_dir), frame_id, args.output_format)
+	if out_path.exists() or (args.output_format == "draco" and anonymized_path(Path(args.out_dir), frame_id, "binary").exists()): return True
+	if args.readiness == "age":
+		wait_ready_by_age(args, frame_id, ply_path, labels_path)
+	elif not (ply_path.exists() and labels_path.exists()):
+		# Upstream publishes only after an atomic rename, so a missing file is a real gap (e.g. shared volume lag)
+		if event_age(msg_id) > args.park_timeout:
+			LOGGER.warning("Artifacts for %s still missing after %.0fs; dead-lettering", frame_id, args.park_timeout)
+			return dead_letter_parked(args, msg_id, fields)
+		LOGGER.debug("Artifacts missing for %s; parked for retry", frame_id); return False
+	label_ids = None
+	if args.mask_source == "label-ids":
+		label_ids = load_label_ids(Path(fields.get("label_ids_path") or labels_path.with_suffix(".npy").as_posix()))
+		if label_ids is None: LOGGER.debug("No label ids for %s; using bbox mask", frame_id)
+	if args.stream_above_mb > 0 and ply_path.stat().st_size >= args.stream_above_mb * 1024 * 1024:
+		if args.output_format == "draco": out_path = anonymized_path(Path(args.out_dir), frame_id, "binary")  # streamed frames stay PLY
+		redact_frame_streaming(frame_id, ply_path, labels_path, out_path, mode=args.mode, label_ids=label_ids, chunk_points=args.chunk_points, binary=args.output_format != "ascii")
+	else:
+		redact_frame(frame_id, ply_path, labels_path, out_path, mode=args.mode, label_ids=label_ids, output_format=args.output_format, quantization_bits=args.draco_quantization, compression_level=args.draco_compression_level)
+	# Publish redacted done (optional)
+	if args.redis_out_stream:
+		r = get_shared_client(args.redis_url)
+		if r is not None:
+			with metrics.timed(STAGE, "publish"): xadd_safe(r, args.redis_out_stream, {"frame_id": frame_id, "anonymized_path": out_path.as_posix(), "anonymized_format": "draco" if out_path.suffix == ".drc" else args.output_format, **({"sequence_id": fields["sequence_id"]} if fields.get("sequence_id") else {}), **tracing.finish(trace, "redact")})
+	return True
 
 def run_loop(args: argparse.Namespace) -> None:
-	in_dir = Path(args.in_dir)
-	labels_dir = Path(args.labels_dir)
-	out_dir = Path(args.out_dir)
 	# no readiness sentinel or tmp cleanup; keep the core loop lean
 	# Redis-only mode: fail fast on missing helpers or config
-	if REDIS_IMPORT_ERR is not None or any(x is None for x in (get_client, ensure_group, readgroup_blocking, xack_safe, xadd_safe)):
+	if REDIS_IMPORT_ERR is not None or any(x is None for x in (get_client, get_shared_client, xadd_safe, StreamWorker)):
 		LOGGER.error("redactor: redis helpers unavailable: %s", REDIS_IMPORT_ERR)
 		return
 	r = get_client(args.redis_url)
 	if not r or not args.redis_in_stream:
 		LOGGER.error("redactor: Redis URL/stream required; exiting")
 		return
-	# Be explicit in logs so it's visible even if group already exists
-	LOGGER.info("redactor: ensuring Redis group %s on stream %s", args.redis_group, args.redis_in_stream)
-	ensure_group(r, args.redis_in_stream, args.redis_group)
-	LOGGER.info("redactor: Redis group %s is ready on %s", args.redis_group, args.redis_in_stream)
-	while True:
-		entries = readgroup_blocking(
-			r,
-			args.redis_in_stream,
-			args.redis_group,
-			args.redis_consumer,
-			count=1,
-			block_ms=int(args.poll_interval * 1000),
-		)
-		if not entries: continue
-		_, messages = entries[0]
-		for msg_id, fields in messages:
-			frame_id = fields.get("frame_id")
-			ply_path = Path(fields.get("ply_path") or (in_dir / f"{frame_id}.ply").as_posix())
-			labels_path = Path(fields.get("labels_path") or (labels_dir / f"labels-{frame_id}.json").as_posix())
-			out_path = out_dir / f"anonymized-{frame_id}.ply"
-			try:
-				if out_path.exists(): xack_safe(r, args.redis_in_stream, args.redis_group, msg_id); continue
-				# Wait for files to exist and be older than min-age (avoid racing)
-				start = time.monotonic()
-				deadline = start + max(2.0, args.min_age * 4)
-				while True:
-					now = time.monotonic()
-					if ply_path.exists() and labels_path.exists():
-						try:
-							ok_age = ((time.time()-ply_path.stat().st_mtime) >= args.min_age and (time.time()-labels_path.stat().st_mtime) >= args.min_age)
-						except FileNotFoundError:
-							ok_age = False
-						if ok_age: break
-					if now >= deadline:
-						LOGGER.debug("Artifacts not ready for %s; will retry later", frame_id); raise RuntimeError("Artifacts not ready")
-					time.sleep(min(0.2, args.poll_interval))
-				redact_frame(frame_id, ply_path, labels_path, out_path, mode=args.mode)
-				# Publish redacted done (optional)
-				if args.redis_out_stream and r is not None:
-					xadd_safe(r, args.redis_out_stream, {"frame_id": frame_id, "anonymized_path": out_path.as_posix()})
-				xack_safe(r, args.redis_in_stream, args.redis_group, msg_id)
-			except Exception:
-				LOGGER.exception("Failed to redact frame %s", frame_id)
-				# Leave unacked for retry
+	if args.output_format == "draco" and DracoPy is None:
+		LOGGER.warning("redactor: DracoPy not installed; writing binary PLY instead of Draco")
+		args.output_format = "binary"
+	metrics.start_metrics_server(args.metrics_port)
+	metrics.watch_consumer_lag(r, args.redis_in_stream, args.redis_group, STAGE)
+	# Failures are logged by the worker and left unacked for retry
+	worker = StreamWorker.from_args(r, args, functools.partial(handle_message, args), ack_on_error=False, name=STAGE)
+	worker.run()
 
 def parse_args() -> argparse.Namespace:
 	p = argparse.ArgumentParser(description="Redactor service")
@@ -157,14 +346,26 @@ def parse_args() -> argparse.Namespace:
 	p.add_argument("--labels-dir", default="/segments", help="Directory with labels-*.json from part labeler")
 	p.add_argument("--out-dir", default="/segments", help="Directory for anonymized-*.ply output")
 	p.add_argument("--mode", choices=["recolor","remove"], default="recolor", help="PII handling: recolor or remove points")
+	p.add_argument("--mask-source", choices=["bbox","label-ids"], default="bbox", help="PII mask: expanded label bboxes, or the labeler's per-point ids (labels-<id>.npy; falls back to bbox when missing)")
+	p.add_argument("--output-format", choices=sorted(OUTPUT_FORMATS), default=os.environ.get("REDACTOR_OUTPUT_FORMAT", "ascii"), help="anonymized output: ascii PLY, binary PLY, or Draco (.drc)")
+	p.add_argument("--draco-quantization", type=int, default=int(os.environ.get("REDACTOR_DRACO_QBITS", "14")), help="Draco position quantization bits")
+	p.add_argument("--draco-compression-level", type=int, default=7, help="Draco compression level (0-10)")
+	p.add_argument("--stream-above-mb", type=float, default=float(os.environ.get("REDACTOR_STREAM_ABOVE_MB", "64") or 0), help="Redact input PLYs at least this large chunk by chunk with bounded memory (0 = always in memory)")
+	p.add_argument("--chunk-points", type=int, default=1_000_000, help="Vertices per chunk for streamed redaction")
+	p.add_argument("--readiness", choices=["event","age"], default=os.environ.get("REDACTOR_READINESS","event"), help="event: trust the event (files are renamed into place before publish) and park missing artifacts; age: wait for files older than --min-age")
+	p.add_argument("--park-timeout", type=float, default=300.0, help="Dead-letter (and ack) a parked message whose artifacts are still missing after this many seconds")
 	p.add_argument("--poll-interval", type=float, default=1.0, help="Polling interval in seconds")
-	p.add_argument("--min-age", type=float, default=0.5, help="Minimum age in seconds before processing a file")
+	p.add_argument("--min-age", type=float, default=0.5, help="Minimum age in seconds before processing a file (--readiness age)")
 	p.add_argument("--log-level", choices=["debug","info","warning","error"], default="info")
 	p.add_argument("--redis-url", default=os.environ.get("REDIS_URL",""), help="Redis URL")
 	p.add_argument("--redis-in-stream", default=os.environ.get("REDIS_STREAM_PARTS_LABELED","s_parts_labeled"), help="Stream to consume labels events from")
 	p.add_argument("--redis-out-stream", default=os.environ.get("REDIS_STREAM_REDACTED_DONE","s_redacted_done"), help="Stream to publish redacted done events to")
 	p.add_argument("--redis-group", default=os.environ.get("REDIS_GROUP_REDACTOR","g_redactor"), help="Consumer group name")
 	p.add_argument("--redis-consumer", default=os.environ.get("HOSTNAME","redactor-1"), help="Consumer name")
+	# Parse/mask/write is CPU-bound (ASCII formatting holds the GIL): default to a process pool
+	workers = int(os.environ.get("REDACTOR_CONCURRENCY", "0") or 0) or min(4, os.cpu_count() or 1)
+	add_worker_args(p, batch_size=8, concurrency=workers, executor=os.environ.get("REDACTOR_EXECUTOR", "process"), prefetch=workers, ack_batch=8, reclaim_idle=60.0)
+	metrics.add_metrics_args(p, default_port=9103)
 	# Redis-only; no filesystem fallback
 	return p.parse_args()
 
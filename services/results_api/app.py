@@ -2,17 +2,37 @@
 from __future__ import annotations
 
 import os
+import threading
 import time
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any
 
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse, FileResponse, Response
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 try:
     from services.common.redis_bus import get_client  # type: ignore
 except Exception:
     get_client = lambda *a, **k: None  # type: ignore
+try:
+    from services.common import tracing  # type: ignore
+except Exception:
+    tracing = None  # type: ignore
+try:
+    from services.results_api import frame_index  # type: ignore
+except Exception:
+    frame_index = None  # type: ignore
+from services.results_api import http_cache  # type: ignore
+from services.results_api import export, live  # type: ignore
+try:  # needs numpy
+    from services.results_api import lod  # type: ignore
+except Exception:
+    lod = None  # type: ignore
+try:  # decode .drc for clients that asked for PLY
+    import DracoPy  # type: ignore
+    from services.common import ply_io  # type: ignore
+except Exception:
+    DracoPy = None  # type: ignore
 
 SEGMENTS_DIR = Path(os.environ.get("SEGMENTS_DIR", "/segments")).resolve()
 
@@ -40,6 +60,7 @@ def artifact_paths(frame_id: str) -> Dict[str, Path]:
         "metrics": SEGMENTS_DIR / f"metrics-{frame_id}.json",
         "labels_colored": SEGMENTS_DIR / "labels" / f"labels-colored-{frame_id}.ply",
         "anonymized": SEGMENTS_DIR / f"anonymized-{frame_id}.ply",
+        "anonymized_drc": SEGMENTS_DIR / f"anonymized-{frame_id}.drc",
         "preview": SEGMENTS_DIR / f"preview-{frame_id}.png",
         "preview_anonymized": SEGMENTS_DIR / f"preview-anonymized-{frame_id}.png",
         "preview_labels": SEGMENTS_DIR / f"preview-labels-colored-{frame_id}.png",
@@ -54,22 +75,98 @@ def healthz():
     return {"status": "ok"}
 
 
+# Frame index: built at startup, kept current by tailing the pipeline's done streams
+FRAME_INDEX_STREAMS = ("s_parts_labeled", "s_redacted_done", "s_analytics_done")
+FRAME_INDEX_RESCAN_S = float(os.environ.get("FRAME_INDEX_RESCAN_S", "60"))
+FRAME_INDEX_TAIL_RESCAN_S = float(os.environ.get("FRAME_INDEX_TAIL_RESCAN_S", "600"))  # catches backfill/batch output, which publishes nothing
+_INDEX = frame_index.FrameIndex(SEGMENTS_DIR) if frame_index is not None else None
+_INDEX_LOCK = threading.Lock()
+_INDEX_STOP: Optional[threading.Event] = None
+# /events subscribers are fed by the frame index's reader (one XREAD for the whole API)
+_HUB = live.EventHub({STREAMS[k]: stage for k, stage in live.STAGES.items() if STREAMS.get(k)})
+
+
+def get_frame_index():
+    """Start the index on first use (startup hook); None when the module is unavailable."""
+    global _INDEX_STOP
+    if _INDEX is None: return None
+    with _INDEX_LOCK:
+        if _INDEX_STOP is None:
+            _INDEX_STOP = frame_index.start(_INDEX, _redis_client(), [STREAMS.get(s, "") for s in FRAME_INDEX_STREAMS], FRAME_INDEX_RESCAN_S,
+                                            extra_keys=list(_HUB.stages), on_event=_HUB.publish, tail_rescan_s=FRAME_INDEX_TAIL_RESCAN_S)
+    return _INDEX
+
+
+@app.on_event("startup")
+def _start_frame_index() -> None:
+    get_frame_index()
+
+
 @app.get("/frames")
-def list_frames():
-    frames = []
-    for fid in find_frame_ids():
-        ap = artifact_paths(fid)
-        item: Dict[str, object] = {"frame_id": fid, "has": {k: p.exists() for k, p in ap.items()}}
-        mp = ap["metrics"]
-        if mp.exists():
-            import json
-            try:
-                with mp.open("r", encoding="utf-8") as fh: m = json.load(fh)
-                item["summary"] = {"labeled_fraction": m.get("totals", {}).get("labeled_fraction"), "flags": m.get("flags", {})}
-            except Exception:
-                pass
+def list_frames(
+    cursor: Optional[str] = Query(None, description="frame_id the previous page ended at (next_cursor)"),
+    limit: Optional[int] = Query(None, ge=1, le=5000),
+    order: str = Query("asc", enum=["asc", "desc"]),
+    flag: List[str] = Query([], description="Only frames with these metrics flags set (low_coverage, head_missing, hands_missing)"),
+    has: List[str] = Query([], description="Only frames with these artifacts (labels, metrics, anonymized, preview, ...)"),
+):
+    """Frames in id order from the in-memory index; without ``limit`` all matching frames are returned."""
+    index = get_frame_index()
+    if index is not None and index.ready.is_set():
+        items, next_cursor = index.page(cursor, limit, order == "desc", flag, has)
+        return JSONResponse({"frames": items, "next_cursor": next_cursor, "total": len(index)})
+    return list_frames_scan(cursor, limit, order == "desc", flag, has)
+
+
+def _scan_item(fid: str) -> Dict[str, object]:
+    ap = artifact_paths(fid)
+    item: Dict[str, object] = {"frame_id": fid, "has": {k: p.exists() for k, p in ap.items()}}
+    mp = ap["metrics"]
+    if mp.exists():
+        import json
+        try:
+            with mp.open("r", encoding="utf-8") as fh: m = json.load(fh)
+            item["summary"] = {"labeled_fraction": m.get("totals", {}).get("labeled_fraction"), "flags": m.get("flags", {})}
+        except Exception:
+            pass
+    return item
+
+
+def list_frames_scan(cursor: Optional[str] = None, limit: Optional[int] = None, descending: bool = False,
+                     flags: Iterable[str] = (), has: Iterable[str] = ()):
+    """Directory scan fallback (index unavailable or still building); same paging and filters as the index."""
+    flags, has = list(flags), list(has)
+    ids = find_frame_ids()
+    if descending:
+        ids = [f for f in reversed(ids) if cursor is None or f < cursor]
+    else:
+        ids = [f for f in ids if cursor is None or f > cursor]
+    frames: List[Dict[str, object]] = []
+    for fid in ids:
+        item = _scan_item(fid)
+        if flags and not all((item.get("summary") or {}).get("flags", {}).get(f) for f in flags):
+            continue
+        if has and not all(item["has"].get(h) for h in has):
+            continue
+        if limit is not None and len(frames) == limit:
+            return {"frames": frames, "next_cursor": frames[-1]["frame_id"]}
         frames.append(item)
-    return {"frames": frames}
+    return {"frames": frames, "next_cursor": None}
+
+
+@app.get("/events")
+def frame_events(
+    request: Request,
+    stage: List[str] = Query([], description="Only these stages (converted, labeled, redacted, analytics)"),
+    last_event_id: Optional[int] = Query(None, description="Resume after this event id (EventSource sends Last-Event-ID)"),
+):
+    """Server-Sent Events: one compact ``stage`` event per frame and pipeline stage as it completes."""
+    if get_frame_index() is None or not REDIS_URL or not _HUB.stages:
+        raise HTTPException(status_code=503, detail="Live events need Redis and the pipeline streams")
+    header_id = request.headers.get("last-event-id", "")
+    last_id = last_event_id if last_event_id is not None else (int(header_id) if header_id.isdigit() else None)
+    return StreamingResponse(live.event_stream(_HUB, last_id, stage), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 def _redis_client():
@@ -107,69 +204,257 @@ def get_stream(stream_name: str, count: int = Query(50, ge=1, le=500)):
         raise HTTPException(status_code=500, detail=f"Redis error: {e}")
 
 
-def _serve_json(path: Path) -> JSONResponse:
-    if not path.exists(): raise HTTPException(status_code=404, detail="Not found")
-    import json
-    with path.open("r", encoding="utf-8") as fh: data = json.load(fh)
-    return JSONResponse(content=data)
+# Trace stamps accumulate downstream; the terminal streams hold the most complete copies
+TRACE_STREAMS = ("s_analytics_done", "s_redacted_done", "s_parts_labeled", "s_frames_converted")
+LATENCY_STAGES = ("s_analytics_done", "s_redacted_done")
+
 
+def _dec(v: Any) -> str:
+    return v.decode() if isinstance(v, (bytes, bytearray)) else v
+
+
+def _trace_client():
+    if tracing is None: raise HTTPException(status_code=503, detail="Tracing helpers unavailable")
+    r = _redis_client()
+    if r is None: raise HTTPException(status_code=503, detail="Redis not configured")
+    return r
+
+
+def _recent_traces(r, public_names, count: int) -> Dict[str, Dict[str, str]]:
+    """frame_id -> merged t_* fields from the last ``count`` entries of each stream."""
+    merged: Dict[str, Dict[str, str]] = {}
+    for public in public_names:
+        key = STREAMS.get(public)
+        if not key: continue
+        try: entries = r.xrevrange(key, max="+", min="-", count=count)  # type: ignore[attr-defined]
+        except Exception: continue
+        for _eid, data in entries:
+            fields = {_dec(k): _dec(v) for k, v in data.items()}
+            fid = fields.get("frame_id")
+            if not fid: continue
+            slot = merged.setdefault(fid, {})
+            for k, v in tracing.carry(fields).items(): slot.setdefault(k, v)
+    return merged
+
+
+@app.get("/frames/{frame_id}/timeline")
+def frame_timeline(frame_id: str, scan: int = Query(2000, ge=1, le=100000)):
+    """Per-stage receive/finish times for one frame, from the trace fields on its stream events."""
+    r = _trace_client()
+    trace = _recent_traces(r, TRACE_STREAMS, scan).get(frame_id)
+    if not trace: raise HTTPException(status_code=404, detail="No trace for frame")
+    return {"frame_id": frame_id, "stages": tracing.timeline(trace), "end_to_end": tracing.end_to_end(trace), "raw": trace}
+
+
+@app.get("/stats/latency")
+def latency_stats(window: int = Query(500, ge=1, le=10000), seconds: Optional[float] = Query(None, gt=0)):
+    """p50/p95/p99 per stage over the last ``window`` completed frames (optionally only the last ``seconds``)."""
+    r = _trace_client()
+    traces = list(_recent_traces(r, LATENCY_STAGES, window).values())
+    if seconds is not None:
+        cutoff = time.time() - seconds
+        traces = [t for t in traces if max((float(v) for k, v in t.items() if k.endswith("_done")), default=0.0) >= cutoff]
+    durations: Dict[str, List[float]] = {}; waits: Dict[str, List[float]] = {}; e2e: List[float] = []
+    for t in traces:
+        for st in tracing.timeline(t):
+            if st["duration"] is not None: durations.setdefault(st["stage"], []).append(st["duration"])  # type: ignore[arg-type]
+            if st["wait"] is not None: waits.setdefault(st["stage"], []).append(st["wait"])  # type: ignore[arg-type]
+        total = tracing.end_to_end(t)
+        if total is not None: e2e.append(total)
+    pct = lambda vals: {"count": len(vals), "p50": tracing.percentile(vals, 50), "p95": tracing.percentile(vals, 95), "p99": tracing.percentile(vals, 99)}
+    stages = {st: {"duration": pct(durations.get(st, [])), "wait": pct(waits.get(st, []))} for st in tracing.STAGES if st in durations or st in waits}
+    return {"frames": len(traces), "window": window, "seconds": seconds, "stages": stages, "end_to_end": pct(e2e)}
+
+
+# Rewritten in place: labeler outputs by part-labeler --overwrite, metrics by analytics
+# motion fill-ins and --backfill. These revalidate; the redactor never replaces a file.
+MUTABLE_KINDS = {"labels", "labels_colored", "preview_labels", "metrics"}
+
+
+def _cache_control(kind: str) -> str:
+    return http_cache.MUTABLE_CACHE_CONTROL if kind in MUTABLE_KINDS else http_cache.CACHE_CONTROL
+
+
+def _serve_json(request: Request, path: Path, cache_control: str = http_cache.CACHE_CONTROL) -> Response:
+    """Serve the JSON file's bytes as written (no parse/re-serialize round trip)."""
+    if not path.exists(): raise HTTPException(status_code=404, detail="Not found")
+    return http_cache.serve_file(request, path, "application/json", cache_control=cache_control)
 
 
+def _serve_artifact(request: Request, path: Path, media_type: str, detail: str = "Not found", cache_control: str = http_cache.CACHE_CONTROL) -> Response:
+    if not path.exists(): raise HTTPException(status_code=404, detail=detail)
+    return http_cache.serve_file(request, path, media_type, filename=path.name, cache_control=cache_control)
 
 
 @app.get("/frames/{frame_id}/labels.json")
-def get_labels(frame_id: str): return _serve_json(artifact_paths(frame_id)["labels"])
+def get_labels(frame_id: str, request: Request): return _serve_json(request, artifact_paths(frame_id)["labels"], _cache_control("labels"))
 
 
 @app.get("/frames/{frame_id}/metrics.json")
-def get_metrics(frame_id: str): return _serve_json(artifact_paths(frame_id)["metrics"])
+def get_metrics(frame_id: str, request: Request):
+    return _serve_json(request, artifact_paths(frame_id)["metrics"], _cache_control("metrics"))
 
 
 @app.get("/frames/{frame_id}/labels-colored.ply")
-def get_labels_colored(frame_id: str):
-    p = artifact_paths(frame_id)["labels_colored"]
-    if not p.exists(): raise HTTPException(status_code=404, detail="Not found")
-    return FileResponse(p.as_posix(), media_type="application/octet-stream", filename=p.name)
+def get_labels_colored(frame_id: str, request: Request):
+    return _serve_artifact(request, artifact_paths(frame_id)["labels_colored"], "application/octet-stream", cache_control=_cache_control("labels_colored"))
+
+
+DRACO_MEDIA = "application/x-draco"
+
+
+def _write_drc_as_ply(src: Path, dst: Path) -> None:
+    import numpy as np
+    cloud = DracoPy.decode(src.read_bytes())
+    points = np.asarray(cloud.points, dtype=np.float32).reshape(-1, 3)
+    colors = cloud.colors
+    colors = np.asarray(colors, dtype=np.uint8).reshape(points.shape[0], -1)[:, :3] if colors is not None else np.full((points.shape[0], 3), ply_io.DEFAULT_COLOR, np.uint8)
+    with dst.open("wb") as fh:
+        ply_io.write_binary_ply(fh, points, colors)
+
+
+def _drc_as_ply(request: Request, path: Path) -> Response:
+    """Decode a redactor .drc into a binary PLY for clients without a Draco decoder (cached per version, so Range works)."""
+    if DracoPy is None: raise HTTPException(status_code=406, detail="Only Draco output is available for this frame")
+    st = path.stat()
+    headers = http_cache.validator_headers(st, variant="-ply")
+    if http_cache.is_not_modified(request, headers["ETag"], st.st_mtime): return http_cache.not_modified(headers)
+    ply = http_cache.derived_copy(path, st, http_cache.DERIVED_CACHE_DIR, ".ply", _write_drc_as_ply)
+    if ply is None: raise HTTPException(status_code=503, detail="Decoded PLY could not be cached")
+    return http_cache.serve_file(request, ply, "application/octet-stream", filename=path.with_suffix(".ply").name, source=st, variant="-ply")
+
+
+def _serve_anonymized(request: Request, frame_id: str, fmt: str) -> Response:
+    """Serve the redacted cloud as ``ply`` or ``drc``, using whichever file the redactor wrote."""
+    paths = artifact_paths(frame_id)
+    ply, drc = paths["anonymized"], paths["anonymized_drc"]
+    if fmt == "drc":
+        if drc.exists(): return http_cache.serve_file(request, drc, DRACO_MEDIA, filename=drc.name)
+        if ply.exists(): raise HTTPException(status_code=406, detail="Only PLY output is available for this frame")
+    else:
+        if ply.exists(): return http_cache.serve_file(request, ply, "application/octet-stream", filename=ply.name)
+        if drc.exists(): return _drc_as_ply(request, drc)
+    raise HTTPException(status_code=404, detail="Not found")
 
 
 @app.get("/frames/{frame_id}/anonymized.ply")
-def get_anonymized(frame_id: str):
-    p = artifact_paths(frame_id)["anonymized"]
-    if not p.exists(): raise HTTPException(status_code=404, detail="Not found")
-    return FileResponse(p.as_posix(), media_type="application/octet-stream", filename=p.name)
+def get_anonymized(frame_id: str, request: Request): return _serve_anonymized(request, frame_id, "ply")
+
+
+@app.get("/frames/{frame_id}/anonymized.drc")
+def get_anonymized_drc(frame_id: str, request: Request): return _serve_anonymized(request, frame_id, "drc")
+
+
+@app.get("/frames/{frame_id}/anonymized")
+def get_anonymized_negotiated(frame_id: str, request: Request, format: Optional[str] = Query(None, enum=["ply", "drc"])):
+    """``?format=`` wins; otherwise Draco when the client accepts it and the frame has it, else PLY."""
+    fmt = format
+    if fmt is None:
+        wants_drc = DRACO_MEDIA in request.headers.get("accept", "")
+        fmt = "drc" if wants_drc and artifact_paths(frame_id)["anonymized_drc"].exists() else "ply"
+    resp = _serve_anonymized(request, frame_id, fmt)
+    resp.headers["Vary"] = "Accept, Accept-Encoding"
+    return resp
+
+
+LOD_KINDS = {"anonymized": ("anonymized", "anonymized_drc"), "labels-colored": ("labels_colored",)}
+
+
+def _lod_buffer(frame_id: str, kind: str):
+    """(source artifact stat, cached LOD buffer, Cache-Control) for ``kind``; built on first use per artifact version."""
+    if lod is None: raise HTTPException(status_code=501, detail="LOD buffers need numpy")
+    paths = artifact_paths(frame_id)
+    src = next((paths[k] for k in LOD_KINDS[kind] if paths[k].exists()), None)
+    if src is None: raise HTTPException(status_code=404, detail="Not found")
+    if src.suffix == ".drc" and lod.DracoPy is None: raise HTTPException(status_code=406, detail="Only Draco output is available for this frame")
+    st = src.stat()
+    buf = http_cache.derived_copy(src, st, http_cache.DERIVED_CACHE_DIR, ".lod", lod.build_lod)
+    if buf is None: raise HTTPException(status_code=503, detail="LOD buffer could not be cached")
+    return st, buf, _cache_control(LOD_KINDS[kind][0])
+
+
+@app.get("/frames/{frame_id}/lod.json")
+def get_lod_info(frame_id: str, request: Request, kind: str = Query("anonymized", enum=list(LOD_KINDS))):
+    """Header of the LOD buffer plus suggested prefix sizes and their byte ranges."""
+    st, buf, cache_control = _lod_buffer(frame_id, kind)
+    headers = http_cache.validator_headers(st, cache_control, variant="-lodinfo")
+    if http_cache.is_not_modified(request, headers["ETag"], st.st_mtime): return http_cache.not_modified(headers)
+    info = lod.read_header(buf)
+    info["levels"] = [{"points": n, "range": f"bytes=0-{lod.prefix_bytes(n) - 1}"} for n in lod.levels(info["points"])]
+    info["url"] = f"/frames/{frame_id}/lod?kind={kind}"
+    return JSONResponse(info, headers=headers)
+
+
+@app.get("/frames/{frame_id}/lod")
+def get_lod(frame_id: str, request: Request, kind: str = Query("anonymized", enum=list(LOD_KINDS)), points: Optional[int] = Query(None, ge=0)):
+    """Shuffled point buffer (see lod.py); ``points`` or a Range request picks a prefix, i.e. a uniform subsample."""
+    st, buf, cache_control = _lod_buffer(frame_id, kind)
+    if points is None:
+        return http_cache.serve_file(request, buf, lod.MEDIA_TYPE, cache_control=cache_control, source=st, variant="-lod")
+    points = min(points, lod.read_header(buf)["points"])
+    headers = http_cache.validator_headers(st, cache_control, variant=f"-lod{points}")
+    headers["Vary"] = "Accept-Encoding"
+    if http_cache.is_not_modified(request, headers["ETag"], st.st_mtime): return http_cache.not_modified(headers)
+    return http_cache.serve_prefix(buf, lod.prefix_bytes(points), lod.MEDIA_TYPE, headers)
+
+
+EXPORT_DEFAULT_KINDS = ["labels", "metrics", "anonymized", "anonymized_drc"]
+
+
+def _export_entries(frame_ids: List[str], kinds: List[str]):
+    """Artifacts present right now, one frame at a time (the archive is built while it streams)."""
+    for fid in frame_ids:
+        paths = artifact_paths(fid)
+        for kind in kinds:
+            p = paths[kind]
+            if p.exists():
+                yield p.relative_to(SEGMENTS_DIR).as_posix(), p, {"frame_id": fid, "kind": kind}
+
+
+@app.get("/export")
+def export_frames(
+    start: Optional[str] = Query(None, description="First frame_id (inclusive)"),
+    end: Optional[str] = Query(None, description="Last frame_id (inclusive)"),
+    kind: List[str] = Query(EXPORT_DEFAULT_KINDS, description="Artifact keys to include (labels, metrics, labels_colored, anonymized, anonymized_drc, preview, ...)"),
+    format: str = Query("tar", enum=list(export.FORMATS)),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Stream a tar/zip of the selected artifacts for a frame-id range, with ``manifest.json`` (sizes, SHA-256) last."""
+    unknown = sorted(set(kind) - set(artifact_paths("").keys()))
+    if unknown: raise HTTPException(status_code=400, detail=f"Unknown artifact kind(s): {', '.join(unknown)}")
+    index = get_frame_index()
+    ids = [it["frame_id"] for it in index.page()[0]] if index is not None and index.ready.wait(30) else find_frame_ids()
+    ids = [f for f in ids if (start is None or f >= start) and (end is None or f <= end)][:limit]
+    if not ids: raise HTTPException(status_code=404, detail="No frames in range")
+    info = {"start": ids[0], "end": ids[-1], "frames": len(ids), "kinds": kind}
+    stream = export.tar_stream if format == "tar" else export.zip_stream
+    name = f"export-{ids[0]}-{ids[-1]}.{format}"
+    return StreamingResponse(stream(_export_entries(ids, kind), info), media_type=export.FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{name}"', "Cache-Control": "no-store"})
 
 
 @app.get("/frames/{frame_id}/preview.png")
-def get_preview(frame_id: str):
-    p = artifact_paths(frame_id)["preview"]
-    if not p.exists(): raise HTTPException(status_code=404, detail="Preview not found")
-    return FileResponse(p.as_posix(), media_type="image/png", filename=p.name)
+def get_preview(frame_id: str, request: Request):
+    return _serve_artifact(request, artifact_paths(frame_id)["preview"], "image/png", "Preview not found")
 
 @app.get("/frames/{frame_id}/preview-anonymized.png")
-def get_preview_anonymized(frame_id: str):
-    out = artifact_paths(frame_id)["preview_anonymized"]
-    if not out.exists(): raise HTTPException(status_code=404, detail="Preview anonymized not found")
-    return FileResponse(out.as_posix(), media_type="image/png", filename=out.name)
+def get_preview_anonymized(frame_id: str, request: Request):
+    return _serve_artifact(request, artifact_paths(frame_id)["preview_anonymized"], "image/png", "Preview anonymized not found")
 
 @app.get("/frames/{frame_id}/preview-labels-colored.png")
-def get_preview_labels_colored(frame_id: str):
-    out = artifact_paths(frame_id)["preview_labels"]
-    if not out.exists(): raise HTTPException(status_code=404, detail="Preview labels-colored not found")
-    return FileResponse(out.as_posix(), media_type="image/png", filename=out.name)
+def get_preview_labels_colored(frame_id: str, request: Request):
+    return _serve_artifact(request, artifact_paths(frame_id)["preview_labels"], "image/png", "Preview labels-colored not found", _cache_control("preview_labels"))
 
 @app.get("/frames/{frame_id}/choose")
-def choose_view(frame_id: str, kind: str = Query("metrics", enum=["metrics","labels","preview","anonymized","labels-colored"])):
+def choose_view(frame_id: str, request: Request, kind: str = Query("metrics", enum=["metrics","labels","preview","anonymized","labels-colored"])):
     paths = artifact_paths(frame_id)
     # Map kind to path
     if kind == "labels-colored": p = paths["labels_colored"]
-    elif kind == "anonymized": p = paths["anonymized"]
+    elif kind == "anonymized": return get_anonymized(frame_id, request)
     elif kind == "preview": p = paths["preview"]
-    elif kind == "labels": return get_labels(frame_id)
-    else: return get_metrics(frame_id)
-    if not p.exists(): raise HTTPException(status_code=404, detail="Not found")
+    elif kind == "labels": return get_labels(frame_id, request)
+    else: return get_metrics(frame_id, request)
     media = "application/octet-stream"
     if p.suffix.lower() == ".png": media = "image/png"
     elif p.suffix.lower() == ".ply": media = "application/octet-stream"
-    return FileResponse(p.as_posix(), media_type=media, filename=p.name)
-
-
+    return _serve_artifact(request, p, media, cache_control=_cache_control(kind.replace("-", "_")))
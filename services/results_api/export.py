@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Streaming tar/zip archives of frame artifacts for ``GET /export``.
+
+Archives are produced while the response is sent: no temporary files and
+only one read chunk (``EXPORT_CHUNK_BYTES``) per file in memory.
+
+- tar: headers are written by hand (`tarfile.TarInfo.tobuf`, PAX for long
+  names) ahead of each file's bytes, so nothing is buffered per member
+- zip: `zipfile` on an unseekable sink (data descriptors, zip64 when needed);
+  JSON is deflated, clouds and images are stored
+
+Each file is hashed (SHA-256) as it is streamed. ``manifest.json`` is the last
+member and lists path, frame, kind, size and hash of every file, plus the
+selected artifacts that were missing. Files are opened (and sized with
+``fstat``) only when their turn comes. Artifacts are replaced by atomic
+renames, so a file rewritten during the export is still read as one version.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+EXPORT_CHUNK_BYTES = int(os.environ.get("EXPORT_CHUNK_BYTES", str(1024 * 1024)))
+FORMATS = {"tar": "application/x-tar", "zip": "application/zip"}
+
+# (arcname, path, manifest fields such as frame_id / kind)
+Entry = Tuple[str, Path, Dict[str, str]]
+
+
+def _read_chunks(fh, digest, limit: Optional[int] = None) -> Iterator[bytes]:
+    """File contents in chunks (at most ``limit`` bytes), hashed on the way."""
+    while limit is None or limit > 0:
+        chunk = fh.read(EXPORT_CHUNK_BYTES if limit is None else min(EXPORT_CHUNK_BYTES, limit))
+        if not chunk:
+            return
+        if limit is not None:
+            limit -= len(chunk)
+        digest.update(chunk)
+        yield chunk
+
+
+def _open(path: Path) -> Optional[Tuple[object, os.stat_result]]:
+    try:
+        fh = path.open("rb")
+    except FileNotFoundError:  # removed since the selection was made
+        return None
+    return fh, os.fstat(fh.fileno())
+
+
+def _manifest(files: List[Dict], missing: List[Dict], info: Dict) -> bytes:
+    doc = dict(info, created=time.time(), files=files, missing=missing,
+               total_bytes=sum(f["size"] for f in files))
+    return json.dumps(doc, indent=1).encode("utf-8")
+
+
+def _tar_header(name: str, size: int, mtime: float) -> bytes:
+    ti = tarfile.TarInfo(name)
+    ti.size, ti.mtime, ti.mode = size, int(mtime), 0o644
+    return ti.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def _tar_pad(size: int) -> bytes:
+    return b"\0" * (-size % tarfile.BLOCKSIZE)
+
+
+def tar_stream(entries: Iterable[Entry], info: Dict) -> Iterator[bytes]:
+    files: List[Dict] = []
+    missing: List[Dict] = []
+    for arcname, path, meta in entries:
+        opened = _open(path)
+        if opened is None:
+            missing.append(dict(meta, path=arcname))
+            continue
+        fh, st = opened
+        digest = hashlib.sha256()
+        with fh:  # type: ignore[attr-defined]
+            yield _tar_header(arcname, st.st_size, st.st_mtime)
+            sent = 0
+            for chunk in _read_chunks(fh, digest, st.st_size):  # the header already promised st_size bytes
+                sent += len(chunk)
+                yield chunk
+        if sent < st.st_size:  # truncated in place mid-export; keep the archive readable, the hash tells
+            yield b"\0" * (st.st_size - sent)
+        yield _tar_pad(st.st_size)
+        files.append(dict(meta, path=arcname, size=sent, sha256=digest.hexdigest(), mtime=st.st_mtime))
+    body = _manifest(files, missing, info)
+    yield _tar_header("manifest.json", len(body), time.time()) + body + _tar_pad(len(body))
+    yield b"\0" * (2 * tarfile.BLOCKSIZE)  # end-of-archive marker
+
+
+class _Sink:
+    """Write-only file object whose contents are drained after every write."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out, self._parts = b"".join(self._parts), []
+        return out
+
+
+def zip_stream(entries: Iterable[Entry], info: Dict) -> Iterator[bytes]:
+    files: List[Dict] = []
+    missing: List[Dict] = []
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:  # type: ignore[arg-type]
+        for arcname, path, meta in entries:
+            opened = _open(path)
+            if opened is None:
+                missing.append(dict(meta, path=arcname))
+                continue
+            fh, st = opened
+            zi = zipfile.ZipInfo(arcname, time.localtime(st.st_mtime)[:6])
+            zi.compress_type = zipfile.ZIP_DEFLATED if arcname.endswith(".json") else zipfile.ZIP_STORED
+            zi.file_size = st.st_size
+            digest = hashlib.sha256()
+            size = 0
+            with fh, zf.open(zi, "w", force_zip64=st.st_size >= zipfile.ZIP64_LIMIT) as dst:  # type: ignore[attr-defined]
+                for chunk in _read_chunks(fh, digest):
+                    dst.write(chunk)
+                    size += len(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+            files.append(dict(meta, path=arcname, size=size, sha256=digest.hexdigest(), mtime=st.st_mtime))
+        zf.writestr("manifest.json", _manifest(files, missing, info), compress_type=zipfile.ZIP_DEFLATED)
+    yield sink.drain()
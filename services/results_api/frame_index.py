@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""In-memory frame index for ``GET /frames``.
+
+Listing frames used to glob ``SEGMENTS_DIR``, stat seven artifact paths per
+frame and parse every ``metrics-*.json`` on each request. The index does that
+work once:
+
+- `FrameIndex.rebuild` – one ``os.scandir`` of the segments directory (and its
+  ``labels/`` subdirectory) at startup; metrics summaries are parsed once
+- `FrameIndex.refresh` – re-stat one frame's artifacts (and re-read its metrics
+  summary) when a pipeline event names it
+- `tail_events` – plain XREAD (no consumer group, nothing to ack) over
+  ``s_parts_labeled``, ``s_redacted_done`` and ``s_analytics_done`` that calls
+  ``refresh`` for each event; it starts from the stream tails captured
+  before the rebuild so no event between scan and tail is missed
+
+Without Redis the index is rebuilt every ``rescan_s`` seconds instead. With
+Redis it is still rebuilt every ``tail_rescan_s`` seconds, because not every
+writer publishes (analytics backfills, part-labeler batch runs). If the
+tails cannot be read, tailing starts at ``$`` (new events only, never a replay
+of the stream history) and a rebuild follows shortly to cover the gap. The
+same reader can tail further streams for an ``on_event`` listener (the
+``/events`` hub in `live`), so results_api holds one XREAD in total.
+`FrameIndex.page` serves sorted frame ids with an opaque cursor (the last
+frame id of the previous page) and optional flag/artifact filters.
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LOGGER = logging.getLogger("frame-index")
+
+# artifact key -> (subdirectory, file prefix, suffix); mirrors app.artifact_paths
+ARTIFACTS: Dict[str, Tuple[str, str, str]] = {
+    "labels": ("", "labels-", ".json"),
+    "metrics": ("", "metrics-", ".json"),
+    "labels_colored": ("labels", "labels-colored-", ".ply"),
+    "anonymized": ("", "anonymized-", ".ply"),
+    "anonymized_drc": ("", "anonymized-", ".drc"),
+    "preview": ("", "preview-", ".png"),
+    "preview_anonymized": ("", "preview-anonymized-", ".png"),
+    "preview_labels": ("", "preview-labels-colored-", ".png"),
+}
+# Longest prefixes first so "preview-anonymized-" wins over "preview-"
+_MATCH_ORDER = sorted(ARTIFACTS.items(), key=lambda kv: -len(kv[1][1]))
+# Frames are listed once they have labels or metrics (as before)
+_LISTED = ("labels", "metrics")
+
+
+def metrics_summary(path: Path) -> Optional[Dict]:
+    try:
+        with path.open("r", encoding="utf-8") as fh:
+            m = json.load(fh)
+        return {"labeled_fraction": m.get("totals", {}).get("labeled_fraction"), "flags": m.get("flags", {})}
+    except Exception:
+        return None
+
+
+class FrameIndex:
+    """frame_id -> {"has": {...}, "summary": {...}} plus a sorted id list."""
+
+    def __init__(self, segments_dir: Path) -> None:
+        self.dir = segments_dir
+        self._frames: Dict[str, Dict] = {}
+        self._order: List[str] = []
+        self._lock = threading.Lock()
+        self.ready = threading.Event()
+        self.built_at = 0.0
+        self._dirty: Optional[set] = None  # frames refreshed while a rebuild is scanning
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def _path(self, key: str, frame_id: str) -> Path:
+        sub, prefix, suffix = ARTIFACTS[key]
+        return (self.dir / sub if sub else self.dir) / f"{prefix}{frame_id}{suffix}"
+
+    def _classify(self, sub: str, name: str) -> Optional[Tuple[str, str]]:
+        for key, (ksub, prefix, suffix) in _MATCH_ORDER:
+            if ksub == sub and name.startswith(prefix) and name.endswith(suffix):
+                return key, name[len(prefix): len(name) - len(suffix)]
+        return None
+
+    def rebuild(self) -> None:
+        t0 = time.perf_counter()
+        with self._lock:
+            self._dirty = set()
+        has: Dict[str, Dict[str, bool]] = {}
+        for sub in ("", "labels"):
+            try:
+                it = os.scandir(self.dir / sub if sub else self.dir)
+            except FileNotFoundError:
+                continue
+            with it:
+                for entry in it:
+                    hit = self._classify(sub, entry.name)
+                    if hit:
+                        has.setdefault(hit[1], {})[hit[0]] = True
+        frames: Dict[str, Dict] = {}
+        for fid, flags in has.items():
+            if not any(flags.get(k) for k in _LISTED):
+                continue
+            item: Dict[str, object] = {"frame_id": fid, "has": {k: bool(flags.get(k)) for k in ARTIFACTS}}
+            if flags.get("metrics"):
+                summary = metrics_summary(self._path("metrics", fid))
+                if summary is not None:
+                    item["summary"] = summary
+            frames[fid] = item
+        with self._lock:
+            self._frames = frames
+            self._order = sorted(frames)
+            dirty, self._dirty = self._dirty or set(), None
+        for fid in dirty:  # the scan may predate these events
+            self.refresh(fid)
+        self.built_at = time.time()
+        self.ready.set()
+        LOGGER.info("frame index: %d frames from %s in %.2fs", len(frames), self.dir, time.perf_counter() - t0)
+
+    def refresh(self, frame_id: str) -> None:
+        """Re-stat one frame's artifacts (after an event about it)."""
+        item: Dict[str, object] = {"frame_id": frame_id, "has": {k: self._path(k, frame_id).exists() for k in ARTIFACTS}}
+        if item["has"]["metrics"]:  # type: ignore[index]
+            summary = metrics_summary(self._path("metrics", frame_id))
+            if summary is not None:
+                item["summary"] = summary
+        listed = any(item["has"][k] for k in _LISTED)  # type: ignore[index]
+        with self._lock:
+            if self._dirty is not None:
+                self._dirty.add(frame_id)
+            known = frame_id in self._frames
+            if listed:
+                self._frames[frame_id] = item
+                if not known:
+                    bisect.insort(self._order, frame_id)
+            elif known:
+                del self._frames[frame_id]
+                self._order.remove(frame_id)
+
+    def page(self, cursor: Optional[str] = None, limit: Optional[int] = None, descending: bool = False,
+             flags: Iterable[str] = (), has: Iterable[str] = ()) -> Tuple[List[Dict], Optional[str]]:
+        """Frames after ``cursor`` in id order that pass the filters; (items, next cursor or None)."""
+        flags, has = list(flags), list(has)
+        with self._lock:
+            order, frames = self._order, self._frames
+            if descending:
+                i = bisect.bisect_left(order, cursor) if cursor is not None else len(order)
+                ids = (order[j] for j in range(i - 1, -1, -1))
+            else:
+                i = bisect.bisect_right(order, cursor) if cursor is not None else 0
+                ids = (order[j] for j in range(i, len(order)))
+            out: List[Dict] = []
+            for fid in ids:
+                item = frames[fid]
+                if flags and not all((item.get("summary") or {}).get("flags", {}).get(f) for f in flags):
+                    continue
+                if has and not all(item["has"].get(h) for h in has):
+                    continue
+                if limit is not None and len(out) == limit:
+                    return out, out[-1]["frame_id"]
+                out.append(item)
+        return out, None
+
+
+def _dec(v) -> str:
+    return v.decode() if isinstance(v, (bytes, bytearray)) else v
+
+
+def stream_tails(r, keys: Iterable[str]) -> Dict[str, str]:
+    """Last entry id of each stream ("0-0" when empty, "$" when unreadable so history is never replayed)."""
+    out: Dict[str, str] = {}
+    for key in keys:
+        try:
+            last = r.xrevrange(key, max="+", min="-", count=1)
+            out[key] = _dec(last[0][0]) if last else "0-0"
+        except Exception as e:
+            LOGGER.warning("frame index: no tail for %s (%s); following new events only", key, e)
+            out[key] = "$"
+    return out
+
+
+def tail_events(r, last_ids: Dict[str, str], on_event: Callable[[str, Dict[str, str]], None], stop: threading.Event, block_ms: int = 5000) -> None:
+    """XREAD ``last_ids`` streams until ``stop``; calls ``on_event(stream_key, fields)``."""
+    ids = dict(last_ids)
+    while not stop.is_set():
+        try:
+            resp = r.xread(ids, block=block_ms, count=500)
+        except Exception as e:
+            LOGGER.warning("frame index: xread failed (%s); retrying", e)
+            stop.wait(1.0)
+            continue
+        for stream, entries in resp or []:
+            stream = _dec(stream)
+            for eid, data in entries:
+                ids[stream] = _dec(eid)
+                try:
+                    on_event(stream, {_dec(k): _dec(v) for k, v in data.items()})
+                except Exception:
+                    LOGGER.exception("frame index: event %s on %s failed", _dec(eid), stream)
+
+
+def start(index: FrameIndex, r, stream_keys: Iterable[str], rescan_s: float = 60.0, extra_keys: Iterable[str] = (),
+          on_event: Optional[Callable[[str, Dict[str, str]], None]] = None, tail_rescan_s: float = 600.0) -> threading.Event:
+    """Build ``index`` and keep it current on daemon threads; set the returned event to stop.
+
+    ``on_event`` sees every event of ``stream_keys`` and ``extra_keys``, after
+    the index has been refreshed for it. While tailing, the index is still
+    rebuilt every ``tail_rescan_s`` seconds (0 disables).
+    """
+    stop = threading.Event()
+    index_keys = {k for k in stream_keys if k}
+    keys = sorted(index_keys | {k for k in extra_keys if k})
+
+    def _event(stream: str, fields: Dict[str, str]) -> None:
+        if stream in index_keys and fields.get("frame_id"):
+            index.refresh(fields["frame_id"])
+        if on_event is not None:
+            on_event(stream, fields)
+
+    def _rescan(first_s: float, every_s: float) -> None:
+        if not stop.wait(first_s):
+            index.rebuild()
+            while every_s > 0 and not stop.wait(every_s):
+                index.rebuild()
+
+    def _run() -> None:
+        tails = stream_tails(r, keys) if (r is not None and keys) else {}
+        index.rebuild()
+        if not tails:
+            if rescan_s > 0:
+                _rescan(rescan_s, rescan_s)
+            return
+        fell_back = "$" in tails.values()
+        if fell_back or tail_rescan_s > 0:
+            # "$" only counts from the first XREAD: rescan soon after it to cover the gap
+            first = 5.0 if fell_back else tail_rescan_s
+            threading.Thread(target=_rescan, args=(first, tail_rescan_s), name="frame-index-rescan", daemon=True).start()
+        tail_events(r, tails, _event, stop)
+
+    threading.Thread(target=_run, name="frame-index", daemon=True).start()
+    return stop
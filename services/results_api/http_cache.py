@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Validators, conditional requests and gzip for results_api artifacts.
+
+Artifacts are written once (atomically) and then only read, so every file
+response carries:
+
+- ``ETag`` (from mtime + size, suffixed ``-gz`` for the compressed
+  representation) and ``Last-Modified``
+- ``Cache-Control`` (``ARTIFACT_CACHE_CONTROL``, default one day, public so
+  proxies may cache too; documents that can be rewritten in place, such as
+  metrics after a motion fill-in or a backfill, get a short max-age instead)
+- ``304 Not Modified`` for a matching ``If-None-Match`` (or, without it, an
+  ``If-Modified-Since`` at or after the file's mtime)
+
+JSON and ASCII PLY are gzip-encoded for clients that accept it. The
+compressed copy is made once per file version under ``GZIP_CACHE_DIR`` and
+then served like any other file; range requests always get the identity
+representation. Files up to ``GZIP_INLINE_BYTES`` are compressed inside the
+request; larger ones are compressed on a background thread (``GZIP_WORKERS``)
+and served uncompressed until their copy is ready, so no request waits on a
+big compression. Other derived files (PLY decoded from Draco, LOD buffers)
+are cached the same way under ``DERIVED_CACHE_DIR`` via `derived_copy` and
+keep the validators of the artifact they were made from, so ``Range`` and
+``If-Range`` work on them too.
+
+Both cache directories are LRU-bounded by total size
+(``GZIP_CACHE_MAX_BYTES``, ``DERIVED_CACHE_MAX_BYTES``; 0 = unbounded): a
+hit refreshes the entry's mtime, and adding an entry evicts the least
+recently used ones beyond the limit.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Set
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+LOGGER = logging.getLogger("results-api.cache")
+
+CACHE_CONTROL = os.environ.get("ARTIFACT_CACHE_CONTROL", "public, max-age=86400")
+MUTABLE_CACHE_CONTROL = os.environ.get("ARTIFACT_MUTABLE_CACHE_CONTROL", "public, max-age=60, must-revalidate")
+GZIP_CACHE_DIR = Path(os.environ.get("GZIP_CACHE_DIR", "/tmp/results-api-gzip"))
+GZIP_MIN_BYTES = int(os.environ.get("GZIP_MIN_BYTES", "1024"))
+DERIVED_CACHE_DIR = Path(os.environ.get("DERIVED_CACHE_DIR", "/tmp/results-api-derived"))
+GZIP_CACHE_MAX_BYTES = int(os.environ.get("GZIP_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+DERIVED_CACHE_MAX_BYTES = int(os.environ.get("DERIVED_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+GZIP_INLINE_BYTES = int(os.environ.get("GZIP_INLINE_BYTES", str(1024 * 1024)))
+GZIP_WORKERS = int(os.environ.get("GZIP_WORKERS", "1"))
+STREAM_CHUNK_BYTES = int(os.environ.get("STREAM_CHUNK_BYTES", str(1024 * 1024)))
+
+_EVICT_LOCK = threading.Lock()
+_GZIP_LOCK = threading.Lock()
+_GZIP_PENDING: Set[Path] = set()
+_GZIP_POOL: Optional[ThreadPoolExecutor] = None
+
+
+def etag_for(st: os.stat_result, variant: str = "") -> str:
+    tag = hashlib.md5(f"{st.st_mtime_ns}-{st.st_size}".encode(), usedforsecurity=False).hexdigest()[:20]
+    return f'"{tag}{variant}"'
+
+
+def validator_headers(st: os.stat_result, cache_control: str = CACHE_CONTROL, variant: str = "") -> Dict[str, str]:
+    return {"ETag": etag_for(st, variant), "Last-Modified": formatdate(st.st_mtime, usegmt=True), "Cache-Control": cache_control}
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        if inm.strip() == "*":
+            return True
+        # Weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored
+        tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+        return etag in tags
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def _accepts_gzip(request: Request) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, q = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return q.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _compressible(path: Path, st: os.stat_result) -> bool:
+    if st.st_size < GZIP_MIN_BYTES:
+        return False
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        return True
+    if suffix == ".ply":
+        with path.open("rb") as fh:
+            return b"format ascii" in fh.read(64)
+    return False
+
+
+def _entry(path: Path, st: os.stat_result, cache_dir: Path, suffix: str) -> Path:
+    return cache_dir / f"{path.name}.{etag_for(st).strip(chr(34))}{suffix}"
+
+
+def cached_copy(path: Path, st: os.stat_result, cache_dir: Path, suffix: str) -> Optional[Path]:
+    """The cached derived file for this version of ``path`` (marked as just used), or None."""
+    out = _entry(path, st, cache_dir, suffix)
+    try:
+        os.utime(out)
+    except OSError:
+        return None
+    return out
+
+
+def _evict(cache_dir: Path, max_bytes: int, keep: Path) -> None:
+    """Unlink least recently used entries until ``cache_dir`` holds at most ``max_bytes``."""
+    if max_bytes <= 0:
+        return
+    with _EVICT_LOCK:
+        entries = []
+        for p in cache_dir.iterdir():
+            if p.name.endswith(".tmp"):
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= max_bytes:
+                break
+            if p != keep:
+                p.unlink(missing_ok=True)
+                total -= size
+                LOGGER.debug("derived cache: evicted %s (%d bytes)", p.name, size)
+
+
+def derived_copy(path: Path, st: os.stat_result, cache_dir: Path, suffix: str, build: Callable[[Path, Path], None],
+                 max_bytes: int = DERIVED_CACHE_MAX_BYTES) -> Optional[Path]:
+    """``build(path, tmp)`` output for this version of ``path``, made on first use and kept in ``cache_dir`` (LRU, ``max_bytes``)."""
+    out = cached_copy(path, st, cache_dir, suffix)
+    if out is not None:
+        return out
+    out = _entry(path, st, cache_dir, suffix)
+    tmp = out.with_name(f"{out.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        build(path, tmp)
+        tmp.replace(out)
+    except OSError as e:
+        LOGGER.warning("derived cache: %s%s not written (%s)", path.name, suffix, e)
+        return None
+    finally:
+        tmp.unlink(missing_ok=True)
+    for stale in cache_dir.glob(f"{path.name}.*{suffix}"):  # older versions of the same artifact
+        if stale != out and not stale.name.endswith(".tmp"):
+            stale.unlink(missing_ok=True)
+    _evict(cache_dir, max_bytes, out)
+    return out
+
+
+def _gzip(src: Path, dst: Path) -> None:
+    with src.open("rb") as fin, gzip.open(dst, "wb", compresslevel=6) as fout:
+        shutil.copyfileobj(fin, fout, 1024 * 1024)
+
+
+def _gzip_later(path: Path, st: os.stat_result) -> None:
+    """Queue the gzip copy of this version of ``path`` (once, however many requests ask)."""
+    global _GZIP_POOL
+    key = _entry(path, st, GZIP_CACHE_DIR, ".gz")
+    with _GZIP_LOCK:
+        if key in _GZIP_PENDING:
+            return
+        _GZIP_PENDING.add(key)
+        if _GZIP_POOL is None:
+            _GZIP_POOL = ThreadPoolExecutor(max_workers=max(1, GZIP_WORKERS), thread_name_prefix="gzip")
+
+    def run() -> None:
+        try:
+            derived_copy(path, st, GZIP_CACHE_DIR, ".gz", _gzip, GZIP_CACHE_MAX_BYTES)
+        except Exception:
+            LOGGER.exception("gzip cache: compressing %s failed", path.name)
+        finally:
+            with _GZIP_LOCK:
+                _GZIP_PENDING.discard(key)
+
+    _GZIP_POOL.submit(run)
+
+
+def serve_file(request: Request, path: Path, media_type: str, filename: Optional[str] = None,
+               cache_control: str = CACHE_CONTROL, disposition: str = "attachment",
+               source: Optional[os.stat_result] = None, variant: str = "") -> Response:
+    """FileResponse with validators, 304 handling and optional gzip (caller checks existence).
+
+    For a derived file pass the ``source`` artifact's stat and a ``variant`` so
+    the validators follow the artifact rather than the cache entry.
+    """
+    st = path.stat()
+    gz = None
+    if "range" not in request.headers and _accepts_gzip(request) and _compressible(path, st):
+        gz = cached_copy(path, st, GZIP_CACHE_DIR, ".gz")
+        if gz is None and st.st_size > GZIP_INLINE_BYTES:
+            _gzip_later(path, st)  # identity now, gzip once the copy exists
+        elif gz is None:
+            gz = derived_copy(path, st, GZIP_CACHE_DIR, ".gz", _gzip, GZIP_CACHE_MAX_BYTES)
+    base = source or st
+    headers = validator_headers(base, cache_control, variant + ("-gz" if gz is not None else ""))
+    headers["Vary"] = "Accept-Encoding"
+    if is_not_modified(request, headers["ETag"], base.st_mtime):
+        return not_modified(headers)
+    if gz is not None:
+        headers["Content-Encoding"] = "gzip"
+        return FileResponse(gz.as_posix(), media_type=media_type, filename=filename, headers=headers, content_disposition_type=disposition)
+    return FileResponse(path.as_posix(), media_type=media_type, filename=filename, headers=headers, content_disposition_type=disposition)
+
+
+def _read_prefix(fh, length: int) -> Iterator[bytes]:
+    try:
+        while length > 0:
+            chunk = fh.read(min(STREAM_CHUNK_BYTES, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def serve_prefix(path: Path, length: int, media_type: str, headers: Dict[str, str]) -> Response:
+    """First ``length`` bytes of ``path`` (clamped to its size), streamed in ``STREAM_CHUNK_BYTES`` reads.
+
+    The file is opened here so a cache eviction after the response starts
+    cannot cut it short.
+    """
+    fh = path.open("rb")
+    length = max(0, min(length, os.fstat(fh.fileno()).st_size))
+    return StreamingResponse(_read_prefix(fh, length), media_type=media_type, headers={**headers, "Content-Length": str(length)})
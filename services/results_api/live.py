@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Live per-frame stage events for ``GET /events`` (Server-Sent Events).
+
+One reader serves every subscriber: the frame index thread already tails the
+pipeline streams with a blocking XREAD (`frame_index.tail_events`), and
+`EventHub.publish` is its listener, called after the index has been
+refreshed. Each event is reduced to a compact document::
+
+    {"frame_id": "00042", "stage": "redacted", "t": 1760000000.12}
+
+(plus ``sequence_id`` when the event carries one) and fanned out to
+subscriber queues on their own event loops. A slow subscriber drops its
+oldest events instead of holding up the reader. The last ``EVENTS_REPLAY``
+events are kept so a reconnecting EventSource resumes from ``Last-Event-ID``.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+import os
+import threading
+import time
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+EVENTS_REPLAY = int(os.environ.get("EVENTS_REPLAY", "1024"))
+EVENTS_QUEUE = int(os.environ.get("EVENTS_QUEUE", "256"))
+EVENTS_KEEPALIVE_S = float(os.environ.get("EVENTS_KEEPALIVE_S", "15"))
+
+# STREAMS key -> stage name in events
+STAGES = {
+    "s_frames_converted": "converted",
+    "s_parts_labeled": "labeled",
+    "s_redacted_done": "redacted",
+    "s_analytics_done": "analytics",
+}
+
+
+def _offer(q: asyncio.Queue, item: Tuple[int, str, str]) -> None:
+    if q.full():  # slow subscriber: lose the oldest, keep the reader moving
+        q.get_nowait()
+    q.put_nowait(item)
+
+
+class EventHub:
+    """Fan events from one reader thread out to asyncio subscribers."""
+
+    def __init__(self, stream_stages: Dict[str, str], replay: int = EVENTS_REPLAY, queue_size: int = EVENTS_QUEUE) -> None:
+        self.stages = stream_stages  # actual stream key -> stage name
+        self.queue_size = queue_size
+        self._recent: Deque[Tuple[int, str, str]] = collections.deque(maxlen=max(1, replay))
+        self._subs: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    def publish(self, stream: str, fields: Dict[str, str]) -> None:
+        """Listener for `frame_index.tail_events` (runs on the reader thread)."""
+        stage = self.stages.get(stream)
+        if stage is None or not fields.get("frame_id"):
+            return
+        doc = {"frame_id": fields["frame_id"], "stage": stage, "t": round(time.time(), 3)}
+        if fields.get("sequence_id"):
+            doc["sequence_id"] = fields["sequence_id"]
+        data = json.dumps(doc, separators=(",", ":"))
+        with self._lock:
+            self._seq += 1
+            item = (self._seq, stage, data)
+            self._recent.append(item)
+            subs = list(self._subs)
+        for loop, q in subs:
+            try:
+                loop.call_soon_threadsafe(_offer, q, item)
+            except RuntimeError:  # loop closed under us
+                with self._lock:
+                    self._subs.discard((loop, q))
+
+    def subscribe(self, last_id: Optional[int] = None) -> Tuple[asyncio.Queue, List[Tuple[int, str, str]]]:
+        """New queue on the running loop, plus events after ``last_id`` still in the replay buffer."""
+        q: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.queue_size))
+        with self._lock:
+            backlog = [e for e in self._recent if last_id is not None and e[0] > last_id]
+            self._subs.add((asyncio.get_running_loop(), q))
+        return q, backlog
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        with self._lock:
+            self._subs = {s for s in self._subs if s[1] is not q}
+
+
+def sse(item: Tuple[int, str, str]) -> str:
+    return f"id: {item[0]}\nevent: stage\ndata: {item[2]}\n\n"
+
+
+async def event_stream(hub: EventHub, last_id: Optional[int] = None, stages: Iterable[str] = ()):
+    """SSE text for one subscriber: replayed backlog, then live events and keepalive comments."""
+    wanted = set(stages)
+    q, backlog = hub.subscribe(last_id)
+    try:
+        yield "retry: 3000\n\n"
+        for item in backlog:
+            if not wanted or item[1] in wanted:
+                yield sse(item)
+        while True:
+            try:
+                item = await asyncio.wait_for(q.get(), EVENTS_KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if not wanted or item[1] in wanted:
+                yield sse(item)
+    finally:
+        hub.unsubscribe(q)
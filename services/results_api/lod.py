@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Level-of-detail point buffers for progressive viewers.
+
+A PLY download is all or nothing; a viewer wants a coarse cloud at once and
+detail as it arrives. `build_lod` rewrites a cloud (ASCII/binary PLY, or a
+redactor ``.drc``) once per file version into a flat buffer cached under
+``http_cache.DERIVED_CACHE_DIR``:
+
+- a 64-byte little-endian header (`HEADER`): magic ``SSLOD1``, header size,
+  record stride, total point count, bounding box
+- fixed 16-byte records: float32 x, y, z + uint8 r, g, b, a (a = 255), so a
+  browser can view the bytes directly as ``Float32Array`` / ``Uint8Array``
+  with a 16-byte stride
+- points in a seeded random order, so the first N records are a uniform
+  N-point subsample of the whole cloud; a level of detail is just a prefix
+  (``bytes=0-{64 + 16 * N - 1}``) and refining is a ``Range`` request for the
+  next records
+
+PLY sources are read in ``LOD_CHUNK_POINTS`` chunks (`ply_io.iter_ply_chunks`)
+and scattered into place, so building a buffer never holds the whole cloud.
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from services.common import ply_io
+
+try:  # .drc sources (redactor --output-format draco)
+    import DracoPy  # type: ignore
+except Exception:
+    DracoPy = None  # type: ignore
+
+LOD_SEED = int(os.environ.get("LOD_SEED", "0"))
+LOD_MIN_POINTS = int(os.environ.get("LOD_MIN_POINTS", "16384"))
+LOD_CHUNK_POINTS = int(os.environ.get("LOD_CHUNK_POINTS", "1000000"))
+HEADER = np.dtype([("magic", "S6"), ("header_size", "<u2"), ("stride", "<u4"), ("seed", "<u4"), ("points", "<u8"),
+                   ("bbox_min", "<f4", (3,)), ("bbox_max", "<f4", (3,)), ("reserved", "V16")])
+MAGIC = b"SSLOD1"
+RECORD = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("r", "u1"), ("g", "u1"), ("b", "u1"), ("a", "u1")])
+STRIDE = RECORD.itemsize  # 16
+HEADER_SIZE = HEADER.itemsize  # 64
+LAYOUT = "x,y,z:float32le;r,g,b,a:uint8"
+MEDIA_TYPE = "application/octet-stream"
+
+
+def _decode_drc(path: Path) -> Tuple[np.ndarray, np.ndarray]:
+    if DracoPy is None:
+        raise RuntimeError("DracoPy is not installed")
+    cloud = DracoPy.decode(path.read_bytes())
+    points = np.asarray(cloud.points, dtype=np.float32).reshape(-1, 3)
+    colors = cloud.colors
+    colors = np.asarray(colors, dtype=np.uint8).reshape(points.shape[0], -1)[:, :3] if colors is not None else np.full(points.shape, ply_io.DEFAULT_COLOR, np.uint8)
+    return points, colors
+
+
+def read_chunks(path: Path) -> Tuple[int, Iterator[Tuple[np.ndarray, np.ndarray]]]:
+    """(point count, (xyz, rgb) chunks): PLYs via `ply_io.iter_ply_chunks`; a .drc decodes as one chunk."""
+    if path.suffix.lower() != ".drc":
+        return ply_io.read_ply_header(path)[1], ply_io.iter_ply_chunks(path, LOD_CHUNK_POINTS)
+    points, colors = _decode_drc(path)
+    return points.shape[0], iter([(points, colors)])
+
+
+def build_lod(src: Path, dst: Path) -> None:
+    """Write the header and shuffled records for ``src`` to ``dst``, one source chunk at a time.
+
+    Source point i is stored at record ``slot[i]`` of a seeded permutation through
+    a memory map of ``dst``, so memory is the permutation plus one chunk rather
+    than the whole cloud.
+    """
+    count, chunks = read_chunks(src)
+    count = max(0, count)
+    slot = np.random.default_rng(LOD_SEED).permutation(count)
+    lo, hi = np.full(3, np.inf, dtype=np.float32), np.full(3, -np.inf, dtype=np.float32)
+    with dst.open("wb") as fh:
+        fh.truncate(prefix_bytes(count))
+    done = 0
+    if count:
+        rec = np.memmap(dst.as_posix(), dtype=RECORD, mode="r+", offset=HEADER_SIZE, shape=(count,))
+        for points, colors in chunks:
+            n = points.shape[0]
+            if done + n > count:
+                raise ValueError(f"{src.name}: more vertices than the header declares")
+            if not n:
+                continue
+            rows = np.empty(n, dtype=RECORD)
+            rows["x"], rows["y"], rows["z"] = points.T
+            rows["r"], rows["g"], rows["b"] = colors.T
+            rows["a"] = 255
+            rec[slot[done:done + n]] = rows
+            lo, hi = np.minimum(lo, points.min(axis=0)), np.maximum(hi, points.max(axis=0))
+            done += n
+        rec.flush()
+        del rec
+    if done != count:
+        raise ValueError(f"{src.name}: {done} of {count} vertices")
+    head = np.zeros(1, dtype=HEADER)
+    head["magic"], head["header_size"], head["stride"], head["seed"], head["points"] = MAGIC, HEADER_SIZE, STRIDE, LOD_SEED, count
+    if count:
+        head["bbox_min"], head["bbox_max"] = lo, hi
+    with dst.open("r+b") as fh:
+        fh.write(head.tobytes())
+
+
+def read_header(path: Path) -> Dict:
+    with path.open("rb") as fh:
+        head = np.frombuffer(fh.read(HEADER_SIZE), dtype=HEADER)[0]
+    if head["magic"] != MAGIC:
+        raise ValueError(f"{path.name}: not a LOD buffer")
+    return {"points": int(head["points"]), "header_size": int(head["header_size"]), "stride": int(head["stride"]), "layout": LAYOUT,
+            "seed": int(head["seed"]), "bbox": {"min": head["bbox_min"].tolist(), "max": head["bbox_max"].tolist()}}
+
+
+def prefix_bytes(points: int) -> int:
+    """Length of the response prefix holding the first ``points`` records."""
+    return HEADER_SIZE + STRIDE * points
+
+
+def levels(points: int) -> List[int]:
+    """Suggested prefix sizes: ``LOD_MIN_POINTS`` times powers of 4, ending with the full cloud."""
+    out, n = [], max(1, LOD_MIN_POINTS)
+    while n < points:
+        out.append(n)
+        n *= 4
+    return out + [points]